@@ -0,0 +1,78 @@
+import argparse
+import builtins
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from async_pages import generate_pages_async  # noqa: E402
+from corpus import generate_corpus  # noqa: E402
+from page_generation import generate_pages_recursive  # noqa: E402
+
+
+def add_latency(root, seconds):
+    # Every open() under root waits first, like a file on a network share.
+    # sleep releases the GIL, as a blocking read would.
+    real_open = builtins.open
+    root = os.path.abspath(root)
+
+    def slow_open(file, *args, **kwargs):
+        if isinstance(file, str) and os.path.abspath(file).startswith(root):
+            time.sleep(seconds)
+        return real_open(file, *args, **kwargs)
+
+    builtins.open = slow_open
+    return lambda: setattr(builtins, "open", real_open)
+
+
+def read_outputs(out_dir):
+    outputs = {}
+    for dir_path, _, filenames in os.walk(out_dir):
+        for filename in filenames:
+            path = os.path.join(dir_path, filename)
+            with open(path, "rb") as f:
+                outputs[os.path.relpath(path, out_dir)] = f.read()
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sync and async page builds")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=2.0,
+                        help="Simulated delay per file open; 0 measures the local disk")
+    parser.add_argument("--io-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        generate_corpus(root, args.pages, 0, None, 30, 0)
+        content = os.path.join(root, "content")
+        template = os.path.join(root, "template.html")
+        out = os.path.join(root, "out")
+        builds = (
+            ("sync", lambda: generate_pages_recursive(content, template, out)),
+            ("async", lambda: generate_pages_async(
+                content, template, out, io_workers=args.io_workers)),
+        )
+        results = {}
+        for name, build in builds:
+            shutil.rmtree(out, ignore_errors=True)
+            restore = add_latency(root, args.latency_ms / 1000)
+            try:
+                start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    build()
+                elapsed = time.perf_counter() - start
+            finally:
+                restore()
+            results[name] = read_outputs(out)
+            print(f"{name:<6} {elapsed * 1000:10.1f} ms")
+        assert results["sync"] == results["async"], "async output differs from sync"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from block_markdown import (  # noqa: E402
+    block_type_code,
+    block_type_heading,
+    block_type_olist,
+    block_type_paragraph,
+    block_type_quote,
+    block_type_ulist,
+    lex_markdown,
+    markdown_to_html_node,
+    text_to_children,
+)
+from corpus import CorpusGenerator  # noqa: E402
+from htmlnode import ParentNode  # noqa: E402
+
+
+# The previous block pipeline: split on "\n\n", classify each block with
+# startswith checks, then split it into lines again in the converter.
+def old_markdown_to_blocks(markdown):
+    blocks = []
+    for block in markdown.split("\n\n"):
+        if block == "":
+            continue
+        blocks.append(block.strip())
+    return blocks
+
+
+def old_block_to_block_type(block):
+    lines = block.split("\n")
+    if block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
+        return block_type_heading
+    if len(lines) > 1 and lines[0].startswith("```") and lines[-1].startswith("```"):
+        return block_type_code
+    if block.startswith(">"):
+        for line in lines:
+            if not line.startswith(">"):
+                return block_type_paragraph
+        return block_type_quote
+    if block.startswith("* "):
+        for line in lines:
+            if not line.startswith("* "):
+                return block_type_paragraph
+        return block_type_ulist
+    if block.startswith("- "):
+        for line in lines:
+            if not line.startswith("- "):
+                return block_type_paragraph
+        return block_type_ulist
+    if block.startswith("1. "):
+        i = 1
+        for line in lines:
+            if not line.startswith(f"{i}. "):
+                return block_type_paragraph
+            i += 1
+        return block_type_olist
+    return block_type_paragraph
+
+
+def old_block_texts(block, block_type):
+    # What each old converter passed to text_to_children.
+    if block_type == block_type_heading:
+        return [block.lstrip("#")[1:]]
+    if block_type == block_type_code:
+        return [block[4:-3]]
+    lines = block.split("\n")
+    if block_type == block_type_ulist:
+        return [line[2:] for line in lines]
+    if block_type == block_type_olist:
+        return [line[3:] for line in lines]
+    if block_type == block_type_quote:
+        return [" ".join(line.lstrip(">").strip() for line in lines)]
+    return [" ".join(lines)]
+
+
+def new_block_texts(lines, block_type):
+    if block_type == block_type_heading:
+        return ["\n".join(lines).lstrip("#")[1:]]
+    if block_type == block_type_code:
+        return ["".join(line + "\n" for line in lines[1:-1])]
+    if block_type == block_type_ulist:
+        return [line[2:] for line in lines]
+    if block_type == block_type_olist:
+        return [line[3:] for line in lines]
+    if block_type == block_type_quote:
+        return [" ".join(line.lstrip(">").strip() for line in lines)]
+    return [" ".join(lines)]
+
+
+def old_structure(markdown):
+    out = []
+    for block in old_markdown_to_blocks(markdown):
+        block_type = old_block_to_block_type(block)
+        out.append((block_type, old_block_texts(block, block_type)))
+    return out
+
+
+def new_structure(markdown):
+    return [(block_type, new_block_texts(lines, block_type))
+            for block_type, lines in lex_markdown(markdown)]
+
+
+def old_block_to_html_node(block):
+    block_type = old_block_to_block_type(block)
+    texts = old_block_texts(block, block_type)
+    if block_type == block_type_paragraph:
+        return ParentNode("p", text_to_children(texts[0]))
+    if block_type == block_type_heading:
+        level = len(block) - len(block.lstrip("#"))
+        return ParentNode(f"h{level}", text_to_children(texts[0]))
+    if block_type == block_type_code:
+        return ParentNode("pre", [ParentNode("code", text_to_children(texts[0]))])
+    if block_type == block_type_quote:
+        return ParentNode("blockquote", text_to_children(texts[0]))
+    tag = "ul" if block_type == block_type_ulist else "ol"
+    return ParentNode(tag, [ParentNode("li", text_to_children(text)) for text in texts])
+
+
+def old_markdown_to_html_node(markdown):
+    return ParentNode("div", [old_block_to_html_node(block)
+                              for block in old_markdown_to_blocks(markdown)])
+
+
+def time_it(func, repeat):
+    number = 3
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the block lexer")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'blocks':>7} {'stage':<10} {'split+classify (ms)':>20} {'lexer (ms)':>11} {'speedup':>8}")
+    for blocks in (1000, 10000, 50000):
+        markdown = CorpusGenerator(seed=blocks, blocks_per_page=blocks).page(0)
+        assert old_structure(markdown) == new_structure(markdown)
+        assert old_markdown_to_html_node(markdown).to_html() == \
+            markdown_to_html_node(markdown).to_html()
+        for stage, old, new in (
+            ("structure", old_structure, new_structure),
+            ("full", old_markdown_to_html_node, markdown_to_html_node),
+        ):
+            old_ms = time_it(lambda: old(markdown), args.repeat)
+            new_ms = time_it(lambda: new(markdown), args.repeat)
+            print(f"{blocks:>7} {stage:<10} {old_ms:>20.2f} {new_ms:>11.2f} {old_ms / new_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from inline_markdown import (  # noqa: E402
+    split_nodes_delimiter,
+    split_nodes_image,
+    split_nodes_link,
+    text_to_textnodes,
+)
+from textnode import (  # noqa: E402
+    TextNode,
+    text_type_bold,
+    text_type_code,
+    text_type_italic,
+    text_type_text,
+)
+
+
+def split_passes(text):
+    nodes = [TextNode(text, text_type_text)]
+    nodes = split_nodes_delimiter(nodes, "**", text_type_bold)
+    nodes = split_nodes_delimiter(nodes, "*", text_type_italic)
+    nodes = split_nodes_delimiter(nodes, "`", text_type_code)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+def link_dense_paragraph(links):
+    parts = []
+    for i in range(links):
+        if i % 7 == 0:
+            parts.append(f"see ![figure {i}](/images/fig{i}.png)")
+        else:
+            parts.append(f"a [reference {i}](https://example.com/docs/{i})")
+    return "Some **bold** intro, then " + " and ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text_to_textnodes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'links':>6} {'split passes (ms)':>18} {'single scan (ms)':>17} {'speedup':>8}")
+    for links in (10, 100, 1000, 10000, 50000):
+        text = link_dense_paragraph(links)
+        assert split_passes(text) == text_to_textnodes(text)
+        number = max(1, 20000 // links)
+        old = min(timeit.repeat(lambda: split_passes(text), number=number, repeat=args.repeat))
+        new = min(timeit.repeat(lambda: text_to_textnodes(text), number=number, repeat=args.repeat))
+        old_ms = old / number * 1000
+        new_ms = new / number * 1000
+        print(f"{links:>6} {old_ms:>18.3f} {new_ms:>17.3f} {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
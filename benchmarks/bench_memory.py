@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from block_markdown import markdown_to_html_node  # noqa: E402
+from htmlnode import LeafNode, ParentNode  # noqa: E402
+from inline_markdown import text_to_textnodes  # noqa: E402
+from textnode import TextNode  # noqa: E402
+
+
+class DictTextNode:
+    # Layout of TextNode before __slots__.
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = text_type
+        self.url = url
+
+
+class DictHTMLNode:
+    # Layout of HTMLNode/LeafNode/ParentNode before __slots__ and tuple props.
+    def __init__(self, tag=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+def copy_tree(node, compact):
+    # Rebuilds the tree with the chosen layout. Strings are shared with the
+    # source tree, so only node overhead is measured.
+    if isinstance(node, ParentNode):
+        children = [copy_tree(child, compact) for child in node.children]
+        if compact:
+            return ParentNode(node.tag, children, node._props)
+        return DictHTMLNode(node.tag, None, children, node.props)
+    if compact:
+        return LeafNode(node.tag, node.value, node._props)
+    return DictHTMLNode(node.tag, node.value, None, node.props)
+
+
+def count_nodes(node):
+    if isinstance(node, ParentNode):
+        return 1 + sum(count_nodes(child) for child in node.children)
+    return 1
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def synthetic_document(paragraphs):
+    blocks = ["# Synthetic document"]
+    for i in range(paragraphs):
+        blocks.append(
+            f"Paragraph {i} has **bold**, *italic*, `code`, a [link](/page/{i}) "
+            f"and an ![image](/images/{i}.png) in it."
+        )
+        if i % 10 == 0:
+            blocks.append("\n".join(f"* list item {j} with [ref](/ref/{j})" for j in range(5)))
+    return "\n\n".join(blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-node memory of the node trees")
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    args = parser.parse_args()
+
+    markdown = synthetic_document(args.paragraphs)
+    tree = markdown_to_html_node(markdown)
+    nodes = count_nodes(tree)
+
+    dict_bytes, _ = measure(lambda: copy_tree(tree, compact=False))
+    slot_bytes, _ = measure(lambda: copy_tree(tree, compact=True))
+    print(f"HTML nodes: {nodes}")
+    print(f"  dict layout:  {dict_bytes / nodes:7.1f} bytes/node ({dict_bytes / 2**20:.1f} MiB)")
+    print(f"  slots layout: {slot_bytes / nodes:7.1f} bytes/node ({slot_bytes / 2**20:.1f} MiB)")
+    print(f"  saved:        {(dict_bytes - slot_bytes) / nodes:7.1f} bytes/node")
+
+    text_nodes = text_to_textnodes(markdown.split("\n\n")[1]) * args.paragraphs
+    dict_bytes, _ = measure(lambda: [DictTextNode(n.text, n.text_type, n.url) for n in text_nodes])
+    slot_bytes, _ = measure(lambda: [TextNode(n.text, n.text_type, n.url) for n in text_nodes])
+    count = len(text_nodes)
+    print(f"TextNodes: {count}")
+    print(f"  dict layout:  {dict_bytes / count:7.1f} bytes/node")
+    print(f"  slots layout: {slot_bytes / count:7.1f} bytes/node")
+    print(f"  saved:        {(dict_bytes - slot_bytes) / count:7.1f} bytes/node")
+
+
+if __name__ == "__main__":
+    main()
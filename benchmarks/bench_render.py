@@ -0,0 +1,61 @@
+import argparse
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from htmlnode import LeafNode, ParentNode  # noqa: E402
+
+
+def recursive_to_html(node):
+    # The previous ParentNode.to_html: recursion plus string concatenation.
+    if not isinstance(node, ParentNode):
+        return node.to_html()
+    children_html = ""
+    for child in node.children:
+        children_html += recursive_to_html(child)
+    return f"<{node.tag}{node.props_to_html()}>{children_html}</{node.tag}>"
+
+
+def wide_list(items):
+    return ParentNode("ul", [
+        ParentNode("li", [LeafNode(None, f"item {i} "), LeafNode("a", "link", {"href": f"/{i}"})])
+        for i in range(items)
+    ])
+
+
+def deep_tree(depth):
+    node = LeafNode("b", "leaf")
+    for i in range(depth):
+        node = ParentNode("div", [LeafNode(None, f"level {i}"), node])
+    return node
+
+
+def time_it(func, repeat):
+    number = 3
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML node rendering")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [(f"wide list, {n} items", wide_list(n)) for n in (1000, 10000, 100000)]
+    cases += [(f"deep tree, depth {n}", deep_tree(n)) for n in (500, 5000, 20000)]
+
+    print(f"{'case':<26} {'recursive (ms)':>15} {'to_html (ms)':>13} {'render_to (ms)':>15}")
+    for name, node in cases:
+        try:
+            old = f"{time_it(lambda: recursive_to_html(node), args.repeat):15.2f}"
+        except RecursionError:
+            old = f"{'RecursionError':>15}"
+        new = time_it(node.to_html, args.repeat)
+        stream = time_it(lambda: node.render_to(io.StringIO()), args.repeat)
+        print(f"{name:<26} {old} {new:13.2f} {stream:15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import random
+
+# Relative weights for the block kinds on a page and for the inline
+# elements inside paragraphs, list items and quotes.
+default_mix = {
+    "heading": 2,
+    "paragraph": 6,
+    "ulist": 2,
+    "olist": 1,
+    "quote": 1,
+    "code": 1,
+    "text": 12,
+    "bold": 2,
+    "italic": 2,
+    "inline_code": 1,
+    "link": 2,
+    "image": 1,
+}
+block_kinds = ("heading", "paragraph", "ulist", "olist", "quote", "code")
+inline_kinds = ("text", "bold", "italic", "inline_code", "link", "image")
+
+words = (
+    "static site generator markdown block inline parser render template page "
+    "content public asset image link quote list heading code paragraph build "
+    "cache write copy stage node tree html style index theme draft post"
+).split()
+
+corpus_template = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title> {{ Title }} </title>
+  <link href="/index.css" rel="stylesheet">
+</head>
+<body>
+  {{ Nav }}
+  <article>
+    {{ Content }}
+  </article>
+</body>
+</html>
+"""
+
+
+def parse_mix(text):
+    # "heading=1,link=4" -> default_mix with those weights replaced.
+    mix = dict(default_mix)
+    if not text:
+        return mix
+    for item in text.split(","):
+        name, sep, weight = item.partition("=")
+        name = name.strip()
+        if not sep or name not in mix:
+            raise ValueError(f"Invalid mix entry: {item!r}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name}: {weight!r}")
+        if mix[name] < 0:
+            raise ValueError(f"Invalid weight for {name}: {weight!r}")
+    if not any(mix[kind] for kind in block_kinds):
+        raise ValueError("Mix needs at least one block kind")
+    if not any(mix[kind] for kind in inline_kinds):
+        raise ValueError("Mix needs at least one inline kind")
+    return mix
+
+
+class CorpusGenerator:
+    def __init__(self, seed=0, mix=None, blocks_per_page=30):
+        self.rng = random.Random(seed)
+        self.mix = mix or dict(default_mix)
+        self.blocks_per_page = blocks_per_page
+        self.block_weights = [self.mix[kind] for kind in block_kinds]
+        self.inline_weights = [self.mix[kind] for kind in inline_kinds]
+
+    def phrase(self, low=2, high=6):
+        return " ".join(self.rng.choice(words) for _ in range(self.rng.randint(low, high)))
+
+    def inline_text(self, parts=12):
+        out = []
+        for kind in self.rng.choices(inline_kinds, self.inline_weights, k=parts):
+            if kind == "text":
+                out.append(self.phrase())
+            elif kind == "bold":
+                out.append(f"**{self.phrase(1, 3)}**")
+            elif kind == "italic":
+                out.append(f"*{self.phrase(1, 3)}*")
+            elif kind == "inline_code":
+                out.append(f"`{self.rng.choice(words)}()`")
+            elif kind == "link":
+                out.append(f"[{self.phrase(1, 3)}](/{self.rng.choice(words)}/{self.rng.randrange(1000)})")
+            else:
+                out.append(f"![{self.phrase(1, 2)}](/images/{self.rng.choice(words)}.png)")
+        return " ".join(out)
+
+    def block(self, kind):
+        rng = self.rng
+        if kind == "heading":
+            return f"{'#' * rng.randint(2, 4)} {self.phrase()}"
+        if kind == "paragraph":
+            return "\n".join(self.inline_text(rng.randint(4, 10)) for _ in range(rng.randint(1, 4)))
+        if kind == "ulist":
+            return "\n".join(f"* {self.inline_text(rng.randint(1, 4))}" for _ in range(rng.randint(2, 8)))
+        if kind == "olist":
+            return "\n".join(
+                f"{i}. {self.inline_text(rng.randint(1, 4))}" for i in range(1, rng.randint(3, 9))
+            )
+        if kind == "quote":
+            return "\n".join(f"> {self.inline_text(rng.randint(2, 6))}" for _ in range(rng.randint(1, 3)))
+        lines = [f"    {self.rng.choice(words)} = {self.phrase(1, 4)}" for _ in range(rng.randint(2, 10))]
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    def page(self, index):
+        blocks = [f"# Page {index}: {self.phrase()}"]
+        kinds = self.rng.choices(block_kinds, self.block_weights, k=self.blocks_per_page)
+        blocks.extend(self.block(kind) for kind in kinds)
+        return "\n\n".join(blocks) + "\n"
+
+    def asset(self, size):
+        return self.rng.randbytes(size)
+
+
+def page_path(index, pages_per_section=100):
+    # A two-level tree keeps directories a realistic size.
+    if index == 0:
+        return "index.md"
+    return os.path.join(f"section-{index // pages_per_section}", f"page-{index}.md")
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def generate_corpus(
+    root, pages=1000, seed=0, mix=None, blocks_per_page=30, assets=50, asset_size=16384,
+):
+    # Writes root/content, root/static and root/template.html. The same seed
+    # and arguments always produce byte-identical files.
+    generator = CorpusGenerator(seed, mix, blocks_per_page)
+    content_dir = os.path.join(root, "content")
+    static_dir = os.path.join(root, "static")
+    for i in range(pages):
+        write_file(os.path.join(content_dir, page_path(i)), generator.page(i))
+    write_file(os.path.join(static_dir, "index.css"), "body { margin: 0 }\n" * 64)
+    for i in range(assets):
+        write_file(os.path.join(static_dir, "images", f"asset-{i}.png"), generator.asset(asset_size))
+    write_file(os.path.join(root, "template.html"), corpus_template)
+    return content_dir, static_dir, os.path.join(root, "template.html")
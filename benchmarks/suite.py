@@ -0,0 +1,272 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from block_markdown import (  # noqa: E402
+    block_type_code,
+    block_type_heading,
+    block_type_olist,
+    block_type_quote,
+    block_type_ulist,
+    lex_markdown,
+    lines_to_html_node,
+)
+from copy_static import sync_files_recursive  # noqa: E402
+from corpus import generate_corpus, parse_mix  # noqa: E402
+from htmlnode import ParentNode  # noqa: E402
+from inline_markdown import text_to_textnodes  # noqa: E402
+from page_generation import (  # noqa: E402
+    extract_title,
+    find_pages,
+    generate_pages_recursive,
+    page_values,
+)
+from template_engine import load_template  # noqa: E402
+
+stage_names = (
+    "block_split", "inline_parse", "convert", "render", "template", "write",
+    "static_copy", "build",
+)
+
+
+def inline_texts_of(block):
+    # The text each block converter hands to text_to_textnodes.
+    block_type, lines = block
+    if block_type == block_type_heading:
+        return ["\n".join(lines).lstrip("#")[1:]]
+    if block_type == block_type_code:
+        return ["".join(line + "\n" for line in lines[1:-1])]
+    if block_type == block_type_ulist:
+        return [line[2:] for line in lines]
+    if block_type == block_type_olist:
+        return [line[3:] for line in lines]
+    if block_type == block_type_quote:
+        return [" ".join(line.lstrip(">").strip() for line in lines)]
+    return [" ".join(lines)]
+
+
+def time_stage(func, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": min(times), "median_ms": statistics.median(times), "runs": times}
+
+
+def reset_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def run_suite(root, repeat, stages=stage_names):
+    # Every stage works on the whole corpus and is fed the previous stage's
+    # results, so each timing isolates one step of the pipeline.
+    content_dir = os.path.join(root, "content")
+    static_dir = os.path.join(root, "static")
+    template_path = os.path.join(root, "template.html")
+    out_dir = os.path.join(root, "out")
+    pages = find_pages(content_dir, out_dir)
+    sources = []
+    for from_path, dest_path in pages:
+        with open(from_path) as f:
+            sources.append(f.read())
+
+    blocks = [list(lex_markdown(markdown)) for markdown in sources]
+    inline_texts = [
+        text for page_blocks in blocks for block in page_blocks
+        for text in inline_texts_of(block)
+    ]
+    trees = [ParentNode("div", [lines_to_html_node(*block) for block in page_blocks])
+             for page_blocks in blocks]
+    contents = [tree.to_html() for tree in trees]
+    template = load_template(template_path)
+
+    def render_templates():
+        rendered = []
+        for (from_path, dest_path), markdown, content in zip(pages, sources, contents):
+            out = io.StringIO()
+            template.render_to(out, page_values(
+                from_path, dest_path, extract_title(markdown), content, out_dir))
+            rendered.append(out.getvalue())
+        return rendered
+
+    documents = render_templates()
+
+    def write_documents():
+        for (_, dest_path), document in zip(pages, documents):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            with open(dest_path, "w") as f:
+                f.write(document)
+
+    def copy_static():
+        with redirect_stdout(io.StringIO()):
+            sync_files_recursive(static_dir, out_dir)
+
+    def build():
+        with redirect_stdout(io.StringIO()):
+            sync_files_recursive(static_dir, out_dir)
+            generate_pages_recursive(content_dir, template_path, out_dir)
+
+    stage_funcs = {
+        "block_split": (lambda: [list(lex_markdown(markdown)) for markdown in sources], None),
+        "inline_parse": (lambda: [text_to_textnodes(text) for text in inline_texts], None),
+        "convert": (lambda: [[lines_to_html_node(*block) for block in page_blocks]
+                             for page_blocks in blocks], None),
+        "render": (lambda: [tree.to_html() for tree in trees], None),
+        "template": (render_templates, None),
+        "write": (write_documents, lambda: reset_dir(out_dir)),
+        "static_copy": (copy_static, lambda: reset_dir(out_dir)),
+        "build": (build, lambda: reset_dir(out_dir)),
+    }
+    results = {}
+    for name in stages:
+        func, setup = stage_funcs[name]
+        results[name] = time_stage(func, repeat, setup)
+        print(f"{name:<12} min {results[name]['min_ms']:10.2f} ms   "
+              f"median {results[name]['median_ms']:10.2f} ms")
+    reset_dir(out_dir)
+    return results
+
+
+def run_command(args):
+    mix = parse_mix(args.mix)
+    tmp = None
+    root = args.corpus
+    if root is None:
+        tmp = tempfile.TemporaryDirectory()
+        root = tmp.name
+    try:
+        if args.corpus is None or not os.path.isdir(os.path.join(root, "content")):
+            start = time.perf_counter()
+            generate_corpus(root, args.pages, args.seed, mix, args.blocks, args.assets)
+            print(f"Generated {args.pages} pages in {time.perf_counter() - start:.1f} s")
+        stages = args.stages.split(",") if args.stages else stage_names
+        for name in stages:
+            if name not in stage_names:
+                raise ValueError(f"Unknown stage: {name}")
+        results = run_suite(root, args.repeat, stages)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = {
+        "meta": {
+            "pages": args.pages,
+            "seed": args.seed,
+            "mix": mix,
+            "blocks_per_page": args.blocks,
+            "assets": args.assets,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+def compare_reports(baseline, current, threshold, min_ms=1.0):
+    # Compares the best run of each stage; the minimum is the least noisy
+    # estimate of what the code costs. Tiny stages are ignored below min_ms.
+    rows = []
+    for name, base in baseline["stages"].items():
+        if name not in current["stages"]:
+            continue
+        old = base["min_ms"]
+        new = current["stages"][name]["min_ms"]
+        change = (new - old) / old * 100 if old else 0.0
+        regressed = change > threshold and new - old > min_ms
+        rows.append((name, old, new, change, regressed))
+    return rows
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("pages", "seed", "mix", "blocks_per_page", "assets"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"Warning: corpus {key} differs between runs")
+
+    rows = compare_reports(baseline, current, args.threshold, args.min_ms)
+    print(f"{'stage':<12} {'baseline (ms)':>14} {'current (ms)':>13} {'change':>8}")
+    for name, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<12} {old:>14.2f} {new:>13.2f} {change:>+7.1f}%{flag}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def generate_command(args):
+    generate_corpus(args.dest, args.pages, args.seed, parse_mix(args.mix), args.blocks, args.assets)
+    print(f"Generated {args.pages} pages in {args.dest}")
+    return 0
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blocks", type=int, default=30, help="Blocks per page")
+    parser.add_argument("--assets", type=int, default=50, help="Number of static files")
+    parser.add_argument(
+        "--mix", default="",
+        help="Weights such as heading=2,ulist=1,code=0,link=4 (see corpus.default_mix)",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the build pipeline stage by stage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic corpus")
+    generate.add_argument("dest")
+    add_corpus_arguments(generate)
+    generate.set_defaults(func=generate_command)
+
+    run = commands.add_parser("run", help="Time each stage and optionally save JSON")
+    add_corpus_arguments(run)
+    run.add_argument("--corpus", help="Reuse (or create) a corpus in this directory")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--stages", default="", help=f"Comma-separated subset of {', '.join(stage_names)}")
+    run.add_argument("--output", "-o", help="Write results to this JSON file")
+    run.set_defaults(func=run_command)
+
+    compare = commands.add_parser("compare", help="Flag stages slower than a saved baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent")
+    compare.add_argument("--min-ms", type=float, default=1.0,
+                         help="Ignore slowdowns smaller than this many milliseconds")
+    compare.set_defaults(func=compare_command)
+
+    args = parser.parse_args()
+    try:
+        sys.exit(args.func(args))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,7 @@
 # conda create -n site python=3.10.12
 ~/miniconda3/envs/site/python.exe src/main.py
 
-# Start the web server after generating the site
-~/miniconda3/envs/site/python.exe server.py
\ No newline at end of file
+# Start the web server after generating the site; --watch rebuilds on edits
+# and reloads open browsers. Build flags go after --, e.g.
+# server.py --watch -- --fingerprint-assets --search-index
+~/miniconda3/envs/site/python.exe server.py --watch
\ No newline at end of file
@@ -1,33 +1,592 @@
 import os
+import sys
 import argparse
+import email.utils
+import fnmatch
+import hashlib
+import io
+import json
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+livereload_path = "/__livereload"
+livereload_script = (
+    f'<script>new EventSource("{livereload_path}")'
+    '.onmessage = function () { location.reload(); };</script>'
+).encode()
+
+
+class LiveReload:
+    def __init__(self):
+        self.version = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def notify(self, changed_paths=None):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def wait(self, seen_version, timeout):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.version != seen_version or self.closed, timeout)
+            return self.version
+
+    def stream(self, connection, version):
+        # Sends an event down an open event-stream connection on every
+        # change after `version`, until the client goes away or this closes.
+        try:
+            while not self.closed:
+                new_version = self.wait(version, timeout=15)
+                if new_version != version:
+                    connection.sendall(b"data: reload\n\n")
+                    version = new_version
+                else:
+                    connection.sendall(b": keep-alive\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+cache_stats_path = "/__cache"
+
+# Written by the builder's --fingerprint-assets; its values are the URLs of
+# content-hashed copies, whose content never changes.
+asset_manifest_name = "asset-manifest.json"
+immutable_cache_control = "public, max-age=31536000, immutable"
+
+# (URL path pattern, Cache-Control value); the first matching rule wins.
+default_cache_control_rules = (
+    ("*.html", "no-cache"),
+    ("/", "no-cache"),
+    ("*/", "no-cache"),
+    ("*", "public, max-age=3600"),
+)
+
+
+search_path = "/search"
+search_index_name = "search-index.bin"
+
+
+def import_builder():
+    # The builder lives in src/; import from it lazily so plain serving has
+    # no dependency on it.
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+    if src not in sys.path:
+        sys.path.insert(0, src)
+
+
+class SearchIndexCache:
+    # Keeps the index written by the builder's --search-index mapped, and
+    # maps it again when a rebuild replaces it. A replaced map is left to
+    # the garbage collector, since other requests may still be reading it.
+    def __init__(self):
+        self.key = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self.key != key:
+                import_builder()
+                from search_index import SearchIndexReader
+
+                self.reader = SearchIndexReader.open(path)
+                self.key = key
+            return self.reader
+
+
+class FingerprintedAssets:
+    # The fingerprinted URLs listed in an asset manifest, read again
+    # whenever the file's (mtime, size) changes.
+    def __init__(self):
+        self.key = None
+        self.urls = frozenset()
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return frozenset()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if self.key != key:
+                try:
+                    with open(path, "r") as f:
+                        urls = json.load(f)
+                except (OSError, ValueError):
+                    urls = {}
+                self.urls = frozenset(urls.values()) if isinstance(urls, dict) else frozenset()
+                self.key = key
+            return self.urls
+
+
+class CacheEntry:
+    __slots__ = ("key", "body", "etag", "last_modified")
+
+    def __init__(self, key, body):
+        self.key = key
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.last_modified = key[0] // 1_000_000_000
+
+
+class ResponseCache:
+    # LRU cache of file bodies bounded by total size. Entries are keyed by
+    # path and validated against (mtime, size) on every lookup, so an edited
+    # file is reread on its next request.
+    def __init__(self, max_bytes=64 * 2**20, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 8
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.key == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        if stat.st_size > self.max_entry_bytes:
+            return None
+        with open(path, "rb") as f:
+            entry = CacheEntry(key, f.read())
+        if len(entry.body) != stat.st_size:
+            # Changed while we were reading it; serve it but don't keep it.
+            return entry
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old.body)
+            self.entries[path] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def cache_control_for(url_path, rules):
+    for pattern, value in rules:
+        if fnmatch.fnmatchcase(url_path, pattern):
+            return value
+    return None
+
+
+def parse_cache_control_rule(text):
+    pattern, sep, value = text.partition("=")
+    if not sep or not pattern or not value:
+        raise argparse.ArgumentTypeError(f"expected PATTERN=VALUE, got {text!r}")
+    return (pattern, value)
+
+
+class PooledHTTPServer(HTTPServer):
+    # Hands each connection to a bounded thread pool, so a slow client only
+    # ties up one worker and at most `workers` connections run at once;
+    # further connections queue until a worker is free. Connections that
+    # stay open indefinitely are detached from the pool instead.
+    def __init__(self, server_address, handler_class, workers=32):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self.draining = False
+        self.detached = set()
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def detach(self, request, client_address, target):
+        # Moves a long-lived connection, such as an event stream, out of the
+        # pool: target(request) runs on a thread of its own and the worker
+        # is free again once the handler returns.
+        self.detached.add(request)
+        threading.Thread(
+            target=self.process_detached, args=(request, client_address, target),
+            daemon=True,
+        ).start()
+
+    def process_detached(self, request, client_address, target):
+        try:
+            target(request)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response is normal for a preview server.
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if request in self.detached:
+                self.detached.discard(request)
+            else:
+                self.shutdown_request(request)
+
+    def shutdown(self):
+        # Stop accepting, then tell keep-alive connections to close after
+        # their current response instead of waiting for another request.
+        self.draining = True
+        super().shutdown()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
 
 
 class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are closed after this many seconds so
+    # they don't hold on to a worker.
+    timeout = 5
+    livereload = None
+    cache = None
+    search_indexes = None
+    fingerprinted_assets = None
+    cache_control_rules = default_cache_control_rules
+
     def end_headers(self):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "*")
+        if getattr(self.server, "draining", False):
+            self.send_header("Connection", "close")
         super().end_headers()
 
     def do_OPTIONS(self):
         self.send_response(200, "OK")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
+    def do_GET(self):
+        url_path = urlsplit(self.path).path
+        if self.livereload is not None and url_path == livereload_path:
+            self.send_livereload_events()
+            return
+        if self.cache is not None and url_path == cache_stats_path:
+            self.send_cache_stats()
+            return
+        if self.search_indexes is not None and url_path == search_path:
+            self.send_search_results()
+            return
+        super().do_GET()
 
-def run(
-    server_class=HTTPServer,
+    def send_search_results(self):
+        query = parse_qs(urlsplit(self.path).query)
+        text = query.get("q", [""])[0]
+        try:
+            limit = int(query.get("limit", ["20"])[0])
+        except ValueError:
+            self.send_error(400, "limit must be an integer")
+            return
+        start = time.perf_counter()
+        reader = self.search_indexes.load(os.path.join(self.directory, search_index_name))
+        if reader is None:
+            self.send_error(404, "No search index; build with --search-index")
+            return
+        results = reader.search(text, max(limit, 0))
+        body = json.dumps({
+            "query": text,
+            "results": results,
+            "took_ms": round((time.perf_counter() - start) * 1000, 3),
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cache_stats(self):
+        body = json.dumps(self.cache.stats()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_livereload_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.close_connection = True
+        self.wfile.flush()
+        stream = partial(self.livereload.stream, version=self.livereload.version)
+        detach = getattr(self.server, "detach", None)
+        if detach is None:
+            stream(self.connection)
+        else:
+            # Open tabs would otherwise each hold a pool worker for good.
+            detach(self.request, self.client_address, stream)
+
+    def send_head(self):
+        url_path = urlsplit(self.path).path
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and url_path.endswith("/"):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path):
+            # Directory redirects, listings and 404s.
+            return super().send_head()
+        inject = self.livereload is not None and path.endswith(".html")
+        gzip_path = None if inject else precompressed_variant(path)
+        if self.cache is None and not inject and gzip_path is None:
+            return super().send_head()
+
+        served_path = path
+        if gzip_path is not None and accepts_gzip(self.headers.get("Accept-Encoding")):
+            served_path = gzip_path
+        entry = self.load_entry(served_path, inject or gzip_path is not None)
+        if entry is None:
+            # Too large to cache: let the base class stream it from disk.
+            return super().send_head()
+
+        body = entry.body
+        etag = entry.etag
+        if inject:
+            body = inject_livereload(body)
+            etag = f'{etag[:-1]}-livereload"'
+        cache_control = "no-store" if inject else self.cache_control(url_path)
+
+        if self.is_not_modified(etag, entry.last_modified):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            if cache_control:
+                self.send_header("Cache-Control", cache_control)
+            if gzip_path is not None:
+                self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return None
+
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(len(body)))
+        if served_path == gzip_path:
+            self.send_header("Content-Encoding", "gzip")
+        if gzip_path is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Last-Modified", self.date_time_string(entry.last_modified))
+        self.send_header("ETag", etag)
+        if cache_control:
+            self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def cache_control(self, url_path):
+        if self.fingerprinted_assets is not None:
+            manifest_path = os.path.join(self.directory, asset_manifest_name)
+            if unquote(url_path) in self.fingerprinted_assets.load(manifest_path):
+                return immutable_cache_control
+        return cache_control_for(url_path, self.cache_control_rules)
+
+    def load_entry(self, path, required):
+        entry = self.cache.load(path) if self.cache is not None else None
+        if entry is None and required:
+            with open(path, "rb") as f:
+                body = f.read()
+            entry = CacheEntry((os.stat(path).st_mtime_ns, len(body)), body)
+        return entry
+
+    def is_not_modified(self, etag, last_modified):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # If-None-Match takes precedence over If-Modified-Since.
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            if since is None:
+                return False
+            return last_modified <= since.timestamp()
+        return False
+
+
+def precompressed_variant(path):
+    # The build writes .gz siblings with the source's mtime; anything else
+    # is stale and must not be served in its place.
+    gzip_path = f"{path}.gz"
+    try:
+        gzip_stat = os.stat(gzip_path)
+    except OSError:
+        return None
+    if gzip_stat.st_mtime_ns != os.stat(path).st_mtime_ns:
+        return None
+    return gzip_path
+
+
+def accepts_gzip(accept_encoding):
+    if not accept_encoding:
+        return False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def inject_livereload(body):
+    marker = body.rfind(b"</body>")
+    if marker == -1:
+        return body + livereload_script
+    return body[:marker] + livereload_script + body[marker:]
+
+
+def make_watcher(livereload, build_args=()):
+    # Builds the site with the builder's own flags first: the watcher only
+    # keeps up what that build turned on, such as fingerprinted assets, the
+    # search index or optimized PNGs, and a build without them removes them.
+    import_builder()
+    import main as site
+    from watch import SiteWatcher
+
+    manifest = site.build(site.parse_args(list(build_args)))
+    return SiteWatcher(
+        site.dir_path_content, site.dir_path_static, site.template_path,
+        site.dir_path_public, manifest, on_rebuild=livereload.notify,
+    )
+
+
+def start_watcher(livereload, build_args=()):
+    watcher = make_watcher(livereload, build_args)
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    return watcher
+
+
+def make_server(
+    server_class=PooledHTTPServer,
     handler_class=CORSHTTPRequestHandler,
     port=8000,
     directory=None,
+    watch=False,
+    workers=32,
+    keep_alive_timeout=5,
+    cache_bytes=64 * 2**20,
+    cache_control_rules=default_cache_control_rules,
+    build_args=(),
 ):
-    if directory:  # Change the current working directory if directory is specified
-        os.chdir(directory)
+    attributes = {
+        "timeout": keep_alive_timeout,
+        "cache_control_rules": cache_control_rules,
+        "search_indexes": SearchIndexCache(),
+        "fingerprinted_assets": FingerprintedAssets(),
+    }
+    if cache_bytes > 0:
+        attributes["cache"] = ResponseCache(cache_bytes)
+    if watch:
+        attributes["livereload"] = LiveReload()
+        start_watcher(attributes["livereload"], build_args)
+    handler_class = type(handler_class.__name__, (handler_class,), attributes)
+    livereload = handler_class.livereload
+    if directory:  # Serve from the directory without changing the working directory
+        handler_class = partial(handler_class, directory=directory)
     server_address = ("", port)
-    httpd = server_class(server_address, handler_class)
+    if issubclass(server_class, PooledHTTPServer):
+        httpd = server_class(server_address, handler_class, workers)
+    else:
+        httpd = server_class(server_address, handler_class)
+    httpd.livereload = livereload
+    httpd.cache = attributes.get("cache")
+    return httpd
+
+
+def run(
+    server_class=PooledHTTPServer,
+    handler_class=CORSHTTPRequestHandler,
+    port=8000,
+    directory=None,
+    watch=False,
+    workers=32,
+    keep_alive_timeout=5,
+    cache_bytes=64 * 2**20,
+    cache_control_rules=default_cache_control_rules,
+    build_args=(),
+):
+    httpd = make_server(
+        server_class, handler_class, port, directory, watch, workers, keep_alive_timeout,
+        cache_bytes, cache_control_rules, build_args,
+    )
+
+    def stop(signum, frame):
+        print("Shutting down, finishing in-flight requests...")
+        if httpd.livereload is not None:
+            httpd.livereload.close()
+        # shutdown() waits for serve_forever() to return, which runs on this
+        # (the main) thread, so it must be called from another one.
+        threading.Thread(target=httpd.shutdown).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
     print(
         f"Serving HTTP on http://localhost:{port} from directory '{directory}'...")
-    httpd.serve_forever()
+    try:
+        httpd.serve_forever()
+    finally:
+        if httpd.livereload is not None:
+            httpd.livereload.close()
+        httpd.server_close()
+        if httpd.cache is not None:
+            stats = httpd.cache.stats()
+            print(
+                f"Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%} hit rate)"
+            )
 
 
 if __name__ == "__main__":
@@ -37,6 +596,55 @@ if __name__ == "__main__":
     )
     parser.add_argument("--port", type=int,
                         help="Port to serve HTTP on", default=8888)
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Rebuild changed pages and assets and reload open browsers",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=32,
+        help="Maximum number of connections handled concurrently",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=float,
+        default=5,
+        help="Seconds an idle keep-alive connection is held open",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=float,
+        default=64,
+        help="Size of the in-memory response cache in MiB (0 disables it)",
+    )
+    parser.add_argument(
+        "--cache-control",
+        type=parse_cache_control_rule,
+        action="append",
+        metavar="PATTERN=VALUE",
+        help="Cache-Control value for URL paths matching PATTERN; checked before the defaults",
+    )
+    parser.add_argument(
+        "build_args",
+        nargs="*",
+        metavar="-- BUILD_FLAGS",
+        help="With --watch, flags for the first build, as given to src/main.py",
+    )
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.build_args and not args.watch:
+        parser.error("build flags are only used with --watch")
 
-    run(port=args.port, directory=args.dir)
+    run(
+        port=args.port,
+        directory=args.dir,
+        watch=args.watch,
+        workers=args.workers,
+        keep_alive_timeout=args.keep_alive_timeout,
+        cache_bytes=int(args.cache_mb * 2**20),
+        cache_control_rules=tuple(args.cache_control or ()) + default_cache_control_rules,
+        build_args=args.build_args,
+    )
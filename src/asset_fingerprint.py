@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+
+from asset_publish import publish_hardlink, unsupported_errnos
+from atomic_write import write_text_if_changed
+from build_log import log, per_file
+from build_manifest import hash_file
+
+asset_manifest_name = "asset-manifest.json"
+
+# Hex digits of the content hash put into each fingerprinted name.
+fingerprint_length = 10
+
+# The asset map used while rendering in this process, or None. Links and
+# images in markdown and src/href attributes in templates are looked up in
+# it, so pages point at the fingerprinted copies.
+active = None
+
+
+class AssetMap:
+    def __init__(self, urls, manifest_path):
+        # {"/index.css": "/index.0123456789.css", ...}
+        self.urls = urls
+        self.manifest_path = manifest_path
+        self.digest = hashlib.sha256(
+            json.dumps(urls, sort_keys=True).encode()
+        ).hexdigest()
+
+    def url(self, url):
+        fingerprinted = self.urls.get(url)
+        if fingerprinted is not None:
+            return fingerprinted
+        # Keep any query string or fragment on the rewritten path.
+        for separator in "?#":
+            path, found, rest = url.partition(separator)
+            if found and path in self.urls:
+                return self.urls[path] + found + rest
+        return url
+
+
+def asset_url(url):
+    if active is None:
+        return url
+    return active.url(url)
+
+
+def configure(asset_map):
+    # Returns True when the URLs differ from the previous map, in which case
+    # anything rendered with the old map is stale.
+    global active
+    old_digest = active.digest if active is not None else None
+    active = asset_map
+    return old_digest != (asset_map.digest if asset_map is not None else None)
+
+
+def fingerprinted_path(path, digest):
+    root, suffix = os.path.splitext(path)
+    return f"{root}.{digest[:fingerprint_length]}{suffix}"
+
+
+def path_to_url(path, dir_path_public):
+    return "/" + os.path.relpath(path, dir_path_public).replace(os.sep, "/")
+
+
+def url_to_path(url, dir_path_public):
+    return os.path.join(dir_path_public, *url.lstrip("/").split("/"))
+
+
+def load_asset_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as f:
+            urls = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return urls if isinstance(urls, dict) else {}
+
+
+def same_file_stat(path, other_path):
+    try:
+        stat = os.stat(path)
+        other = os.stat(other_path)
+    except FileNotFoundError:
+        return False
+    return stat.st_size == other.st_size and stat.st_mtime_ns == other.st_mtime_ns
+
+
+class FingerprintStats:
+    def __init__(self):
+        self.fingerprinted_files = 0
+        self.unchanged_files = 0
+        self.removed_files = 0
+
+    def report(self):
+        return (
+            f"Fingerprint: {self.fingerprinted_files} new, {self.unchanged_files} unchanged, "
+            f"{self.removed_files} stale removed"
+        )
+
+
+def publish_fingerprinted(path, hashed_path):
+    # Every writer of public/ replaces files with a new inode, so the
+    # hashed name can share the original's instead of doubling its size.
+    try:
+        publish_hardlink(path, hashed_path)
+    except OSError as e:
+        if e.errno not in unsupported_errnos:
+            raise
+        tmp_path = f"{hashed_path}.tmp"
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, hashed_path)
+
+
+def fingerprint_assets(dir_path_public, asset_paths, stats=None):
+    # Publishes a content-hashed file next to every asset, writes the
+    # original -> fingerprinted URL map to asset-manifest.json and removes
+    # copies that no longer match. The originals stay in place for anything
+    # that still names them directly. Hashed files keep the original's size
+    # and mtime, which is how the next build knows the name is still right
+    # without hashing again.
+    if stats is None:
+        stats = FingerprintStats()
+    manifest_path = os.path.join(dir_path_public, asset_manifest_name)
+    previous = load_asset_manifest(manifest_path)
+    urls = {}
+    for path in sorted(asset_paths):
+        if not os.path.isfile(path):
+            continue
+        url = path_to_url(path, dir_path_public)
+        old_url = previous.get(url)
+        if old_url is not None and same_file_stat(path, url_to_path(old_url, dir_path_public)):
+            urls[url] = old_url
+            stats.unchanged_files += 1
+            continue
+        hashed_path = fingerprinted_path(path, hash_file(path))
+        publish_fingerprinted(path, hashed_path)
+        log(f" # {path} -> {hashed_path}", per_file)
+        urls[url] = path_to_url(hashed_path, dir_path_public)
+        stats.fingerprinted_files += 1
+
+    current = set(urls.values())
+    for old_url in set(previous.values()) - current:
+        old_path = url_to_path(old_url, dir_path_public)
+        if os.path.isfile(old_path):
+            os.remove(old_path)
+            stats.removed_files += 1
+    write_text_if_changed(manifest_path, json.dumps(urls, indent=2, sort_keys=True) + "\n")
+    return AssetMap(urls, manifest_path), stats
+
+
+def remove_fingerprinted_assets(dir_path_public):
+    # Undoes fingerprint_assets when fingerprinting is switched off.
+    manifest_path = os.path.join(dir_path_public, asset_manifest_name)
+    if not os.path.exists(manifest_path):
+        return 0
+    removed = 0
+    for url in load_asset_manifest(manifest_path).values():
+        path = url_to_path(url, dir_path_public)
+        if os.path.isfile(path):
+            os.remove(path)
+            removed += 1
+    os.remove(manifest_path)
+    return removed
@@ -0,0 +1,149 @@
+import errno
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from build_manifest import hash_file
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# ioctl request number for FICLONE on Linux (btrfs, XFS, bcachefs, ...).
+FICLONE = 0x40049409
+
+# Errors that mean "this filesystem or platform can't do it", as opposed
+# to a real failure such as a missing source file.
+unsupported_errnos = {
+    errno.EXDEV,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EBADF,
+}
+
+publish_strategies = ("hardlink", "reflink", "copy_file_range", "copy")
+
+# Hardlinks alias the source file, so they are only used when asked for.
+auto_strategies = ("reflink", "copy_file_range", "copy")
+
+
+def publish_hardlink(from_path, dest_path):
+    tmp_path = f"{dest_path}.link-tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    os.link(from_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+
+
+def publish_reflink(from_path, dest_path):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(from_path, "rb") as src, open(dest_path, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(from_path, dest_path)
+
+
+def publish_copy_file_range(from_path, dest_path):
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "os.copy_file_range is not available")
+    with open(from_path, "rb") as src, open(dest_path, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    shutil.copystat(from_path, dest_path)
+
+
+def publish_copy(from_path, dest_path):
+    shutil.copy2(from_path, dest_path)
+
+
+publish_functions = {
+    "hardlink": publish_hardlink,
+    "reflink": publish_reflink,
+    "copy_file_range": publish_copy_file_range,
+    "copy": publish_copy,
+}
+
+
+class AssetPublisher:
+    def __init__(self, strategy="auto", workers=1, dedupe=False):
+        if strategy == "auto":
+            self.strategies = auto_strategies
+        elif strategy in publish_functions:
+            self.strategies = (strategy,) if strategy == "copy" else (strategy, "copy")
+        else:
+            raise ValueError(f"Unknown publish strategy: {strategy}")
+        self.workers = workers
+        self.dedupe = dedupe
+        self.digests = {}
+        self._unsupported = set()
+        self._lock = threading.Lock()
+
+    def publish_file(self, from_path, dest_path):
+        # The old output may be a hardlink to a source file; writing through
+        # it would clobber the source, so always start from a fresh inode.
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        for strategy in self.strategies:
+            if strategy in self._unsupported:
+                continue
+            try:
+                publish_functions[strategy](from_path, dest_path)
+                return strategy
+            except OSError as e:
+                if strategy == "copy" or e.errno not in unsupported_errnos:
+                    raise
+                with self._lock:
+                    self._unsupported.add(strategy)
+        raise OSError(errno.ENOTSUP, f"No publish strategy worked for {from_path}")
+
+    def publish(self, files, published=None):
+        # `published` maps content hashes to outputs already in place from an
+        # earlier build, which new duplicates link to as well. The hashes of
+        # the files published here are left in self.digests.
+        self.digests = {}
+        if not files:
+            return []
+        originals, duplicates = self._split_duplicates(files, published or {})
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda f: self.publish_file(*f), originals))
+            if duplicates:
+                results.extend(executor.map(lambda d: self._publish_duplicate(*d), duplicates))
+        return results
+
+    def _split_duplicates(self, files, published):
+        if not self.dedupe or (len(files) < 2 and not published):
+            return files, []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            digests = list(executor.map(lambda f: hash_file(f[0]), files))
+        originals = []
+        duplicates = []
+        first_dest = dict(published)
+        for (from_path, dest_path), digest in zip(files, digests):
+            self.digests[dest_path] = digest
+            if digest in first_dest:
+                duplicates.append((from_path, dest_path, first_dest[digest]))
+            else:
+                first_dest[digest] = dest_path
+                originals.append((from_path, dest_path))
+        return originals, duplicates
+
+    def _publish_duplicate(self, from_path, dest_path, original_dest_path):
+        try:
+            publish_hardlink(original_dest_path, dest_path)
+            return "dedupe"
+        except OSError as e:
+            if e.errno not in unsupported_errnos:
+                raise
+            return self.publish_file(from_path, dest_path)
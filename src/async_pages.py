@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import block_markdown
+import output_cache
+from atomic_write import write_text_if_changed
+from build_log import log, per_file
+from page_generation import (
+    add_cached_text,
+    page_cache_key,
+    page_dependencies,
+    page_html,
+    remove_deleted_pages,
+    render_collected,
+    resolve_template,
+    scan_pages_dir,
+)
+from template_engine import load_template
+
+
+# The async build runs as a pipeline of tasks joined by bounded queues:
+#
+#   scan -> read (io_workers) -> render -> write (io_workers)
+#
+# Directory listings, source reads and output writes run in threads, so
+# they overlap with each other and with rendering, which stays on the event
+# loop thread. A full queue makes the stage before it wait, so no more than
+# a few queues' worth of pages are ever held in memory.
+
+
+def read_source(from_path):
+    # The source's hash (as hash_file computes it) and its text, decoded
+    # exactly as open(from_path, "r") would.
+    with open(from_path, "rb") as f:
+        data = f.read()
+    return hashlib.sha256(data).hexdigest(), io.TextIOWrapper(io.BytesIO(data)).read()
+
+
+def make_dest_dir(dest_path):
+    dest_dir_path = os.path.dirname(dest_path)
+    if dest_dir_path:
+        os.makedirs(dest_dir_path, exist_ok=True)
+
+
+def write_output(dest_path, html):
+    make_dest_dir(dest_path)
+    write_text_if_changed(dest_path, html)
+
+
+def page_html_and_text(from_path, markdown, template, dest_path, site_root):
+    # page_html, and what render_collected gathered from the page for the
+    # output cache to keep with it.
+    html = page_html(from_path, markdown, template, dest_path, site_root)
+    collector = block_markdown.collecting
+    return html, collector and collector.stored()
+
+
+def fetch_cached(cache, from_path, template, dest_path, site_root, source_hash):
+    # The page's output cache key, whether the page was copied into place
+    # from the cache and, if it was, the text stored with it.
+    make_dest_dir(dest_path)
+    key = page_cache_key(from_path, template, dest_path, site_root, source_hash)
+    if not cache.fetch(key, dest_path):
+        return key, False, None
+    return key, True, cache.fetch_text(key)
+
+
+async def run_all(coroutines):
+    # Like gather, but one failing stage cancels the rest instead of
+    # leaving them blocked on a queue forever.
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncPageBuild:
+    def __init__(
+        self, dir_path_content, template_path, dest_dir_path, manifest=None, explain=False,
+        io_workers=8, queue_size=32,
+    ):
+        self.dir_path_content = dir_path_content
+        self.template_path = template_path
+        self.dest_dir_path = dest_dir_path
+        self.manifest = manifest
+        self.explain = explain
+        self.io_workers = io_workers
+        self.queue_size = queue_size
+        self.resolved_templates = {}
+        self.file_hashes = {}
+        self.seen = []
+        self.generated = 0
+
+    async def run(self):
+        sources = asyncio.Queue(self.queue_size)
+        to_render = asyncio.Queue(self.queue_size)
+        to_write = asyncio.Queue(self.queue_size)
+        await run_all(
+            [self.scan(sources)]
+            + [self.read_pages(sources, to_render) for _ in range(self.io_workers)]
+            + [self.render_pages(to_render, to_write)]
+            + [self.write_pages(to_write) for _ in range(self.io_workers)]
+        )
+
+    async def scan(self, sources):
+        pending = [(self.dir_path_content, self.dest_dir_path)]
+        while pending:
+            dir_path, dest_dir_path = pending.pop()
+            pages, subdirs = await asyncio.to_thread(scan_pages_dir, dir_path, dest_dir_path)
+            pending.extend(reversed(subdirs))
+            for page in pages:
+                self.seen.append(page[0])
+                await sources.put(page)
+        for _ in range(self.io_workers):
+            await sources.put(None)
+
+    async def read_pages(self, sources, to_render):
+        cache = output_cache.active
+        while True:
+            page = await sources.get()
+            if page is None:
+                await to_render.put(None)
+                return
+            from_path, dest_path = page
+            template_path = resolve_template(
+                from_path, self.dir_path_content, self.template_path, self.resolved_templates
+            )
+            source_hash, markdown = await asyncio.to_thread(read_source, from_path)
+            dependencies = None
+            if self.manifest is not None:
+                dependencies = page_dependencies(template_path, self.file_hashes)
+                reason = self.manifest.rebuild_reason(
+                    from_path, dest_path, source_hash, dependencies
+                )
+                if reason is None:
+                    if self.explain:
+                        print(f"Skipping {dest_path}: up to date")
+                    continue
+                if self.explain:
+                    print(f"Rebuilding {dest_path}: {reason}")
+
+            key = None
+            if cache is not None:
+                key, fetched, stored = await asyncio.to_thread(
+                    fetch_cached, cache, from_path, load_template(template_path), dest_path,
+                    self.dest_dir_path, source_hash,
+                )
+                if fetched:
+                    add_cached_text(from_path, dest_path, stored)
+                    self.finish(from_path, dest_path, source_hash, dependencies)
+                    continue
+            await to_render.put(
+                (from_path, dest_path, template_path, source_hash, dependencies, key, markdown)
+            )
+
+    async def render_pages(self, to_render, to_write):
+        # CPU-bound, so it runs here rather than in a thread. Queue
+        # operations only yield when they have to wait, so hand the loop a
+        # turn after each page to start the reads and writes that are ready.
+        readers_left = self.io_workers
+        while readers_left:
+            job = await to_render.get()
+            if job is None:
+                readers_left -= 1
+                continue
+            from_path, dest_path, template_path = job[:3]
+            template = load_template(template_path)
+            log(f"Generating page at {dest_path} from {from_path} and {template.path}...", per_file)
+            html, text = render_collected(
+                from_path, dest_path, page_html_and_text, from_path, job[-1], template,
+                dest_path, self.dest_dir_path,
+            )
+            await to_write.put((job[:-1], html, text))
+            await asyncio.sleep(0)
+        for _ in range(self.io_workers):
+            await to_write.put(None)
+
+    async def write_pages(self, to_write):
+        cache = output_cache.active
+        while True:
+            item = await to_write.get()
+            if item is None:
+                return
+            (from_path, dest_path, _, source_hash, dependencies, key), html, text = item
+            await asyncio.to_thread(write_output, dest_path, html)
+            if key is not None:
+                await asyncio.to_thread(cache.store, key, dest_path, text)
+            self.finish(from_path, dest_path, source_hash, dependencies)
+
+    def finish(self, from_path, dest_path, source_hash, dependencies):
+        self.generated += 1
+        if self.manifest is not None:
+            self.manifest.record(from_path, dest_path, source_hash, dependencies)
+
+
+def generate_pages_async(
+    dir_path_content, template_path, dest_dir_path, manifest=None, explain=False, io_workers=8,
+):
+    # Same pages, manifest and output as generate_pages_recursive.
+    if not os.path.exists(dest_dir_path):
+        os.mkdir(dest_dir_path)
+    build = AsyncPageBuild(
+        dir_path_content, template_path, dest_dir_path, manifest, explain, io_workers
+    )
+    asyncio.run(build.run())
+    if manifest is None:
+        log(f"Pages: generated {build.generated}")
+        return
+    removed = remove_deleted_pages(manifest, build.seen, explain)
+    skipped = len(build.seen) - build.generated
+    log(
+        f"Pages: generated {build.generated}, skipped {skipped} up to date, "
+        f"removed {len(removed)}"
+    )
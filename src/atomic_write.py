@@ -0,0 +1,69 @@
+import io
+import os
+
+# Outputs are only replaced when their bytes change, so unchanged pages keep
+# their mtime and sync tools skip them. A changed file is written next to
+# the old one and renamed over it, so readers never see a partial page.
+
+
+def temp_path(dest_path):
+    return f"{dest_path}.tmp"
+
+
+def encode_text(text):
+    # The bytes open(path, "w") would write for text.
+    buffer = io.BytesIO()
+    writer = io.TextIOWrapper(buffer)
+    writer.write(text)
+    writer.flush()
+    data = buffer.getvalue()
+    writer.detach()
+    return data
+
+
+def has_contents(path, data):
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except FileNotFoundError:
+        return False
+
+
+def write_bytes_if_changed(dest_path, data):
+    if has_contents(dest_path, data):
+        return False
+    tmp_path = temp_path(dest_path)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, dest_path)
+    return True
+
+
+def write_text_if_changed(dest_path, text):
+    return write_bytes_if_changed(dest_path, encode_text(text))
+
+
+def same_file_contents(path, other_path, chunk_size=65536):
+    try:
+        if os.path.getsize(path) != os.path.getsize(other_path):
+            return False
+        with open(path, "rb") as f, open(other_path, "rb") as other:
+            while True:
+                chunk = f.read(chunk_size)
+                if chunk != other.read(chunk_size):
+                    return False
+                if not chunk:
+                    return True
+    except FileNotFoundError:
+        return False
+
+
+def replace_if_changed(tmp_path, dest_path):
+    # For outputs streamed into tmp_path: keeps the old file if it matches.
+    if same_file_contents(tmp_path, dest_path):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, dest_path)
+    return True
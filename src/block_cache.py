@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+import block_markdown
+from block_markdown import lines_to_html_node
+from page_text import BlockText
+
+# The block cache used by page generation in this process, or None. Worker
+# processes build their own from the same settings, so each keeps its hits
+# across all the chunks it renders.
+active = None
+
+
+def covers(text, collecting):
+    # Whether a cached BlockText has everything the collector wants.
+    if collecting is None:
+        return True
+    return text is not None and (collecting.terms is None or text.tokens is not None)
+
+
+class BlockCache:
+    # LRU map from a lexed (block_type, lines) block to its rendered HTML.
+    # Rendering depends on nothing but the block, so the block itself is the
+    # key. Sizes are counted in characters of the lines, the HTML and any
+    # collected link URLs and search tokens.
+    def __init__(self, max_size=32 * 2**20, max_entry_size=None):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size if max_entry_size is not None else max_size // 64
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, block):
+        # Entries also keep the BlockText the block adds to the page's
+        # collector, when one was active, so a hit can add it again.
+        collecting = block_markdown.collecting
+        entry = self.entries.get(block)
+        if entry is not None and covers(entry[1], collecting):
+            self.entries.move_to_end(block)
+            self.hits += 1
+            if collecting is not None:
+                collecting.add_block(entry[1])
+            return entry[0]
+        self.misses += 1
+        text = None
+        if collecting is not None:
+            text = block_markdown.collecting = BlockText(collecting.terms is not None)
+        try:
+            html = lines_to_html_node(*block).to_html()
+        finally:
+            block_markdown.collecting = collecting
+        if text is not None:
+            collecting.add_block(text)
+        if entry is not None:
+            self.size -= self.entry_size(block, entry)
+            del self.entries[block]
+        entry = (html, text)
+        size = self.entry_size(block, entry)
+        if size > self.max_entry_size:
+            return html
+        self.entries[block] = entry
+        self.size += size
+        while self.size > self.max_size:
+            evicted_block, evicted_entry = self.entries.popitem(last=False)
+            self.size -= self.entry_size(evicted_block, evicted_entry)
+            self.evictions += 1
+        return html
+
+    def entry_size(self, block, entry):
+        html, text = entry
+        size = sum(map(len, block[1])) + len(html)
+        if text is not None:
+            size += text.size()
+        return size
+
+    def render_blocks(self, blocks):
+        # Same as markdown_to_html_node(...).to_html() for the lexed blocks.
+        return f"<div>{''.join([self.render(block) for block in blocks])}</div>"
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def take_stats(self):
+        stats = (self.hits, self.misses, self.evictions)
+        self.hits = self.misses = self.evictions = 0
+        return stats
+
+    def add_stats(self, stats):
+        hits, misses, evictions = stats
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"Block cache: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), "
+            f"{self.evictions} evicted"
+        )
+
+
+def configure(max_size):
+    global active
+    active = BlockCache(max_size) if max_size > 0 else None
+    return active
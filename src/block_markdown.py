@@ -1,7 +1,15 @@
+from collections import deque
+
 from htmlnode import ParentNode
 from inline_markdown import text_to_textnodes
 from textnode import text_node_to_html_node
 
+# The collector (a page_text.PageText or BlockText) for the page being
+# rendered, or None. text_to_children passes it every run of TextNodes, so
+# the search index and the link graph reuse the inline parse that rendering
+# already does.
+collecting = None
+
 block_type_paragraph = "paragraph"
 block_type_heading = "heading"
 block_type_code = "code"
@@ -9,85 +17,193 @@ block_type_quote = "quote"
 block_type_olist = "ordered_list"
 block_type_ulist = "unordered_list"
 
+heading_prefixes = ("# ", "## ", "### ", "#### ", "##### ", "###### ")
+code_fence = "```"
 
-def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    filtered_blocks = []
-    for block in blocks:
-        if block == "":
+
+def lines_to_block_type(lines):
+    # Types a block from its lines, looking past the first line only for
+    # quotes and lists.
+    first_line = lines[0]
+    first = first_line[:1]
+    if first == "#":
+        if first_line.startswith(heading_prefixes):
+            return block_type_heading
+    elif first == ">":
+        for line in lines:
+            if not line.startswith(">"):
+                return block_type_paragraph
+        return block_type_quote
+    elif first == "*" or first == "-":
+        marker = first_line[:2]
+        if marker[1:] == " ":
+            for line in lines:
+                if not line.startswith(marker):
+                    return block_type_paragraph
+            return block_type_ulist
+    elif first_line.startswith("1. "):
+        i = 1
+        for line in lines:
+            if not line.startswith(f"{i}. "):
+                return block_type_paragraph
+            i += 1
+        return block_type_olist
+    return block_type_paragraph
+
+
+def is_fence_opener(line):
+    return line.startswith(code_fence) and "`" not in line[3:]
+
+
+def _closing_fence(lines, start):
+    for i in range(start, len(lines)):
+        if lines[i].rstrip() == code_fence:
+            return i
+    return -1
+
+
+# How much code a ``` fence may hold before it counts as unclosed, so one
+# stray fence can't pull the rest of a streamed document into memory.
+max_fence_chars = 2**20
+
+
+def lex_pieces(pieces):
+    # Lexes the pieces of markdown.split("\n\n") into (block_type, lines)
+    # blocks, splitting each block into lines once and typing it from those
+    # lines. A ``` fence keeps going through blank lines to its closing
+    # line; an unclosed fence is ordinary text.
+    pieces = iter(pieces)
+    pending = deque()
+    fences = True
+    while True:
+        if pending:
+            piece = pending.popleft()
+        else:
+            piece = next(pieces, None)
+            if piece is None:
+                return
+        stripped = piece.strip()
+        if not stripped:
             continue
-        block = block.strip()
-        filtered_blocks.append(block)
-    return filtered_blocks
+        lines = stripped.split("\n")
+        if not fences or not is_fence_opener(lines[0]):
+            yield lines_to_block_type(lines), tuple(lines)
+            continue
+
+        # Keep trailing whitespace inside the fence; only the text before
+        # the opening ``` is dropped.
+        code = piece.lstrip().split("\n")
+        closing = _closing_fence(code, 1)
+        read_ahead = []
+        size = len(piece)
+        exhausted = False
+        while closing == -1 and size <= max_fence_chars:
+            if pending:
+                following = pending.popleft()
+            else:
+                following = next(pieces, None)
+                if following is None:
+                    exhausted = True
+                    break
+            read_ahead.append(following)
+            size += len(following) + 2
+            start = len(code) + 1
+            code.append("")
+            code.extend(following.split("\n"))
+            closing = _closing_fence(code, start)
+        if closing == -1:
+            # Never closed, so nothing later can close a fence either. A
+            # fence that ran past max_fence_chars only loses its own block.
+            if exhausted:
+                fences = False
+            yield lines_to_block_type(lines), tuple(lines)
+            pending.extendleft(reversed(read_ahead))
+            continue
+        yield block_type_code, tuple(code[:closing + 1])
+        rest = code[closing + 1:]
+        if rest:
+            pending.appendleft("\n".join(rest))
+
+
+def lex_markdown(markdown):
+    return lex_pieces(markdown.split("\n\n"))
+
+
+def iter_pieces(f, chunk_size=65536):
+    # The same pieces as f.read().split("\n\n"), read in chunks so that
+    # only the current piece is ever held in memory.
+    buffer = ""
+    search_from = 0
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find("\n\n", search_from)
+            if end == -1:
+                break
+            yield buffer[start:end]
+            start = end + 2
+            search_from = start
+        buffer = buffer[start:]
+        # A "\n\n" can straddle the chunk boundary, so rescan the last char.
+        search_from = max(0, len(buffer) - 1)
+    yield buffer
+
+
+def iter_lexed_blocks(f, chunk_size=65536):
+    return lex_pieces(iter_pieces(f, chunk_size))
+
+
+def markdown_to_blocks(markdown):
+    return ["\n".join(lines) for _, lines in lex_markdown(markdown)]
 
 
 def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
     children = []
-    for block in blocks:
-        html_node = block_to_html_node(block)
-        children.append(html_node)
+    for block_type, lines in lex_markdown(markdown):
+        children.append(lines_to_html_node(block_type, lines))
     return ParentNode("div", children, None)
 
 
+def lex_block(block):
+    blocks = list(lex_markdown(block))
+    if len(blocks) == 1:
+        return blocks[0]
+    return block_type_paragraph, tuple(block.split("\n"))
+
+
 def block_to_html_node(block):
-    block_type = block_to_block_type(block)
+    block_type, lines = lex_block(block)
+    return lines_to_html_node(block_type, lines)
+
+
+def lines_to_html_node(block_type, lines):
     if block_type == block_type_paragraph:
-        return paragraph_to_html_node(block)
+        return paragraph_to_html_node(lines)
     if block_type == block_type_heading:
-        return heading_to_html_node(block)
+        return heading_to_html_node(lines)
     if block_type == block_type_code:
-        return code_to_html_node(block)
+        return code_to_html_node(lines)
     if block_type == block_type_olist:
-        return olist_to_html_node(block)
+        return olist_to_html_node(lines)
     if block_type == block_type_ulist:
-        return ulist_to_html_node(block)
+        return ulist_to_html_node(lines)
     if block_type == block_type_quote:
-        return quote_to_html_node(block)
+        return quote_to_html_node(lines)
     raise ValueError("Invalid block type")
 
 
 def block_to_block_type(block):
-    lines = block.split("\n")
-
-    if (
-        block.startswith("# ")
-        or block.startswith("## ")
-        or block.startswith("### ")
-        or block.startswith("#### ")
-        or block.startswith("##### ")
-        or block.startswith("###### ")
-    ):
-        return block_type_heading
-    if len(lines) > 1 and lines[0].startswith("```") and lines[-1].startswith("```"):
-        return block_type_code
-    if block.startswith(">"):
-        for line in lines:
-            if not line.startswith(">"):
-                return block_type_paragraph
-        return block_type_quote
-    if block.startswith("* "):
-        for line in lines:
-            if not line.startswith("* "):
-                return block_type_paragraph
-        return block_type_ulist
-    if block.startswith("- "):
-        for line in lines:
-            if not line.startswith("- "):
-                return block_type_paragraph
-        return block_type_ulist
-    if block.startswith("1. "):
-        i = 1
-        for line in lines:
-            if not line.startswith(f"{i}. "):
-                return block_type_paragraph
-            i += 1
-        return block_type_olist
-    return block_type_paragraph
+    return lex_block(block)[0]
 
 
 def text_to_children(text):
     text_nodes = text_to_textnodes(text)
+    if collecting is not None:
+        collecting.add_nodes(text_nodes)
     children = []
     for text_node in text_nodes:
         html_node = text_node_to_html_node(text_node)
@@ -95,14 +211,14 @@ def text_to_children(text):
     return children
 
 
-def paragraph_to_html_node(block):
-    lines = block.split("\n")
+def paragraph_to_html_node(lines):
     paragraph = " ".join(lines)
     children = text_to_children(paragraph)
     return ParentNode("p", children)
 
 
-def heading_to_html_node(block):
+def heading_to_html_node(lines):
+    block = "\n".join(lines)
     level = 0
     for char in block:
         if char == "#":
@@ -116,37 +232,34 @@ def heading_to_html_node(block):
     return ParentNode(f"h{level}", children)
 
 
-def code_to_html_node(block):
-    if not block.startswith("```") or not block.endswith("```"):
+def code_to_html_node(lines):
+    if len(lines) < 2 or not lines[0].startswith(code_fence) or lines[-1].rstrip() != code_fence:
         raise ValueError("Invalid code block")
-    text = block[4:-3]
+    text = "".join(line + "\n" for line in lines[1:-1])
     children = text_to_children(text)
     code = ParentNode("code", children)
     return ParentNode("pre", [code])
 
 
-def olist_to_html_node(block):
-    items = block.split("\n")
+def olist_to_html_node(lines):
     html_items = []
-    for item in items:
+    for item in lines:
         text = item[3:]
         children = text_to_children(text)
         html_items.append(ParentNode("li", children))
     return ParentNode("ol", html_items)
 
 
-def ulist_to_html_node(block):
-    items = block.split("\n")
+def ulist_to_html_node(lines):
     html_items = []
-    for item in items:
+    for item in lines:
         text = item[2:]
         children = text_to_children(text)
         html_items.append(ParentNode("li", children))
     return ParentNode("ul", html_items)
 
 
-def quote_to_html_node(block):
-    lines = block.split("\n")
+def quote_to_html_node(lines):
     new_lines = []
     for line in lines:
         if not line.startswith(">"):
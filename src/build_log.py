@@ -0,0 +1,17 @@
+# Console output levels: 0 prints nothing but errors, 1 prints one summary
+# line per build step, 2 also prints a line for every file.
+quiet = 0
+summary = 1
+per_file = 2
+
+verbosity = summary
+
+
+def set_verbosity(level):
+    global verbosity
+    verbosity = level
+
+
+def log(message, level=summary):
+    if verbosity >= level:
+        print(message)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+
+
+# Bump whenever a change to the markdown/HTML pipeline alters the output,
+# so that every page recorded by an older renderer gets rebuilt.
+RENDERER_VERSION = "3"
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    def __init__(
+        self, path, pages=None, assets=None, links=None, optimized_assets=None, asset_hashes=None,
+        link_targets=None,
+    ):
+        self.path = path
+        self.pages = pages if pages is not None else {}
+        self.assets = assets if assets is not None else {}
+        # {source path: {"source_hash", "dest", "urls", "paths", "dead"}} and
+        # the sorted output URLs the links were last checked against, kept
+        # by the link graph.
+        self.links = links if links is not None else {}
+        self.link_targets = link_targets if link_targets is not None else []
+        # {dest path: {"source_size", "size", "mtime_ns"}} for published
+        # assets rewritten after the copy, such as optimized PNGs.
+        self.optimized_assets = optimized_assets if optimized_assets is not None else {}
+        # {dest path: {"hash", "source_size", "source_mtime_ns", "size",
+        # "mtime_ns"}} for assets published with deduplication: the source
+        # hash, and the source and output stats as of publishing. A linked
+        # duplicate has its original's mtime, so this is how sync knows it
+        # is still current.
+        self.asset_hashes = asset_hashes if asset_hashes is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        return cls(
+            path, data.get("pages", {}), data.get("assets", {}), data.get("links", {}),
+            data.get("optimized_assets", {}), data.get("asset_hashes", {}),
+            data.get("link_targets", []),
+        )
+
+    def save(self):
+        # Compact: large sites have megabytes of entries, and watch mode
+        # writes the manifest after every burst of edits.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "pages": self.pages,
+                    "assets": self.assets,
+                    "links": self.links,
+                    "link_targets": self.link_targets,
+                    "optimized_assets": self.optimized_assets,
+                    "asset_hashes": self.asset_hashes,
+                },
+                f, separators=(",", ":"), sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
+
+    def rebuild_reason(self, from_path, dest_path, source_hash, dependencies):
+        # `dependencies` maps the page's template and partial files to their
+        # hashes; comparing it with the recorded map catches both edits and
+        # a switch to a different template.
+        entry = self.pages.get(from_path)
+        if entry is None:
+            return "new page"
+        if entry["renderer_version"] != RENDERER_VERSION:
+            return "renderer version changed"
+        if entry["dest"] != dest_path:
+            return "output path changed"
+        if not os.path.exists(dest_path):
+            return "output missing"
+        if entry["source_hash"] != source_hash:
+            return "source changed"
+        recorded = entry.get("dependencies")
+        if recorded is None or recorded.keys() != dependencies.keys():
+            return "template changed"
+        for path, digest in dependencies.items():
+            if recorded[path] != digest:
+                return f"{path} changed"
+        return None
+
+    def record(self, from_path, dest_path, source_hash, dependencies):
+        self.pages[from_path] = {
+            "dest": dest_path,
+            "source_hash": source_hash,
+            "dependencies": dependencies,
+            "renderer_version": RENDERER_VERSION,
+        }
+
+    def dependency_paths(self):
+        paths = set()
+        for entry in self.pages.values():
+            paths.update(entry.get("dependencies", ()))
+        return paths
+
+    def remove_missing(self, seen_paths):
+        seen = set(seen_paths)
+        removed = []
+        for from_path in list(self.pages):
+            if from_path not in seen:
+                removed.append((from_path, self.pages.pop(from_path)["dest"]))
+        return removed
+
+    def record_asset(self, dest_path, from_path):
+        self.assets[dest_path] = from_path
+
+    def record_asset_hash(self, dest_path, from_path, digest):
+        source_stat = os.stat(from_path)
+        dest_stat = os.stat(dest_path)
+        self.asset_hashes[dest_path] = {
+            "hash": digest,
+            "source_size": source_stat.st_size,
+            "source_mtime_ns": source_stat.st_mtime_ns,
+            "size": dest_stat.st_size,
+            "mtime_ns": dest_stat.st_mtime_ns,
+        }
+
+    def remove_missing_assets(self, seen_dest_paths):
+        seen = set(seen_dest_paths)
+        removed = []
+        for dest_path in list(self.assets):
+            if dest_path not in seen:
+                del self.assets[dest_path]
+                self.optimized_assets.pop(dest_path, None)
+                self.asset_hashes.pop(dest_path, None)
+                removed.append(dest_path)
+        return removed
@@ -0,0 +1,108 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+
+import block_markdown
+from inline_markdown import text_to_textnodes
+
+stage_names = ("read", "split", "convert", "inline", "to_html", "template", "write")
+
+# The profile collecting timings in this process, or None. Page generation
+# checks it once per page, so an unprofiled build pays nothing per block.
+active = None
+
+
+class PageTimer:
+    def __init__(self, profile, path):
+        self.profile = profile
+        self.path = path
+        self.stages = dict.fromkeys(stage_names, 0.0)
+        self.start = self.last = time.perf_counter()
+        profile.inline_seconds = 0.0
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] += now - self.last
+        self.last = now
+
+    def finish(self):
+        # text_to_textnodes runs inside lines_to_html_node; report it on its
+        # own and keep "convert" exclusive of it.
+        inline = self.profile.inline_seconds
+        self.stages["inline"] += inline
+        self.stages["convert"] -= inline
+        total = self.last - self.start
+        self.profile.pages.append(
+            (self.path, total, tuple(self.stages[name] for name in stage_names))
+        )
+
+
+class BuildProfile:
+    def __init__(self, dump_page=None, dump_path="page.prof"):
+        self.pages = []
+        self.wall_seconds = 0.0
+        self.inline_seconds = 0.0
+        self.dump_page = os.path.normpath(dump_page) if dump_page else None
+        self.dump_path = dump_path
+
+    def start_page(self, path):
+        return PageTimer(self, path)
+
+    def wants_dump(self, path):
+        return self.dump_page is not None and os.path.normpath(path) == self.dump_page
+
+    def run_dumped(self, func, *args):
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args)
+        finally:
+            profiler.dump_stats(self.dump_path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+            print(f"cProfile for {self.dump_page} saved to {self.dump_path}")
+            print(out.getvalue().rstrip())
+
+    def take_pages(self):
+        pages = self.pages
+        self.pages = []
+        return pages
+
+    def report(self, slowest=10):
+        count = len(self.pages)
+        rate = count / self.wall_seconds if self.wall_seconds else 0.0
+        lines = [f"Profile: {count} page(s) in {self.wall_seconds:.3f} s ({rate:.1f} pages/sec)"]
+        if not count:
+            return "\n".join(lines)
+
+        totals = [sum(page[2][i] for page in self.pages) for i in range(len(stage_names))]
+        stage_sum = sum(totals) or 1.0
+        lines.append("Stage totals (summed over pages):")
+        for name, seconds in zip(stage_names, totals):
+            lines.append(f"  {name:<9} {seconds * 1000:10.2f} ms {seconds / stage_sum:6.1%}")
+        lines.append(f"Slowest {min(slowest, count)} page(s):")
+        for path, total, stages in sorted(self.pages, key=lambda page: -page[1])[:slowest]:
+            top = max(range(len(stage_names)), key=lambda i: stages[i])
+            lines.append(f"  {total * 1000:8.2f} ms  {path} (mostly {stage_names[top]})")
+        return "\n".join(lines)
+
+
+def timed_text_to_textnodes(text):
+    start = time.perf_counter()
+    nodes = text_to_textnodes(text)
+    active.inline_seconds += time.perf_counter() - start
+    return nodes
+
+
+def enable(dump_page=None, dump_path="page.prof"):
+    global active
+    active = BuildProfile(dump_page, dump_path)
+    block_markdown.text_to_textnodes = timed_text_to_textnodes
+    return active
+
+
+def disable():
+    global active
+    active = None
+    block_markdown.text_to_textnodes = text_to_textnodes
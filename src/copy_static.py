@@ -1,6 +1,10 @@
 import os
 import shutil
 
+from asset_publish import AssetPublisher
+from build_log import log, per_file
+from build_manifest import hash_file
+
 
 def copy_files_recursive(source_dir_path, dest_dir_path):
     if not os.path.exists(dest_dir_path):
@@ -9,8 +13,156 @@ def copy_files_recursive(source_dir_path, dest_dir_path):
     for filename in os.listdir(source_dir_path):
         from_path = os.path.join(source_dir_path, filename)
         dest_path = os.path.join(dest_dir_path, filename)
-        print(f" * {from_path} -> {dest_path}")
+        log(f" * {from_path} -> {dest_path}", per_file)
         if os.path.isfile(from_path):
             shutil.copy(from_path, dest_path)
         else:
             copy_files_recursive(from_path, dest_path)
+
+
+class SyncStats:
+    def __init__(self):
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.pruned_files = 0
+        self.strategies = {}
+
+    def report(self):
+        report = (
+            f"Static sync: copied {self.copied_files} files ({self.copied_bytes} bytes), "
+            f"skipped {self.skipped_files} unchanged ({self.skipped_bytes} bytes), "
+            f"pruned {self.pruned_files}"
+        )
+        if self.strategies:
+            used = ", ".join(f"{name}: {count}" for name, count in sorted(self.strategies.items()))
+            report += f" [{used}]"
+        return report
+
+
+def is_unchanged(from_path, dest_path, use_hash=False, optimized=None, published=None):
+    if not os.path.isfile(dest_path):
+        return False
+    source_stat = os.stat(from_path)
+    dest_stat = os.stat(dest_path)
+    if published is not None and _matches_published(source_stat, dest_stat, published):
+        # A deduplicated output shares its original's inode and mtime, so
+        # it is compared with the stats recorded when it was published.
+        if source_stat.st_mtime_ns == published["source_mtime_ns"]:
+            return True
+        if hash_file(from_path) == published["hash"]:
+            published["source_mtime_ns"] = source_stat.st_mtime_ns
+            return True
+        return False
+    if optimized is not None and optimized["source_size"] == source_stat.st_size:
+        # Rewritten after the copy (e.g. an optimized PNG), keeping the
+        # source's mtime; current as long as both still match the record.
+        return (
+            dest_stat.st_size == optimized["size"]
+            and dest_stat.st_mtime_ns == source_stat.st_mtime_ns
+        )
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+    if use_hash and hash_file(from_path) == hash_file(dest_path):
+        # Same bytes, different mtime: align the mtime so the next run
+        # can skip the file without hashing it again.
+        os.utime(dest_path, ns=(dest_stat.st_atime_ns, source_stat.st_mtime_ns))
+        return True
+    return False
+
+
+def _matches_published(source_stat, dest_stat, published):
+    return (
+        source_stat.st_size == published["source_size"]
+        and dest_stat.st_size == published["size"]
+        and dest_stat.st_mtime_ns == published["mtime_ns"]
+    )
+
+
+def sync_files_recursive(
+    source_dir_path, dest_dir_path, manifest=None, use_hash=False, stats=None, publisher=None
+):
+    if stats is None:
+        stats = SyncStats()
+    if publisher is None:
+        publisher = AssetPublisher("copy")
+    seen = []
+    pending = []
+    optimized = manifest.optimized_assets if manifest is not None else {}
+    hashes = manifest.asset_hashes if manifest is not None else {}
+    if not publisher.dedupe:
+        # Without deduplication every output is its own copy again.
+        hashes.clear()
+    _sync_dir(source_dir_path, dest_dir_path, use_hash, stats, seen, pending, optimized, hashes)
+
+    def source_path(dest_path):
+        return os.path.join(source_dir_path, os.path.relpath(dest_path, dest_dir_path))
+
+    published = {}
+    if publisher.dedupe and manifest is not None:
+        # New files may duplicate any output already in place, not just
+        # each other; outputs that predate deduplication are hashed once.
+        replaced = set(dest_path for _, dest_path in pending)
+        for dest_path in seen:
+            if dest_path in replaced:
+                continue
+            record = hashes.get(dest_path)
+            if record is None or not _matches_published(
+                os.stat(source_path(dest_path)), os.stat(dest_path), record
+            ):
+                from_path = source_path(dest_path)
+                manifest.record_asset_hash(dest_path, from_path, hash_file(from_path))
+            published.setdefault(hashes[dest_path]["hash"], dest_path)
+
+    for strategy in publisher.publish(pending, published):
+        stats.strategies[strategy] = stats.strategies.get(strategy, 0) + 1
+
+    if manifest is not None:
+        if publisher.dedupe:
+            for from_path, dest_path in pending:
+                digest = publisher.digests.get(dest_path) or hash_file(from_path)
+                manifest.record_asset_hash(dest_path, from_path, digest)
+        for dest_path in seen:
+            manifest.record_asset(dest_path, source_path(dest_path))
+        for dest_path in manifest.remove_missing_assets(seen):
+            if os.path.isfile(dest_path):
+                log(f" - {dest_path}", per_file)
+                os.remove(dest_path)
+                stats.pruned_files += 1
+                _remove_empty_dirs(os.path.dirname(dest_path), dest_dir_path)
+    return stats
+
+
+def _sync_dir(source_dir_path, dest_dir_path, use_hash, stats, seen, pending, optimized, hashes):
+    if not os.path.exists(dest_dir_path):
+        os.mkdir(dest_dir_path)
+
+    for filename in os.listdir(source_dir_path):
+        from_path = os.path.join(source_dir_path, filename)
+        dest_path = os.path.join(dest_dir_path, filename)
+        if os.path.isfile(from_path):
+            seen.append(dest_path)
+            size = os.path.getsize(from_path)
+            if is_unchanged(
+                from_path, dest_path, use_hash, optimized.get(dest_path), hashes.get(dest_path)
+            ):
+                stats.skipped_files += 1
+                stats.skipped_bytes += size
+                continue
+            log(f" * {from_path} -> {dest_path}", per_file)
+            pending.append((from_path, dest_path))
+            stats.copied_files += 1
+            stats.copied_bytes += size
+        else:
+            _sync_dir(from_path, dest_path, use_hash, stats, seen, pending, optimized, hashes)
+
+
+def _remove_empty_dirs(dir_path, root_dir_path):
+    root = os.path.abspath(root_dir_path)
+    dir_path = os.path.abspath(dir_path)
+    while dir_path != root and dir_path.startswith(root) and not os.listdir(dir_path):
+        os.rmdir(dir_path)
+        dir_path = os.path.dirname(dir_path)
@@ -1,24 +1,55 @@
+from types import MappingProxyType
+
+
+def freeze_props(props):
+    if props is None or type(props) is tuple:
+        return props
+    return tuple(props.items())
+
+
 class HTMLNode:
+    # Trees can hold millions of nodes, so no per-instance __dict__; props
+    # are kept as an immutable tuple of (key, value) pairs and children
+    # lists are referenced, never copied.
+    __slots__ = ("tag", "value", "children", "_props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
         self.children = children
-        self.props = props
+        self._props = freeze_props(props)
+
+    @property
+    def props(self):
+        # A read-only view: writing to it raises, since the node keeps its
+        # own frozen copy. Assign a new dict to node.props instead.
+        if self._props is None:
+            return None
+        return MappingProxyType(dict(self._props))
+
+    @props.setter
+    def props(self, props):
+        self._props = freeze_props(props)
 
     def to_html(self):
         raise NotImplementedError("to_html method not implemented")
 
+    def render_to(self, stream):
+        stream.write(self.to_html())
+
     def props_to_html(self):
-        if self.props is None:
+        if self._props is None:
             return ""
         else:
-            return " " + " ".join([f"{key}=\"{value}\"" for key, value in self.props.items()])
+            return " " + " ".join([f"{key}=\"{value}\"" for key, value in self._props])
 
     def __repr__(self):
-        return f"HTMLNode({self.tag}, {self.value}, {self.children}, {self.props})"
+        return f"HTMLNode({self.tag}, {self.value}, {self.children}, {self.props and dict(self.props)})"
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         super().__init__(tag, value, None, props)
 
@@ -31,19 +62,51 @@ class LeafNode(HTMLNode):
             return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
 
     def __repr__(self):
-        return f"LeafNode({self.tag}, {self.value}, {self.children}, {self.props})"
+        return f"LeafNode({self.tag}, {self.value}, {self.children}, {self.props and dict(self.props)})"
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, None, children, props)
 
     def to_html(self):
+        parts = []
+        self._render(parts.append)
+        return "".join(parts)
+
+    def render_to(self, stream):
+        self._render(stream.write)
+
+    def _check(self):
         if self.tag is None:
             raise ValueError("Invalid HTML: no tag")
         if self.children is None:
             raise ValueError("Invalid HTML: no children")
-        children_html = ""
-        for child in self.children:
-            children_html += child.to_html()
-        return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+
+    def _render(self, write):
+        # Depth-first walk with an explicit stack of child iterators instead
+        # of recursion, so deep trees can't hit the recursion limit and each
+        # piece of markup is written once instead of being copied into every
+        # ancestor's string.
+        self._check()
+        write(f"<{self.tag}{self.props_to_html()}>")
+        children = iter(self.children)
+        closing_tag = f"</{self.tag}>"
+        stack = []
+        while True:
+            for child in children:
+                if isinstance(child, ParentNode):
+                    child._check()
+                    write(f"<{child.tag}{child.props_to_html()}>")
+                    stack.append((children, closing_tag))
+                    children = iter(child.children)
+                    closing_tag = f"</{child.tag}>"
+                    break
+                write(child.to_html())
+            else:
+                write(closing_tag)
+                if not stack:
+                    return
+                children, closing_tag = stack.pop()
@@ -1,12 +1,24 @@
 import re
-from textnode import TextNode
+from textnode import (
+    TextNode,
+    text_type_text,
+    text_type_bold,
+    text_type_italic,
+    text_type_code,
+    text_type_link,
+    text_type_image,
+)
 
-text_type_text = "text"
-text_type_bold = "bold"
-text_type_italic = "italic"
-text_type_code = "code"
-text_type_link = "link"
-text_type_image = "image"
+image_pattern = re.compile(r"\!\[(.*?)\]\((.*?)\)")
+link_pattern = re.compile(r"\[(.*?)\]\((.*?)\)")
+
+# Delimiters in the order the split passes apply them: a "*" or "`" inside
+# a bold section is literal text, and so on down the list.
+inline_delimiters = (
+    ("**", text_type_bold),
+    ("*", text_type_italic),
+    ("`", text_type_code),
+)
 
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
@@ -31,11 +43,11 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
 
 
 def extract_markdown_images(text):
-    return re.findall(r"\!\[(.*?)\]\((.*?)\)", text)
+    return image_pattern.findall(text)
 
 
 def extract_markdown_links(text):
-    return re.findall(r"\[(.*?)\]\((.*?)\)", text)
+    return link_pattern.findall(text)
 
 
 def split_nodes_image(old_nodes):
@@ -99,10 +111,58 @@ def split_nodes_link(old_nodes):
 
 
 def text_to_textnodes(text):
-    nodes = [TextNode(text, text_type_text)]
-    nodes = split_nodes_delimiter(nodes, "**", text_type_bold)
-    nodes = split_nodes_delimiter(nodes, "*", text_type_italic)
-    nodes = split_nodes_delimiter(nodes, "`", text_type_code)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+    # Equivalent to running split_nodes_delimiter for each inline delimiter
+    # and then split_nodes_image and split_nodes_link, but done as one walk
+    # over (start, end) ranges of the original string: no intermediate node
+    # lists, and TextNodes are only built for the final tokens.
+    nodes = []
+    _split_range(text, 0, len(text), 0, nodes)
     return nodes
+
+
+def _split_range(text, start, end, level, nodes):
+    if level == len(inline_delimiters):
+        _split_images_range(text, start, end, nodes)
+        return
+    delimiter, text_type = inline_delimiters[level]
+    found = text.find(delimiter, start, end)
+    if found == -1:
+        _split_range(text, start, end, level + 1, nodes)
+        return
+    inside = False
+    while True:
+        stop = end if found == -1 else found
+        if stop > start:
+            if inside:
+                nodes.append(TextNode(text[start:stop], text_type))
+            else:
+                _split_range(text, start, stop, level + 1, nodes)
+        if found == -1:
+            break
+        inside = not inside
+        start = found + len(delimiter)
+        found = text.find(delimiter, start, end)
+    if inside:
+        raise ValueError("Invalid markdown, formatted section not closed")
+
+
+def _split_images_range(text, start, end, nodes):
+    if text.find("](", start, end) == -1:
+        if end > start:
+            nodes.append(TextNode(text[start:end], text_type_text))
+        return
+    for match in image_pattern.finditer(text, start, end):
+        _split_links_range(text, start, match.start(), nodes)
+        nodes.append(TextNode(match.group(1), text_type_image, match.group(2)))
+        start = match.end()
+    _split_links_range(text, start, end, nodes)
+
+
+def _split_links_range(text, start, end, nodes):
+    for match in link_pattern.finditer(text, start, end):
+        if match.start() > start:
+            nodes.append(TextNode(text[start:match.start()], text_type_text))
+        nodes.append(TextNode(match.group(1), text_type_link, match.group(2)))
+        start = match.end()
+    if end > start:
+        nodes.append(TextNode(text[start:end], text_type_text))
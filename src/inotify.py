@@ -0,0 +1,185 @@
+import ctypes
+import errno
+import os
+import struct
+import weakref
+from stat import S_ISREG
+
+# inotify through libc, so the watcher is told what changed instead of
+# stat-ing every file on every poll. None where it isn't available.
+try:
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.inotify_init1
+    libc.inotify_add_watch
+    libc.inotify_rm_watch
+except (OSError, AttributeError, TypeError):
+    libc = None
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+watch_mask = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+# struct inotify_event: wd, mask, cookie and name length, then the name.
+event_header = struct.Struct("iIII")
+
+
+class InotifyTree:
+    # The same {path: (mtime_ns, size)} snapshot as watch.snapshot_tree for
+    # a few root directories, kept up to date from inotify events. Only
+    # the paths named in events are looked at again, so an idle poll reads
+    # an empty event queue and nothing else.
+    def __init__(self, roots):
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+        self._finalizer = weakref.finalize(self, os.close, fd)
+        self.roots = roots
+        # {watch descriptor: directory} and the reverse.
+        self.watches = {}
+        self.dirs = {}
+        self.files = {}
+        for root in roots:
+            self.scan(root)
+
+    def close(self):
+        self._finalizer()
+
+    def scan(self, dir_path):
+        # The watch goes in before the listing, so nothing created in
+        # between is missed.
+        if os.path.islink(dir_path) or not self.add_watch(dir_path):
+            return
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.scan(entry.path)
+                    elif entry.is_file():
+                        self.stat_file(entry.path)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+
+    def add_watch(self, dir_path):
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(dir_path), watch_mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise OSError(error, f"Cannot watch {dir_path}")
+        self.watches[wd] = dir_path
+        self.dirs[dir_path] = wd
+        return True
+
+    def forget_dir(self, dir_path):
+        # Drops a directory that was removed or moved away, and everything
+        # under it. A moved directory keeps its watches, which would report
+        # the old paths, unless they were already taken over by a rescan at
+        # the new path.
+        prefix = os.path.join(dir_path, "")
+        for path in [path for path in self.dirs if path == dir_path or path.startswith(prefix)]:
+            wd = self.dirs.pop(path)
+            if self.watches.get(wd) == path:
+                del self.watches[wd]
+                libc.inotify_rm_watch(self.fd, wd)
+        for path in [path for path in self.files if path.startswith(prefix)]:
+            del self.files[path]
+
+    def stat_file(self, path):
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            stat = None
+        if stat is None or not S_ISREG(stat.st_mode):
+            self.files.pop(path, None)
+        else:
+            self.files[path] = (stat.st_mtime_ns, stat.st_size)
+
+    def read_events(self):
+        # The paths named by pending events, or None if the queue overflowed
+        # and events were lost.
+        touched = set()
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = event_header.unpack_from(data, offset)
+                offset += event_header.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                dir_path = self.watches.get(wd)
+                if dir_path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory is gone, or can't be watched any more;
+                    # it is scanned again below if it is still there.
+                    del self.watches[wd]
+                    if self.dirs.get(dir_path) == wd:
+                        self.forget_dir(dir_path)
+                    touched.add(dir_path)
+                    continue
+                touched.add(os.path.join(dir_path, os.fsdecode(name)) if name else dir_path)
+        return None if overflowed else touched
+
+    def rescan(self):
+        for wd in self.watches:
+            libc.inotify_rm_watch(self.fd, wd)
+        self.watches.clear()
+        self.dirs.clear()
+        self.files.clear()
+        for root in self.roots:
+            self.scan(root)
+
+    def snapshot(self):
+        touched = self.read_events()
+        if touched is None:
+            self.rescan()
+        else:
+            # Paths that went away first, so a directory moved within the
+            # tree is dropped at its old path before it is scanned at the new.
+            for path in sorted(touched, key=os.path.lexists):
+                if os.path.isdir(path) and not os.path.islink(path):
+                    if path not in self.dirs:
+                        self.scan(path)
+                else:
+                    if path in self.dirs:
+                        self.forget_dir(path)
+                    self.stat_file(path)
+        # A root that did not exist yet may have been created since.
+        for root in self.roots:
+            if root not in self.dirs:
+                self.scan(root)
+        return dict(self.files)
+
+
+def watch_trees(roots):
+    # An InotifyTree over the roots, or None where inotify can't be used.
+    if libc is None:
+        return None
+    try:
+        return InotifyTree(roots)
+    except OSError:
+        return None
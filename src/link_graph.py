@@ -0,0 +1,172 @@
+import os
+import posixpath
+from urllib.parse import unquote, urlsplit
+
+from asset_fingerprint import path_to_url
+from textnode import text_type_image, text_type_link
+
+# The LinkGraph collecting page links in this process, or None.
+active = None
+
+
+link_text_types = (text_type_link, text_type_image)
+
+
+def resolve_link(url, page_url):
+    # The site path an internal link points at, or None for external links
+    # and links within the page. Relative links resolve against the page's
+    # URL, as a browser would.
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path.startswith("/"):
+        path = posixpath.dirname(page_url) + "/" + path
+    directory = path.endswith("/")
+    path = "/" + posixpath.normpath(path).lstrip("/")
+    if directory and path != "/":
+        path += "/"
+    return path
+
+
+def link_candidates(path):
+    # Output files that serve a site path: directories serve their
+    # index.html, and the server redirects /a to /a/.
+    if path.endswith("/"):
+        return (path + "index.html",)
+    return (path, path + "/index.html")
+
+
+class LinkGraph:
+    # Every link and image target of every page, kept in the manifest with
+    # the hash of the source it was read from, the site paths the links
+    # resolve to and the links that were dead at the last check. Targets
+    # depend on nothing but the markdown and the page's URL, so only new or
+    # edited pages need collecting, and only those and the pages linking to
+    # outputs that came or went need checking again.
+    def __init__(self, dir_path_public):
+        self.dir_path_public = dir_path_public
+        self.public_prefix = os.path.join(dir_path_public, "")
+        # {source path: [urls]} for pages rendered since the last update.
+        self.pages = {}
+        # Pages whose links changed since the last check.
+        self.changed = set()
+        # {output url: set(source paths)} of the pages with a link that
+        # could be served by it. Built on the first check that needs it and
+        # kept up to date from then on.
+        self.linkers = None
+
+    def add_page(self, from_path, urls):
+        self.pages[from_path] = urls
+
+    def take_pages(self):
+        pages = self.pages
+        self.pages = {}
+        return pages
+
+    def output_url(self, path):
+        # path_to_url without the relpath, for the many outputs that are
+        # plainly under the public directory.
+        if path.startswith(self.public_prefix):
+            return "/" + path[len(self.public_prefix):].replace(os.sep, "/")
+        return path_to_url(path, self.dir_path_public)
+
+    def update(self, manifest, link_source):
+        # Brings manifest.links in line with manifest.pages. Pages that were
+        # not rendered and have no links recorded for their current source
+        # (output cache hits, or the first checked build) are read through
+        # link_source, which returns the urls for a source path.
+        rendered = self.take_pages()
+        links = {}
+        for from_path, entry in manifest.pages.items():
+            source_hash = entry["source_hash"]
+            recorded = manifest.links.get(from_path)
+            current = recorded is not None and recorded["source_hash"] == source_hash
+            if from_path in rendered:
+                urls = rendered[from_path]
+            elif current and recorded.get("dest") == entry["dest"] and "dead" in recorded:
+                links[from_path] = recorded
+                continue
+            elif current:
+                urls = recorded["urls"]
+            else:
+                urls = link_source(from_path)
+            page_url = self.output_url(entry["dest"])
+            links[from_path] = {
+                "source_hash": source_hash,
+                "dest": entry["dest"],
+                "urls": urls,
+                "paths": [resolve_link(url, page_url) for url in urls],
+                "dead": [],
+            }
+            self.changed.add(from_path)
+            self.reindex(from_path, recorded, links[from_path])
+        for from_path in manifest.links.keys() - links.keys():
+            self.reindex(from_path, manifest.links[from_path], None)
+        manifest.links = links
+
+    def reindex(self, from_path, old, new):
+        if self.linkers is None:
+            return
+        for entry, add in ((old, False), (new, True)):
+            if entry is None:
+                continue
+            for path in entry.get("paths", ()):
+                if path is None:
+                    continue
+                for candidate in link_candidates(path):
+                    if add:
+                        self.linkers.setdefault(candidate, set()).add(from_path)
+                    else:
+                        self.linkers.get(candidate, set()).discard(from_path)
+
+    def build_index(self, manifest):
+        self.linkers = {}
+        for from_path, entry in manifest.links.items():
+            self.reindex(from_path, None, entry)
+
+    def check(self, manifest):
+        # (source path, url) for every internal link whose target is
+        # neither a generated page nor a copied asset. Only pages whose
+        # links changed, and pages linking to an output that was added or
+        # removed since manifest.link_targets was recorded, are looked at
+        # again; the rest keep the dead links recorded for them.
+        targets = set()
+        for entry in manifest.pages.values():
+            targets.add(self.output_url(entry["dest"]))
+        for dest_path in manifest.assets:
+            targets.add(self.output_url(dest_path))
+        recheck = self.changed
+        self.changed = set()
+        moved = targets.symmetric_difference(manifest.link_targets)
+        if moved:
+            if self.linkers is None:
+                self.build_index(manifest)
+            for target in moved:
+                recheck.update(self.linkers.get(target, ()))
+        for from_path in recheck:
+            entry = manifest.links.get(from_path)
+            if entry is None:
+                continue
+            entry["dead"] = [
+                url for url, path in zip(entry["urls"], entry["paths"])
+                if path is not None
+                and not any(candidate in targets for candidate in link_candidates(path))
+            ]
+        if moved:
+            manifest.link_targets = sorted(targets)
+        dead = []
+        for from_path in sorted(manifest.links):
+            for url in manifest.links[from_path]["dead"]:
+                dead.append((from_path, url))
+        return dead
+
+
+def dead_link_message(from_path, url):
+    return f"Dead link in {from_path}: {url}"
+
+
+def configure(dir_path_public):
+    global active
+    active = LinkGraph(dir_path_public) if dir_path_public else None
+    return active
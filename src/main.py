@@ -1,23 +1,330 @@
+import argparse
 import os
 import shutil
 
-from copy_static import copy_files_recursive
-from page_generation import generate_pages_recursive
+import asset_fingerprint
+import block_cache
+import build_log
+import build_profile
+import link_graph
+import output_cache
+import png_optimize
+import search_index
+from asset_fingerprint import fingerprint_assets, remove_fingerprinted_assets
+from asset_publish import AssetPublisher, publish_strategies
+from async_pages import generate_pages_async
+from build_log import log
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+from output_cache import OutputCache
+from link_graph import dead_link_message
+from page_generation import generate_pages_recursive, page_links, page_search_text
+from precompress import precompress_tree, remove_precompressed
 
 
 dir_path_static = "./static"
 dir_path_public = "./public"
+dir_path_content = "./content"
+template_path = "./template.html"
+manifest_path = "./.build-manifest.json"
+png_cache_path = "./.png-cache"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Static site generator")
+    parser.add_argument(
+        "--full", action="store_true", help="Delete the output and rebuild every page"
+    )
+    parser.add_argument(
+        "--explain", action="store_true", help="Print why each page was rebuilt or skipped"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Number of worker processes for page generation"
+    )
+    parser.add_argument(
+        "--hash-assets",
+        action="store_true",
+        help="Compare static files by content hash when size matches but mtime differs",
+    )
+    parser.add_argument(
+        "--publish-strategy",
+        choices=("auto",) + publish_strategies,
+        default="auto",
+        help="How static files are placed in the output; falls back to a plain copy",
+    )
+    parser.add_argument(
+        "--copy-workers", type=int, default=4, help="Number of threads publishing static files"
+    )
+    parser.add_argument(
+        "--dedupe-assets",
+        action="store_true",
+        help="Store static files with identical content once, hardlinking the duplicates",
+    )
+    parser.add_argument(
+        "--fingerprint-assets",
+        action="store_true",
+        help="Publish content-hashed copies of static files and point pages at them",
+    )
+    parser.add_argument(
+        "--optimize-png",
+        action="store_true",
+        help="Losslessly recompress published PNGs and strip chunks browsers don't need",
+    )
+    parser.add_argument(
+        "--png-cache",
+        metavar="DIR",
+        default=png_cache_path,
+        help="Where --optimize-png keeps results, so each image is only optimized once",
+    )
+    parser.add_argument(
+        "--png-workers", type=int, default=os.cpu_count() or 1,
+        help="Number of worker processes for --optimize-png",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="Write a full-text index of the pages for the server's /search endpoint",
+    )
+    parser.add_argument(
+        "--no-link-check",
+        action="store_true",
+        help="Skip checking internal links and images against the generated site; "
+        "the check adds 30-40%% to a full build, little to an incremental one",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Fail the build when a page links to a missing page or asset",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Render pages block by block straight into the output file",
+    )
+    parser.add_argument(
+        "--async-io",
+        action="store_true",
+        help="Overlap directory scans, source reads and output writes with rendering",
+    )
+    parser.add_argument(
+        "--io-workers", type=int, default=8,
+        help="Number of concurrent reads and writes for --async-io",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="Write .gz siblings for compressible files in the output",
+    )
+    parser.add_argument(
+        "--gzip-level", type=int, default=9, choices=range(1, 10), metavar="1-9",
+        help="Compression level for --precompress",
+    )
+    parser.add_argument(
+        "--block-cache-mb",
+        type=float,
+        default=0,
+        help="MiB for reusing rendered HTML of blocks repeated across pages; off by "
+        "default, since on content without repeats the lookups make builds slower",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0,
+        help="Print a line for every copied file and generated page",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Only print errors"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time each page generation stage and print the slowest pages",
+    )
+    parser.add_argument(
+        "--profile-page",
+        metavar="PATH",
+        help="Run cProfile while generating this source page (implies --profile)",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="FILE",
+        default="page.prof",
+        help="Where to save the pstats dump for --profile-page",
+    )
+    parser.add_argument(
+        "--output-cache",
+        metavar="DIR",
+        help="Reuse rendered pages from this directory, which may be shared between machines",
+    )
+    parser.add_argument(
+        "--output-cache-mb",
+        type=float,
+        default=1024,
+        help="Evict least recently used pages from --output-cache above this size; 0 keeps all",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    cache = commands.add_parser("cache", help="Inspect or shrink an output cache")
+    cache_commands = cache.add_subparsers(dest="cache_command", required=True)
+    stats = cache_commands.add_parser("stats", help="Print the size of an output cache")
+    stats.add_argument("dir")
+    prune = cache_commands.add_parser("prune", help="Evict least recently used pages")
+    prune.add_argument("dir")
+    prune.add_argument(
+        "--max-mb", type=float, default=0, help="Size to shrink the cache to; 0 empties it"
+    )
+    return parser
+
+
+def parse_args(argv=None):
+    # Also used by server.py --watch for the build flags it is given.
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.copy_workers < 1:
+        parser.error("--copy-workers must be at least 1")
+    if args.block_cache_mb < 0:
+        parser.error("--block-cache-mb must not be negative")
+    if args.io_workers < 1:
+        parser.error("--io-workers must be at least 1")
+    if args.async_io and (args.stream or args.jobs > 1 or args.profile or args.profile_page):
+        parser.error("--async-io cannot be combined with --stream, --jobs or --profile")
+    if args.output_cache_mb < 0:
+        parser.error("--output-cache-mb must not be negative")
+    if args.png_workers < 1:
+        parser.error("--png-workers must be at least 1")
+    if args.strict and args.no_link_check:
+        parser.error("--strict cannot be combined with --no-link-check")
+    if args.command == "cache" and args.cache_command == "prune" and args.max_mb < 0:
+        parser.error("--max-mb must not be negative")
+    return args
 
 
 def main():
-    print("Deleting public directory...")
-    if os.path.exists(dir_path_public):
-        shutil.rmtree(dir_path_public)
+    args = parse_args()
+    if args.command == "cache":
+        cache_command(args)
+        return
+    build(args)
+
+
+def cache_command(args):
+    cache = OutputCache(args.dir)
+    if args.cache_command == "prune":
+        removed, freed = cache.prune(int(args.max_mb * 2**20))
+        print(f"Output cache: removed {removed} page(s), freed {freed} bytes")
+    print(cache.stats().report())
+
+
+def build(args):
+    if args.quiet:
+        build_log.set_verbosity(build_log.quiet)
+    else:
+        build_log.set_verbosity(build_log.summary + args.verbose)
+    # Kept after the build so that watch-mode rebuilds reuse the entries.
+    block_cache.configure(int(args.block_cache_mb * 2**20))
+    output_cache.configure(args.output_cache)
+    profile = None
+    if args.profile or args.profile_page:
+        profile = build_profile.enable(args.profile_page, args.profile_dump)
+    try:
+        return build_site(args)
+    finally:
+        if profile is not None:
+            build_profile.disable()
+            print(profile.report())
+
+
+def build_site(args):
+    if args.full:
+        log("Deleting public directory...")
+        if os.path.exists(dir_path_public):
+            shutil.rmtree(dir_path_public)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    manifest = BuildManifest.load(manifest_path)
+    png_optimize.configure(args.png_cache if args.optimize_png else None, args.png_workers)
+    if png_optimize.active is None:
+        # Static sync then replaces the optimized copies with the originals.
+        manifest.optimized_assets.clear()
+
+    log("Syncing static files to public directory...")
+    publisher = AssetPublisher(args.publish_strategy, args.copy_workers, args.dedupe_assets)
+    stats = sync_files_recursive(
+        dir_path_static, dir_path_public, manifest, args.hash_assets, publisher=publisher
+    )
+    log(stats.report())
+    if png_optimize.active is not None:
+        log(png_optimize.active.optimize_assets(manifest, manifest.assets).report())
+
+    asset_map = None
+    if args.fingerprint_assets:
+        asset_map, fingerprint_stats = fingerprint_assets(dir_path_public, manifest.assets)
+        log(fingerprint_stats.report())
+    else:
+        remove_fingerprinted_assets(dir_path_public)
+    # Blocks rendered with other asset URLs must not be reused.
+    if asset_fingerprint.configure(asset_map) and block_cache.active is not None:
+        block_cache.active.clear()
+    search_index.configure(dir_path_public if args.search_index else None)
+    link_graph.configure(None if args.no_link_check else dir_path_public)
+
+    if args.async_io:
+        generate_pages_async(
+            dir_path_content, template_path, dir_path_public, manifest, args.explain,
+            args.io_workers,
+        )
+    else:
+        generate_pages_recursive(
+            dir_path_content, template_path, dir_path_public, manifest, args.explain, args.jobs,
+            args.stream,
+        )
+    dead_links = None
+    if link_graph.active is not None:
+        # Checked before saving, since the manifest keeps the results.
+        link_graph.active.update(manifest, page_links)
+        dead_links = link_graph.active.check(manifest)
+    manifest.save()
+    index_path = os.path.join(dir_path_public, search_index.search_index_name)
+    if search_index.active is not None:
+        indexed = search_index.active.write(manifest, page_search_text)
+        log(f"Search index: {indexed} page(s) in {os.path.getsize(index_path)} bytes")
+    elif os.path.exists(index_path):
+        os.remove(index_path)
+    if block_cache.active is not None:
+        log(block_cache.active.report())
+    if output_cache.active is not None:
+        log(output_cache.active.report())
+        if args.output_cache_mb > 0:
+            output_cache.active.prune(int(args.output_cache_mb * 2**20))
+
+    if args.precompress:
+        stats = precompress_tree(
+            dir_path_public, args.gzip_level, protected=set(manifest.assets),
+            excluded={index_path},
+        )
+        log(stats.report())
+    else:
+        remove_precompressed(dir_path_public, set(manifest.assets))
+
+    if dead_links is not None:
+        check_links(manifest, dead_links, args.strict)
+    return manifest
 
-    print("Copying static files to public directory...")
-    copy_files_recursive(dir_path_static, dir_path_public)
 
-    generate_pages_recursive("./content", "./template.html", dir_path_public)
+def check_links(manifest, dead, strict):
+    # Reported last, after everything else the build prints. Dead links
+    # are errors under --strict and warnings otherwise.
+    links = sum(len(entry["urls"]) for entry in manifest.links.values())
+    for from_path, url in dead:
+        if strict:
+            log(f"Error: {dead_link_message(from_path, url)}", build_log.quiet)
+        else:
+            log(f"Warning: {dead_link_message(from_path, url)}")
+    log(f"Links: checked {links} in {len(manifest.links)} page(s), {len(dead)} dead")
+    if strict and dead:
+        raise SystemExit(f"Build failed: {len(dead)} dead link(s)")
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from atomic_write import write_bytes_if_changed
+
+# The output cache used by page generation in this process, or None.
+active = None
+
+# Temp files older than this are left over from a crashed writer.
+stale_tmp_seconds = 3600
+
+
+def make_key(parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CacheStats:
+    def __init__(self, entries=0, size=0, oldest=None, newest=None):
+        self.entries = entries
+        self.size = size
+        self.oldest = oldest
+        self.newest = newest
+
+    def report(self):
+        lines = [f"Output cache: {self.entries} page(s), {self.size} bytes"]
+        if self.entries:
+            lines.append(f"  least recently used: {time.ctime(self.oldest)}")
+            lines.append(f"  most recently used:  {time.ctime(self.newest)}")
+        return "\n".join(lines)
+
+
+class OutputCache:
+    # Rendered pages stored by a key over everything they were built from,
+    # so any build of the same inputs, on any machine sharing the directory,
+    # can copy the page instead of rendering it. Entries are only ever
+    # created by an atomic rename, so readers see a whole page or none; the
+    # mtime of an entry records its last use for eviction. Next to a page
+    # is what the link graph and search index collected from it, so a hit
+    # does not have to read the markdown again for them.
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def entry_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], f"{key[2:]}.html")
+
+    def text_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], f"{key[2:]}.json")
+
+    def fetch(self, key, dest_path):
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Missing, or just evicted by another process.
+            self.misses += 1
+            return False
+        write_bytes_if_changed(dest_path, data)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self.hits += 1
+        return True
+
+    def fetch_text(self, key):
+        # The text stored with a page, or None.
+        try:
+            with open(self.text_path(key), "rb") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, key, source_path, text=None):
+        # `text` is JSON kept next to the page. It goes in first, so a page
+        # is rarely seen without it.
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        if text is not None:
+            self.write_entry(self.text_path(key), io.BytesIO(json.dumps(text).encode()))
+        with open(source_path, "rb") as f:
+            self.write_entry(entry_path, f)
+        self.stored += 1
+
+    def write_entry(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(data, out)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def entries(self):
+        # (path, size, mtime) of every stored page; the size includes the
+        # text stored with it.
+        entries = []
+        if not os.path.isdir(self.objects_dir):
+            return entries
+        for fan_out in os.scandir(self.objects_dir):
+            if not fan_out.is_dir():
+                continue
+            pages = {}
+            text_sizes = {}
+            for entry in os.scandir(fan_out.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                stem, ext = os.path.splitext(entry.path)
+                if ext == ".json":
+                    text_sizes[stem] = stat.st_size
+                else:
+                    pages[stem] = (entry.path, stat.st_size, stat.st_mtime)
+            for stem, (path, size, mtime) in pages.items():
+                entries.append((path, size + text_sizes.get(stem, 0), mtime))
+        return entries
+
+    def stats(self):
+        entries = self.entries()
+        if not entries:
+            return CacheStats()
+        times = [entry[2] for entry in entries]
+        return CacheStats(
+            len(entries), sum(entry[1] for entry in entries), min(times), max(times)
+        )
+
+    def prune(self, max_size):
+        # Deletes least recently used pages until the cache fits in max_size
+        # bytes, plus temp files abandoned by crashed writers. Returns the
+        # number of pages and bytes removed.
+        removed = freed = 0
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in entries:
+            if size <= max_size:
+                break
+            for entry_path in (path, os.path.splitext(path)[0] + ".json"):
+                try:
+                    os.remove(entry_path)
+                except FileNotFoundError:
+                    pass
+            size -= entry_size
+            removed += 1
+            freed += entry_size
+        if os.path.isdir(self.tmp_dir):
+            cutoff = time.time() - stale_tmp_seconds
+            for entry in os.scandir(self.tmp_dir):
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        return removed, freed
+
+    def take_stats(self):
+        stats = (self.hits, self.misses, self.stored)
+        self.hits = self.misses = self.stored = 0
+        return stats
+
+    def add_stats(self, stats):
+        hits, misses, stored = stats
+        self.hits += hits
+        self.misses += misses
+        self.stored += stored
+
+    def report(self):
+        return f"Output cache: {self.hits} hits, {self.misses} misses, {self.stored} stored"
+
+
+def configure(root):
+    global active
+    active = OutputCache(root) if root else None
+    return active
@@ -1,7 +1,30 @@
+import io
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from pathlib import Path
 
-from block_markdown import markdown_to_html_node
+import asset_fingerprint
+import block_cache
+import block_markdown
+import build_log
+import build_profile
+import link_graph
+import output_cache
+import search_index
+from atomic_write import replace_if_changed, temp_path, write_text_if_changed
+from block_markdown import (
+    iter_lexed_blocks,
+    lex_markdown,
+    lines_to_html_node,
+    markdown_to_html_node,
+)
+from build_log import log, per_file
+from build_manifest import RENDERER_VERSION, hash_file
+from htmlnode import ParentNode
+from page_text import PageText
+from template_engine import load_template
 
 
 def extract_title(markdown):
@@ -12,37 +35,514 @@ def extract_title(markdown):
     raise ValueError("No title found")
 
 
-def generate_page(from_path, template_path, dest_path):
-    print(
-        f"Generating page at {dest_path} from {from_path} and {template_path}...")
+def extract_title_from_file(f):
+    for line in f:
+        if line.startswith("# "):
+            return line[2:].removesuffix("\n")
+    raise ValueError("No title found")
+
+
+def generate_page(from_path, template_path, dest_path, streaming=False, site_root=None):
+    template = load_template(template_path)
+    write_page(from_path, template, dest_path, streaming, site_root)
+
+
+def write_page(from_path, template, dest_path, streaming=False, site_root=None):
+    log(f"Generating page at {dest_path} from {from_path} and {template.path}...", per_file)
+
+    dest_dir_path = os.path.dirname(dest_path)
+    if dest_dir_path:
+        os.makedirs(dest_dir_path, exist_ok=True)
+
+    render_collected(
+        from_path, dest_path, make_page, from_path, template, dest_path, streaming, site_root
+    )
+
+
+def make_page(from_path, template, dest_path, streaming=False, site_root=None):
+    # Returns False when the page came from the output cache without the
+    # text being collected wants stored alongside it.
+    # Profiled builds always render, so the timings describe the renderer.
+    profile = build_profile.active
+    if profile is not None:
+        args = (profile, from_path, template, dest_path, streaming, site_root)
+        if profile.wants_dump(from_path):
+            profile.run_dumped(write_page_profiled, *args)
+        else:
+            write_page_profiled(*args)
+        return True
+
+    cache = output_cache.active
+    if cache is None:
+        render_page(from_path, template, dest_path, streaming, site_root)
+        return True
+    collector = block_markdown.collecting
+    key = page_cache_key(from_path, template, dest_path, site_root)
+    if cache.fetch(key, dest_path):
+        return collector is not None and collector.restore(cache.fetch_text(key))
+    render_page(from_path, template, dest_path, streaming, site_root)
+    cache.store(key, dest_path, collector and collector.stored())
+    return True
+
+
+def render_collected(from_path, dest_path, render, *args):
+    # Calls render(*args) and, while a search index or link graph is being
+    # built, adds the page to them from the PageText that rendering filled.
+    # A False result means nothing was collected, for a cached page stored
+    # without it; such pages are picked up later through page_search_text
+    # and page_links.
+    indexer = search_index.active
+    graph = link_graph.active
+    if indexer is None and graph is None:
+        return render(*args)
+    collector = block_markdown.collecting = PageText(terms=indexer is not None)
+    try:
+        result = render(*args)
+    finally:
+        block_markdown.collecting = None
+    if result is not False:
+        add_collected(from_path, dest_path, collector)
+    return result
+
+
+def add_cached_text(from_path, dest_path, stored):
+    # Collects a page taken from the output cache from the text stored with
+    # it, as render_collected does for a rendered page.
+    if search_index.active is None and link_graph.active is None:
+        return
+    collector = PageText(terms=search_index.active is not None)
+    if collector.restore(stored):
+        add_collected(from_path, dest_path, collector)
+
+
+def add_collected(from_path, dest_path, collector):
+    indexer = search_index.active
+    graph = link_graph.active
+    if indexer is not None:
+        with open(from_path, "r") as f:
+            title = extract_title_from_file(f)
+        indexer.add_page(from_path, dest_path, title, collector.terms)
+    if graph is not None:
+        graph.add_page(from_path, collector.urls)
+
+
+def page_text(from_path, terms=True):
+    # (title, PageText) for a page the build did not render, through the
+    # same conversion rendering uses.
+    with open(from_path, "r") as f:
+        markdown = f.read()
+    collector = block_markdown.collecting = PageText(terms)
+    try:
+        markdown_to_html_node(markdown)
+    finally:
+        block_markdown.collecting = None
+    return extract_title(markdown), collector
+
+
+def page_search_text(from_path):
+    title, collector = page_text(from_path)
+    return title, collector.terms
+
+
+def page_links(from_path):
+    return page_text(from_path, terms=False)[1].urls
+
+
+def page_cache_key(from_path, template, dest_path, site_root=None, source_hash=None):
+    # Everything the rendered page depends on, in a form that is the same on
+    # every machine: the markdown, the compiled template, the renderer
+    # version, the asset map and the Date and Nav values when the template
+    # uses them.
+    if source_hash is None:
+        source_hash = hash_file(from_path)
+    parts = [RENDERER_VERSION, source_hash, template.digest]
+    if asset_fingerprint.active is not None:
+        parts.append(asset_fingerprint.active.digest)
+    placeholders = template.placeholders
+    if "Date" in placeholders:
+        parts.append(source_date(from_path))
+    if "Nav" in placeholders:
+        parts.append(breadcrumb_nav(dest_path, site_root))
+    return output_cache.make_key(parts)
+
+
+def render_page(from_path, template, dest_path, streaming=False, site_root=None):
+    if streaming:
+        write_page_streaming(from_path, template, dest_path, site_root)
+        return
 
     with open(from_path, "r") as f:
         markdown = f.read()
+    write_text_if_changed(dest_path, page_html(from_path, markdown, template, dest_path, site_root))
 
-    with open(template_path, "r") as f:
-        template = f.read()
 
-    html_node = markdown_to_html_node(markdown)
-    html = html_node.to_html()
+def page_html(from_path, markdown, template, dest_path, site_root=None):
+    cache = block_cache.active
+    if cache is not None:
+        html = cache.render_blocks(lex_markdown(markdown))
+    else:
+        html_node = markdown_to_html_node(markdown)
+        html = html_node.to_html()
     title = extract_title(markdown)
 
-    with open(dest_path, "w") as f:
-        f.write(template.replace("{{ Title }}",
-                title).replace("{{ Content }}", html))
+    out = io.StringIO()
+    template.render_to(out, page_values(from_path, dest_path, title, html, site_root))
+    return out.getvalue()
 
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path):
+def write_page_streaming(from_path, template, dest_path, site_root=None):
+    # Renders one block at a time straight into the {{ Content }} slot, so
+    # peak memory depends on the largest block rather than the document.
+    with open(from_path, "r") as f:
+        title = extract_title_from_file(f)
+
+    cache = block_cache.active
+
+    def write_content(out):
+        out.write("<div>")
+        with open(from_path, "r") as f:
+            for block in iter_lexed_blocks(f):
+                if cache is not None:
+                    out.write(cache.render(block))
+                else:
+                    lines_to_html_node(*block).render_to(out)
+        out.write("</div>")
+
+    tmp_path = temp_path(dest_path)
+    with open(tmp_path, "w") as out:
+        template.render_to(out, page_values(from_path, dest_path, title, write_content, site_root))
+    replace_if_changed(tmp_path, dest_path)
+
+
+def write_page_profiled(profile, from_path, template, dest_path, streaming, site_root):
+    # The same steps as write_page, with a timestamp after each one. Blocks
+    # rendered through the block cache count entirely as "convert".
+    timer = profile.start_page(from_path)
+    cache = block_cache.active
+    if streaming:
+        with open(from_path, "r") as f:
+            title = extract_title_from_file(f)
+        timer.mark("read")
+
+        def write_content(out):
+            out.write("<div>")
+            with open(from_path, "r") as f:
+                for block in iter_lexed_blocks(f):
+                    timer.mark("split")
+                    if cache is not None:
+                        html = cache.render(block)
+                        timer.mark("convert")
+                        out.write(html)
+                        timer.mark("to_html")
+                        continue
+                    node = lines_to_html_node(*block)
+                    timer.mark("convert")
+                    # Streaming renders straight into the file, so this
+                    # includes the write.
+                    node.render_to(out)
+                    timer.mark("to_html")
+            out.write("</div>")
+
+        tmp_path = temp_path(dest_path)
+        with open(tmp_path, "w") as out:
+            template.render_to(
+                out, page_values(from_path, dest_path, title, write_content, site_root))
+            timer.mark("template")
+        replace_if_changed(tmp_path, dest_path)
+        timer.mark("write")
+        timer.finish()
+        return
+
+    with open(from_path, "r") as f:
+        markdown = f.read()
+    timer.mark("read")
+    blocks = list(lex_markdown(markdown))
+    timer.mark("split")
+    if cache is not None:
+        html = cache.render_blocks(blocks)
+        timer.mark("convert")
+    else:
+        html_node = ParentNode("div", [lines_to_html_node(*block) for block in blocks], None)
+        timer.mark("convert")
+        html = html_node.to_html()
+    timer.mark("to_html")
+    out = io.StringIO()
+    title = extract_title(markdown)
+    template.render_to(out, page_values(from_path, dest_path, title, html, site_root))
+    timer.mark("template")
+    write_text_if_changed(dest_path, out.getvalue())
+    timer.mark("write")
+    timer.finish()
+
+
+def page_values(from_path, dest_path, title, content, site_root=None):
+    return {
+        "Title": title,
+        "Content": content,
+        "Date": lambda out: out.write(source_date(from_path)),
+        "Nav": lambda out: out.write(breadcrumb_nav(dest_path, site_root)),
+    }
+
+
+def source_date(from_path):
+    return date.fromtimestamp(os.stat(from_path).st_mtime).isoformat()
+
+
+def breadcrumb_nav(dest_path, site_root=None):
+    links = ['<a href="/">Home</a>']
+    if site_root is not None:
+        sections = Path(os.path.relpath(dest_path, site_root)).parts[:-1]
+        for i, section in enumerate(sections):
+            links.append(f'<a href="/{"/".join(sections[:i + 1])}/">{section}</a>')
+    return f"<nav>{' / '.join(links)}</nav>"
+
+
+def page_dest_path(from_path, dir_path_content, dest_dir_path):
+    relative = Path(os.path.relpath(from_path, dir_path_content))
+    return os.path.join(dest_dir_path, *relative.parent.parts, f"{relative.stem}.html")
+
+
+def scan_pages_dir(dir_path_content, dest_dir_path):
+    # The pages in one directory and the subdirectories to scan next, each
+    # with its output location. scandir answers is_file from the directory
+    # listing, so no extra stat per entry.
+    pages = []
+    subdirs = []
+    with os.scandir(dir_path_content) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stem, suffix = os.path.splitext(entry.name)
+                if suffix == ".md":
+                    pages.append((entry.path, os.path.join(dest_dir_path, f"{stem}.html")))
+            else:
+                subdirs.append((entry.path, os.path.join(dest_dir_path, entry.name)))
+    return pages, subdirs
+
+
+def find_pages(dir_path_content, dest_dir_path):
+    pages, subdirs = scan_pages_dir(dir_path_content, dest_dir_path)
+    for subdir_path, subdir_dest_path in subdirs:
+        pages.extend(find_pages(subdir_path, subdir_dest_path))
+    return pages
+
+
+section_template_name = "_template.html"
+
+
+def resolve_template(from_path, dir_path_content, default_template_path, cache=None):
+    # The nearest _template.html from the page's directory up to the content
+    # root wins; otherwise the site-wide template is used.
+    dir_path = os.path.dirname(from_path)
+    if cache is not None and dir_path in cache:
+        return cache[dir_path]
+    template_path = default_template_path
+    root = os.path.abspath(dir_path_content)
+    current = dir_path
+    while True:
+        candidate = os.path.join(current, section_template_name)
+        if os.path.isfile(candidate):
+            template_path = candidate
+            break
+        if os.path.abspath(current) == root or os.path.dirname(current) == current:
+            break
+        current = os.path.dirname(current)
+    if cache is not None:
+        cache[dir_path] = template_path
+    return template_path
+
+
+def template_dependencies(template_path, file_hashes=None):
+    # {path: hash} for the template and its partials; file_hashes lets one
+    # build hash each shared file once.
+    if file_hashes is None:
+        file_hashes = {}
+    dependencies = {}
+    for path in load_template(template_path).dependencies:
+        if path not in file_hashes:
+            file_hashes[path] = hash_file(path)
+        dependencies[path] = file_hashes[path]
+    return dependencies
+
+
+def page_dependencies(template_path, file_hashes=None):
+    # What a page's output depends on besides its source: the template files
+    # and, while assets are fingerprinted, the asset map.
+    dependencies = template_dependencies(template_path, file_hashes)
+    assets = asset_fingerprint.active
+    if assets is not None:
+        dependencies[assets.manifest_path] = assets.digest
+    return dependencies
+
+
+# Per-process state for pool workers. Templates are compiled on first use and
+# then served from load_template's cache for the rest of the worker's pages.
+_worker_streaming = False
+_worker_site_root = None
+
+
+def _init_worker(
+    streaming, site_root, verbosity=build_log.summary, profile=None, block_cache_size=0,
+    output_cache_root=None, asset_map=None, search_root=None, links_root=None,
+):
+    global _worker_streaming, _worker_site_root
+    _worker_streaming = streaming
+    _worker_site_root = site_root
+    build_log.set_verbosity(verbosity)
+    block_cache.configure(block_cache_size)
+    output_cache.configure(output_cache_root)
+    asset_fingerprint.configure(asset_map)
+    search_index.configure(search_root)
+    link_graph.configure(links_root)
+    if profile is not None:
+        build_profile.enable(*profile)
+    else:
+        build_profile.disable()
+
+
+def _generate_chunk(pages):
+    for from_path, dest_path, template_path in pages:
+        write_page(
+            from_path, load_template(template_path), dest_path, _worker_streaming,
+            _worker_site_root,
+        )
+    # Page timings and cache counters travel back to the parent with the
+    # chunk result.
+    timings = []
+    if build_profile.active is not None:
+        timings = build_profile.active.take_pages()
+    cache_stats = None
+    if block_cache.active is not None:
+        cache_stats = block_cache.active.take_stats()
+    output_stats = None
+    if output_cache.active is not None:
+        output_stats = output_cache.active.take_stats()
+    search_pages = None
+    if search_index.active is not None:
+        search_pages = search_index.active.take_pages()
+    link_pages = None
+    if link_graph.active is not None:
+        link_pages = link_graph.active.take_pages()
+    return timings, cache_stats, output_stats, search_pages, link_pages
+
+
+def chunk_pages(pages, jobs, chunks_per_job=4):
+    size = max(1, -(-len(pages) // (jobs * chunks_per_job)))
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def generate_pages_parallel(pages, jobs, streaming=False, site_root=None):
+    # `pages` holds (from_path, dest_path, template_path). Compile in the
+    # parent first so template errors surface once, here.
+    for template_path in set(page[2] for page in pages):
+        load_template(template_path)
+    profile = build_profile.active
+    profile_options = None
+    if profile is not None:
+        profile_options = (profile.dump_page, profile.dump_path)
+    cache = block_cache.active
+    cache_size = cache.max_size if cache is not None else 0
+    outputs = output_cache.active
+    outputs_root = outputs.root if outputs is not None else None
+    indexer = search_index.active
+    search_root = indexer.dir_path_public if indexer is not None else None
+    graph = link_graph.active
+    links_root = graph.dir_path_public if graph is not None else None
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker,
+        initargs=(
+            streaming, site_root, build_log.verbosity, profile_options, cache_size,
+            outputs_root, asset_fingerprint.active, search_root, links_root,
+        ),
+    ) as executor:
+        futures = [
+            executor.submit(_generate_chunk, chunk)
+            for chunk in chunk_pages(pages, jobs)
+        ]
+        for future in futures:
+            timings, cache_stats, output_stats, search_pages, link_pages = future.result()
+            if profile is not None:
+                profile.pages.extend(timings)
+            if cache_stats is not None:
+                cache.add_stats(cache_stats)
+            if output_stats is not None:
+                outputs.add_stats(output_stats)
+            if search_pages is not None:
+                indexer.pages.update(search_pages)
+            if link_pages is not None:
+                graph.pages.update(link_pages)
+
+
+def generate_pages(
+    pages, template_path, jobs=1, streaming=False, site_root=None, templates=None,
+):
+    # `templates` maps source paths to their section template; pages not in
+    # it use template_path.
+    templates = templates or {}
+    pages = [
+        (from_path, dest_path, templates.get(from_path, template_path))
+        for from_path, dest_path in pages
+    ]
+    start = time.perf_counter()
+    if jobs > 1 and len(pages) > 1:
+        generate_pages_parallel(pages, jobs, streaming, site_root)
+    else:
+        for from_path, dest_path, page_template_path in pages:
+            generate_page(from_path, page_template_path, dest_path, streaming, site_root)
+    if build_profile.active is not None:
+        build_profile.active.wall_seconds += time.perf_counter() - start
+
+
+def generate_pages_recursive(
+    dir_path_content, template_path, dest_dir_path, manifest=None, explain=False, jobs=1,
+    streaming=False,
+):
     if not os.path.exists(dest_dir_path):
         os.mkdir(dest_dir_path)
 
-    for filename in os.listdir(dir_path_content):
-        from_path = os.path.join(dir_path_content, filename)
-        if os.path.isfile(from_path):
-            if Path(from_path).suffix == ".md":
-                dest_path = os.path.join(dest_dir_path, f"{Path(from_path).stem}.html")
-                generate_page(from_path, template_path, dest_path)
-        else:
-            generate_pages_recursive(from_path, template_path, os.path.join(dest_dir_path, filename))
+    pages = find_pages(dir_path_content, dest_dir_path)
+    resolved = {}
+    templates = {
+        from_path: resolve_template(from_path, dir_path_content, template_path, resolved)
+        for from_path, _ in pages
+    }
+    if manifest is None:
+        generate_pages(pages, template_path, jobs, streaming, dest_dir_path, templates)
+        log(f"Pages: generated {len(pages)}")
+        return
+
+    file_hashes = {}
+    outdated = []
+    for from_path, dest_path in pages:
+        source_hash = hash_file(from_path)
+        dependencies = page_dependencies(templates[from_path], file_hashes)
+        reason = manifest.rebuild_reason(from_path, dest_path, source_hash, dependencies)
+        if reason is None:
+            if explain:
+                print(f"Skipping {dest_path}: up to date")
+            continue
+        if explain:
+            print(f"Rebuilding {dest_path}: {reason}")
+        outdated.append((from_path, dest_path, source_hash, dependencies))
+
+    generate_pages(
+        [page[:2] for page in outdated], template_path, jobs, streaming, dest_dir_path,
+        templates,
+    )
+    for from_path, dest_path, source_hash, dependencies in outdated:
+        manifest.record(from_path, dest_path, source_hash, dependencies)
 
+    removed = remove_deleted_pages(manifest, [p[0] for p in pages], explain)
+    log(
+        f"Pages: generated {len(outdated)}, skipped {len(pages) - len(outdated)} up to date, "
+        f"removed {len(removed)}"
+    )
 
 
+def remove_deleted_pages(manifest, seen_paths, explain=False):
+    removed = manifest.remove_missing(seen_paths)
+    for from_path, dest_path in removed:
+        if explain:
+            print(f"Removing {dest_path}: source {from_path} deleted")
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+    return removed
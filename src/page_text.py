@@ -0,0 +1,71 @@
+from link_graph import link_text_types
+from search_index import tokenize
+
+
+class BlockText:
+    # Link URLs and search tokens of the TextNodes of one block, as the
+    # block cache keeps them. tokens is None when nothing wanted them.
+    def __init__(self, tokens=True):
+        self.urls = []
+        self.tokens = [] if tokens else None
+
+    def add_nodes(self, text_nodes):
+        for node in text_nodes:
+            if node.text_type in link_text_types:
+                self.urls.append(node.url)
+            if self.tokens is not None:
+                self.tokens.extend(tokenize(node.text))
+
+    def size(self):
+        size = sum(map(len, self.urls))
+        if self.tokens is not None:
+            size += sum(map(len, self.tokens))
+        return size
+
+
+class PageText:
+    # What the link graph and search index need from a page, gathered as
+    # its blocks render: link URLs in document order and, when terms is
+    # set, {term: [positions]}. The TextNodes are dropped as soon as they
+    # are counted, so a streamed page is never held in memory.
+    def __init__(self, terms=True):
+        self.urls = []
+        self.terms = {} if terms else None
+        self.position = 0
+
+    def add_nodes(self, text_nodes):
+        for node in text_nodes:
+            if node.text_type in link_text_types:
+                self.urls.append(node.url)
+            if self.terms is not None:
+                self.add_tokens(tokenize(node.text))
+
+    def stored(self):
+        # What the output cache keeps with the page, as JSON.
+        return {"urls": self.urls, "terms": self.terms}
+
+    def restore(self, stored):
+        # Takes the page's text from stored(), if it has the terms wanted.
+        if stored is None or (self.terms is not None and stored.get("terms") is None):
+            return False
+        self.urls = stored["urls"]
+        if self.terms is not None:
+            self.terms = stored["terms"]
+        return True
+
+    def add_block(self, block_text):
+        self.urls.extend(block_text.urls)
+        if self.terms is not None:
+            self.add_tokens(block_text.tokens)
+
+    def add_tokens(self, tokens):
+        terms = self.terms
+        position = self.position
+        for token in tokens:
+            positions = terms.get(token)
+            if positions is None:
+                terms[token] = [position]
+            else:
+                positions.append(position)
+            position += 1
+        self.position = position
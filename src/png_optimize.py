@@ -0,0 +1,263 @@
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from build_log import log, per_file
+from build_manifest import hash_file
+from output_cache import make_key
+
+png_signature = b"\x89PNG\r\n\x1a\n"
+
+# Bump whenever optimize_png can produce different bytes for the same input,
+# so cached results from an older optimizer are not reused.
+OPTIMIZER_VERSION = "1"
+
+# Ancillary chunks that change how the image is displayed. Everything else
+# that a decoder may skip (text, timestamps, EXIF, physical size, ...) is
+# dropped.
+kept_ancillary_chunks = {b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT"}
+
+# Animated PNGs interleave frame chunks with IDAT; they are left alone.
+animation_chunks = {b"acTL", b"fcTL", b"fdAT"}
+
+# zlib strategies tried on every image; the smallest result wins.
+deflate_strategies = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+# The PngOptimizer used by the build in this process, or None.
+active = None
+
+
+def read_chunks(data):
+    # [(type, body)] of a PNG, or None if it is not a well-formed one.
+    if not data.startswith(png_signature):
+        return None
+    chunks = []
+    offset = len(png_signature)
+    while offset < len(data):
+        if offset + 8 > len(data):
+            return None
+        length, chunk_type = struct.unpack_from(">I4s", data, offset)
+        end = offset + 8 + length
+        if end + 4 > len(data):
+            return None
+        body = data[offset + 8:end]
+        (crc,) = struct.unpack_from(">I", data, end)
+        if zlib.crc32(chunk_type + body) != crc:
+            return None
+        chunks.append((chunk_type, body))
+        offset = end + 4
+        if chunk_type == b"IEND":
+            break
+    if not chunks or chunks[0][0] != b"IHDR" or chunks[-1][0] != b"IEND":
+        return None
+    return chunks
+
+
+def write_chunk(out, chunk_type, body):
+    out.append(struct.pack(">I4s", len(body), chunk_type))
+    out.append(body)
+    out.append(struct.pack(">I", zlib.crc32(chunk_type + body)))
+
+
+def deflate(raw, level):
+    best = None
+    for strategy in deflate_strategies:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+        compressed = compressor.compress(raw) + compressor.flush()
+        if best is None or len(compressed) < len(best):
+            best = compressed
+    return best
+
+
+def optimize_png(data, level=9):
+    # Losslessly smaller bytes for a PNG, or None when it cannot be made
+    # smaller. The image data is inflated and deflated again into a single
+    # IDAT, so every pixel stays exactly the same; only the compression and
+    # the chunks no decoder needs change.
+    chunks = read_chunks(data)
+    if chunks is None:
+        return None
+    if any(chunk_type in animation_chunks for chunk_type, _ in chunks):
+        return None
+    idat = b"".join(body for chunk_type, body in chunks if chunk_type == b"IDAT")
+    try:
+        raw = zlib.decompress(idat)
+    except zlib.error:
+        return None
+
+    out = [png_signature]
+    wrote_idat = False
+    for chunk_type, body in chunks:
+        if chunk_type == b"IDAT":
+            if not wrote_idat:
+                write_chunk(out, b"IDAT", deflate(raw, level))
+                wrote_idat = True
+        # Critical chunks have an upper-case first letter.
+        elif chunk_type[:1].isupper() or chunk_type in kept_ancillary_chunks:
+            write_chunk(out, chunk_type, body)
+    if not wrote_idat:
+        return None
+    optimized = b"".join(out)
+    if len(optimized) >= len(data):
+        return None
+    return optimized
+
+
+def is_png(path):
+    return os.path.splitext(path)[1].lower() == ".png"
+
+
+class PngCache:
+    # Optimizer results stored by a key over the input bytes and the
+    # optimizer settings. An empty entry records that the image could not be
+    # made smaller, so it isn't tried again either.
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def entry_path(self, key):
+        return os.path.join(self.objects_dir, key[:2], f"{key[2:]}.png")
+
+    def load(self, key):
+        try:
+            with open(self.entry_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, key, data):
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _optimize_to_cache(cache_root, key, path, level):
+    # Runs in a pool worker; the result travels back through the cache
+    # rather than the pipe.
+    with open(path, "rb") as f:
+        data = f.read()
+    PngCache(cache_root).store(key, optimize_png(data, level) or b"")
+
+
+class PngStats:
+    def __init__(self):
+        self.optimized_files = 0
+        self.cached_files = 0
+        self.unchanged_files = 0
+        self.skipped_files = 0
+        self.original_bytes = 0
+        self.optimized_bytes = 0
+
+    def report(self):
+        saved = self.original_bytes - self.optimized_bytes
+        return (
+            f"PNG optimize: {self.optimized_files} optimized, {self.cached_files} from cache "
+            f"({self.original_bytes} -> {self.optimized_bytes} bytes, saved {saved}), "
+            f"{self.unchanged_files} up to date, {self.skipped_files} not smaller"
+        )
+
+
+class PngOptimizer:
+    def __init__(self, cache_root, workers=1, level=9):
+        self.cache = PngCache(cache_root)
+        self.workers = workers
+        self.level = level
+
+    def cache_key(self, path):
+        return make_key([OPTIMIZER_VERSION, str(self.level), hash_file(path)])
+
+    def optimize_assets(self, manifest, asset_paths, stats=None):
+        # Replaces published PNGs with their optimized bytes and records
+        # each result in manifest.optimized_assets, which is how static sync
+        # knows the smaller copy is still current. Files keep their mtime.
+        if stats is None:
+            stats = PngStats()
+        pending = []
+        for path in sorted(asset_paths):
+            if not is_png(path) or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entry = manifest.optimized_assets.get(path)
+            if (
+                entry is not None
+                and stat.st_size == entry["size"]
+                and stat.st_mtime_ns == entry["mtime_ns"]
+            ):
+                stats.unchanged_files += 1
+                continue
+            key = self.cache_key(path)
+            data = self.cache.load(key)
+            if data is None:
+                pending.append((path, key))
+            else:
+                self.apply(manifest, path, data, stats, cached=True)
+
+        self.run(pending)
+        for path, key in pending:
+            self.apply(manifest, path, self.cache.load(key), stats, cached=False)
+        return stats
+
+    def run(self, pending):
+        # Deflating at level 9 is CPU-bound, so images are spread over
+        # processes rather than threads.
+        if self.workers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+                futures = [
+                    executor.submit(_optimize_to_cache, self.cache.root, key, path, self.level)
+                    for path, key in pending
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for path, key in pending:
+                _optimize_to_cache(self.cache.root, key, path, self.level)
+
+    def apply(self, manifest, path, data, stats, cached):
+        stat = os.stat(path)
+        if data:
+            # A fresh inode: the published file may be a hardlink to the
+            # source image.
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(tmp_path, path)
+            log(f" ~ {path}: {stat.st_size} -> {len(data)} bytes, saved {stat.st_size - len(data)}",
+                per_file)
+            if cached:
+                stats.cached_files += 1
+            else:
+                stats.optimized_files += 1
+            stats.original_bytes += stat.st_size
+            stats.optimized_bytes += len(data)
+            size = len(data)
+        else:
+            stats.skipped_files += 1
+            size = stat.st_size
+        published = manifest.asset_hashes.get(path)
+        if published is not None:
+            # Static sync compares deduplicated outputs with these stats.
+            published["size"] = size
+        manifest.optimized_assets[path] = {
+            "source_size": stat.st_size,
+            "size": size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+
+def configure(cache_root, workers=1):
+    global active
+    active = PngOptimizer(cache_root, workers) if cache_root else None
+    return active
@@ -0,0 +1,120 @@
+import gzip
+import os
+
+
+# Formats that are already compressed gain nothing from gzip.
+precompressed_suffixes = {
+    ".gz", ".br", ".zst", ".zip", ".7z", ".bz2", ".xz",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico",
+    ".woff", ".woff2", ".mp3", ".mp4", ".webm", ".ogg", ".pdf",
+}
+
+
+class PrecompressStats:
+    def __init__(self):
+        self.compressed_files = 0
+        self.skipped_files = 0
+        self.unchanged_files = 0
+        self.removed_files = 0
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+
+    def report(self):
+        saved = self.original_bytes - self.compressed_bytes
+        return (
+            f"Precompress: wrote {self.compressed_files} .gz files "
+            f"({self.original_bytes} -> {self.compressed_bytes} bytes, saved {saved}), "
+            f"{self.unchanged_files} up to date, {self.skipped_files} skipped, "
+            f"{self.removed_files} stale removed"
+        )
+
+
+def should_compress(path, min_size):
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in precompressed_suffixes:
+        return False
+    return os.path.getsize(path) >= min_size
+
+
+def precompress_file(path, level=9):
+    # mtime=0 keeps the output reproducible; the .gz gets the source's mtime
+    # so both the next build and the server can tell it is current.
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = gzip.compress(data, compresslevel=level, mtime=0)
+    gzip_path = f"{path}.gz"
+    if len(compressed) >= len(data):
+        if os.path.exists(gzip_path):
+            os.remove(gzip_path)
+        return len(data), None
+    tmp_path = f"{gzip_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    stat = os.stat(path)
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(tmp_path, gzip_path)
+    return len(data), len(compressed)
+
+
+def is_precompressed(path):
+    gzip_path = f"{path}.gz"
+    return (
+        os.path.exists(gzip_path)
+        and os.stat(gzip_path).st_mtime_ns == os.stat(path).st_mtime_ns
+    )
+
+
+def precompress_tree(dir_path, level=9, min_size=256, stats=None, protected=(), excluded=()):
+    # `protected` lists published files (e.g. static assets). They are
+    # compressed like any other file, but a protected .gz is never treated
+    # as a stale sibling, nor overwritten by compressing its source.
+    # `excluded` files are never compressed, for files that are not served
+    # as they are (e.g. the search index).
+    if stats is None:
+        stats = PrecompressStats()
+    for filename in os.listdir(dir_path):
+        path = os.path.join(dir_path, filename)
+        if os.path.isdir(path):
+            precompress_tree(path, level, min_size, stats, protected, excluded)
+            continue
+        if path.endswith(".gz") and path in protected:
+            stats.skipped_files += 1
+            continue
+        if path.endswith(".gz"):
+            source_path = path[:-3]
+            if (
+                not os.path.isfile(source_path)
+                or source_path in excluded
+                or not should_compress(source_path, min_size)
+            ):
+                os.remove(path)
+                stats.removed_files += 1
+            continue
+        if f"{path}.gz" in protected or path in excluded or not should_compress(path, min_size):
+            stats.skipped_files += 1
+            continue
+        if is_precompressed(path):
+            stats.unchanged_files += 1
+            continue
+        original_size, compressed_size = precompress_file(path, level)
+        if compressed_size is None:
+            stats.skipped_files += 1
+            continue
+        stats.compressed_files += 1
+        stats.original_bytes += original_size
+        stats.compressed_bytes += compressed_size
+    return stats
+
+
+def remove_precompressed(dir_path, protected=()):
+    # Deletes the .gz files of an earlier --precompress build, apart from
+    # published ones, so the server never sends a stale variant. Returns the
+    # number of files removed.
+    removed = 0
+    for root, _, filenames in os.walk(dir_path):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if filename.endswith(".gz") and path not in protected:
+                os.remove(path)
+                removed += 1
+    return removed
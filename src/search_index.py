@@ -0,0 +1,315 @@
+import json
+import mmap
+import os
+import re
+import struct
+
+from atomic_write import write_bytes_if_changed
+
+search_index_name = "search-index.bin"
+
+token_pattern = re.compile(r"\w+")
+max_token_length = 64
+
+# The SearchIndexer collecting pages in this process, or None.
+active = None
+
+
+def tokenize(text):
+    return [
+        token for token in token_pattern.findall(text.lower())
+        if len(token) <= max_token_length
+    ]
+
+
+def page_url(dest_path, dir_path_public):
+    url = "/" + os.path.relpath(dest_path, dir_path_public).replace(os.sep, "/")
+    if url.endswith("/index.html"):
+        return url[:-len("index.html")]
+    return url
+
+
+# Index file layout, little-endian:
+#
+#   header      magic, term count, then offset of the term table, term
+#               bytes, postings and page list, and the page list's length
+#   term table  term_count + 1 entries of (term start, postings start),
+#               sorted by term bytes; the extra entry marks both ends
+#   terms       UTF-8 terms, back to back
+#   postings    per term: page count, then for each page the page id
+#               delta, position count and position deltas, all varints
+#   pages       JSON list of {"source", "hash", "url", "title"}
+#
+# Lookups binary-search the term table straight out of an mmap, so opening
+# the index reads only the page list.
+magic = b"SSGSRCH1"
+header_format = struct.Struct("<8sIIIIII")
+entry_format = struct.Struct("<II")
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_index(pages):
+    # pages: list of (page_info, {term: [positions]}).
+    inverted = {}
+    for page_id, (_, terms) in enumerate(pages):
+        for term, positions in terms.items():
+            inverted.setdefault(term.encode(), []).append((page_id, positions))
+
+    table = bytearray()
+    term_bytes = bytearray()
+    postings = bytearray()
+    for term in sorted(inverted):
+        table += entry_format.pack(len(term_bytes), len(postings))
+        term_bytes += term
+        entries = inverted[term]
+        encode_varint(len(entries), postings)
+        previous_page = 0
+        for page_id, positions in entries:
+            encode_varint(page_id - previous_page, postings)
+            previous_page = page_id
+            encode_varint(len(positions), postings)
+            previous_position = 0
+            for position in positions:
+                encode_varint(position - previous_position, postings)
+                previous_position = position
+    table += entry_format.pack(len(term_bytes), len(postings))
+
+    page_list = json.dumps(
+        [info for info, _ in pages], separators=(",", ":"), sort_keys=True
+    ).encode()
+    table_offset = header_format.size
+    terms_offset = table_offset + len(table)
+    postings_offset = terms_offset + len(term_bytes)
+    pages_offset = postings_offset + len(postings)
+    header = header_format.pack(
+        magic, len(inverted), table_offset, terms_offset, postings_offset, pages_offset,
+        len(page_list),
+    )
+    return b"".join([header, table, term_bytes, postings, page_list])
+
+
+class SearchIndexReader:
+    def __init__(self, data):
+        # data: bytes or an mmap of an index file.
+        self.data = data
+        fields = header_format.unpack_from(data, 0)
+        if fields[0] != magic:
+            raise ValueError("Not a search index")
+        (_, self.term_count, self.table_offset, self.terms_offset, self.postings_offset,
+         pages_offset, pages_length) = fields
+        self.pages = json.loads(bytes(data[pages_offset:pages_offset + pages_length]))
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("Not a search index")
+            # The map stays valid after the file is closed or replaced.
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def _entry(self, i):
+        return entry_format.unpack_from(self.data, self.table_offset + i * entry_format.size)
+
+    def postings(self, term):
+        # {page_id: [positions]} for one term, or {} if it isn't indexed.
+        key = term.encode()
+        data = self.data
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            start, postings_start = self._entry(middle)
+            end, postings_end = self._entry(middle + 1)
+            found = data[self.terms_offset + start:self.terms_offset + end]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return self._decode_postings(self.postings_offset + postings_start)
+        return {}
+
+    def _decode_postings(self, offset):
+        data = self.data
+        count, offset = decode_varint(data, offset)
+        result = {}
+        page_id = 0
+        for _ in range(count):
+            delta, offset = decode_varint(data, offset)
+            page_id += delta
+            position_count, offset = decode_varint(data, offset)
+            positions = []
+            position = 0
+            for _ in range(position_count):
+                delta, offset = decode_varint(data, offset)
+                position += delta
+                positions.append(position)
+            result[page_id] = positions
+        return result
+
+    def terms(self):
+        for i in range(self.term_count):
+            start, postings_start = self._entry(i)
+            end, _ = self._entry(i + 1)
+            term = bytes(self.data[self.terms_offset + start:self.terms_offset + end]).decode()
+            yield term, self._decode_postings(self.postings_offset + postings_start)
+
+    def search(self, query, limit=20):
+        # Pages containing every query term, ranked by how often the terms
+        # occur, with a bonus for each place they appear as a phrase.
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        matches = None
+        postings = []
+        for term in terms:
+            term_postings = self.postings(term)
+            postings.append(term_postings)
+            pages = set(term_postings)
+            matches = pages if matches is None else matches & pages
+            if not matches:
+                return []
+        results = []
+        for page_id in matches:
+            score = sum(len(term_postings[page_id]) for term_postings in postings)
+            if len(terms) > 1:
+                following = [set(term_postings[page_id]) for term_postings in postings[1:]]
+                for position in postings[0][page_id]:
+                    if all(position + i + 1 in positions for i, positions in enumerate(following)):
+                        score += 10
+            page = self.pages[page_id]
+            results.append({"url": page["url"], "title": page["title"], "score": score})
+        results.sort(key=lambda result: (-result["score"], result["url"]))
+        return results[:limit]
+
+
+def load_index_info(path):
+    # The page list of an existing index file, without decoding its
+    # postings, or None.
+    try:
+        reader = SearchIndexReader.open(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    try:
+        return reader.pages
+    finally:
+        reader.close()
+
+
+def load_index_pages(path):
+    # {source path: (page_info, terms)} from an existing index file, so an
+    # incremental build only replaces the pages it rendered.
+    try:
+        reader = SearchIndexReader.open(path)
+    except (OSError, ValueError, struct.error):
+        return {}
+    try:
+        pages = [(info, {}) for info in reader.pages]
+        for term, term_postings in reader.terms():
+            for page_id, positions in term_postings.items():
+                pages[page_id][1][term] = positions
+    finally:
+        reader.close()
+    return {info["source"]: (info, terms) for info, terms in pages}
+
+
+class SearchIndexer:
+    def __init__(self, dir_path_public):
+        self.dir_path_public = dir_path_public
+        self.index_path = os.path.join(dir_path_public, search_index_name)
+        # {source path: (url, title, terms)} for pages rendered since the
+        # last write.
+        self.pages = {}
+        # {source path: (page_info, terms)} as last written, so that later
+        # writes in the same process (watch mode) need not decode the file.
+        self.indexed = None
+
+    def add_page(self, from_path, dest_path, title, terms):
+        self.pages[from_path] = (page_url(dest_path, self.dir_path_public), title, terms)
+
+    def take_pages(self):
+        pages = self.pages
+        self.pages = {}
+        return pages
+
+    def write(self, manifest, index_source):
+        # Brings the index in line with the manifest: pages rendered since
+        # the last write replace their old entries, deleted pages drop out,
+        # and pages that were never indexed (output cache hits, or an index
+        # enabled on an existing build) are indexed through index_source,
+        # which returns (title, terms) for a source path. Returns the number
+        # of pages indexed.
+        rendered = self.take_pages()
+        if not rendered:
+            if self.indexed is not None:
+                infos = [info for info, _ in self.indexed.values()]
+            else:
+                infos = load_index_info(self.index_path)
+            if infos is not None and self.is_current(manifest, infos):
+                return len(infos)
+        if self.indexed is None:
+            self.indexed = load_index_pages(self.index_path)
+        existing = self.indexed
+        pages = []
+        for from_path in sorted(manifest.pages):
+            entry = manifest.pages[from_path]
+            source_hash = entry["source_hash"]
+            url = page_url(entry["dest"], self.dir_path_public)
+            if from_path in rendered:
+                _, title, terms = rendered[from_path]
+            elif (
+                from_path in existing
+                and existing[from_path][0]["hash"] == source_hash
+                and existing[from_path][0]["url"] == url
+            ):
+                title = existing[from_path][0]["title"]
+                terms = existing[from_path][1]
+            else:
+                title, terms = index_source(from_path)
+            info = {"source": from_path, "hash": source_hash, "url": url, "title": title}
+            pages.append((info, terms))
+        write_bytes_if_changed(self.index_path, encode_index(pages))
+        self.indexed = {info["source"]: (info, terms) for info, terms in pages}
+        return len(pages)
+
+    def is_current(self, manifest, infos):
+        # Whether an index of these pages holds every page in the manifest
+        # at its current source and URL, so that with nothing rendered it
+        # can be left as it is.
+        if len(infos) != len(manifest.pages):
+            return False
+        for info in infos:
+            entry = manifest.pages.get(info["source"])
+            if (
+                entry is None
+                or entry["source_hash"] != info["hash"]
+                or page_url(entry["dest"], self.dir_path_public) != info["url"]
+            ):
+                return False
+        return True
+
+
+def configure(dir_path_public):
+    global active
+    active = SearchIndexer(dir_path_public) if dir_path_public else None
+    return active
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+
+import asset_fingerprint
+
+
+# Matches {{ Name }} placeholders and {{> partials/header.html }} includes;
+# an include pastes another file in place, relative to the including file.
+tag_pattern = re.compile(r"\{\{\s*(?:(\w+)|>\s*([^\s{}]+))\s*\}\}")
+
+# src="..." and href="..." attributes in template text, for asset URLs.
+url_attribute_pattern = re.compile(r"""\b(src|href)=(["'])([^"']*)\2""")
+
+known_placeholders = ("Title", "Content", "Date", "Nav")
+required_placeholders = ("Title", "Content")
+
+
+class Template:
+    def __init__(self, path, segments, dependencies=None):
+        self.path = path
+        # Alternating literal text and placeholder names, always starting
+        # and ending with a (possibly empty) literal.
+        self.segments = segments
+        # The template file followed by every partial it pulled in.
+        self.dependencies = dependencies if dependencies is not None else [path]
+        # Identifies the compiled template regardless of where its text came
+        # from, so equal templates match across machines and partial layouts.
+        self.digest = hashlib.sha256("\0".join(segments).encode()).hexdigest()
+
+    @property
+    def placeholders(self):
+        return set(self.segments[1::2])
+
+    def render_to(self, stream, values):
+        # A value is either a string or a callable that writes the slot's
+        # content to the stream itself (used for streamed page bodies).
+        segments = self.segments
+        stream.write(segments[0])
+        for i in range(1, len(segments), 2):
+            value = values[segments[i]]
+            if callable(value):
+                value(stream)
+            else:
+                stream.write(value)
+            stream.write(segments[i + 1])
+
+
+def compile_template(text, path="<template>"):
+    segments = [""]
+    dependencies = [path]
+    _compile_into(text, path, segments, dependencies, [path])
+    template = Template(path, segments, dependencies)
+    missing = [name for name in required_placeholders if name not in template.placeholders]
+    if missing:
+        raise ValueError(
+            f"{path}: missing placeholder(s): {', '.join('{{ ' + name + ' }}' for name in missing)}"
+        )
+    return template
+
+
+def _compile_into(text, path, segments, dependencies, include_stack):
+    position = 0
+    for match in tag_pattern.finditer(text):
+        name, partial = match.groups()
+        line = text.count("\n", 0, match.start()) + 1
+        segments[-1] += text[position:match.start()]
+        position = match.end()
+        if partial is not None:
+            partial_path = os.path.normpath(os.path.join(os.path.dirname(path), partial))
+            if partial_path in include_stack:
+                cycle = " -> ".join(include_stack + [partial_path])
+                raise ValueError(f"{path}:{line}: include cycle: {cycle}")
+            if not os.path.isfile(partial_path):
+                raise ValueError(f"{path}:{line}: partial not found: {partial_path}")
+            with open(partial_path, "r") as f:
+                partial_text = f.read()
+            if partial_path not in dependencies:
+                dependencies.append(partial_path)
+            _compile_into(
+                partial_text, partial_path, segments, dependencies, include_stack + [partial_path]
+            )
+            continue
+        if name not in known_placeholders:
+            raise ValueError(
+                f"{path}:{line}: unknown placeholder {match.group(0)} "
+                f"(expected one of: {', '.join(known_placeholders)})"
+            )
+        segments.append(name)
+        segments.append("")
+    segments[-1] += text[position:]
+
+
+def rewrite_urls(template, rewrite):
+    # A copy of template with rewrite() applied to every src/href value in
+    # its literal text, partials included.
+    def replace(match):
+        attribute, quote, url = match.groups()
+        return f"{attribute}={quote}{rewrite(url)}{quote}"
+
+    segments = list(template.segments)
+    for i in range(0, len(segments), 2):
+        segments[i] = url_attribute_pattern.sub(replace, segments[i])
+    return Template(template.path, segments, template.dependencies)
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+_template_cache = {}
+_rewritten_cache = {}
+
+
+def load_template(path):
+    # Cached until the template or any partial it includes changes. While
+    # an asset map is active, asset URLs point at the fingerprinted files.
+    template = _load_compiled(path)
+    assets = asset_fingerprint.active
+    if assets is None:
+        return template
+    cached = _rewritten_cache.get(path)
+    if cached is not None and cached[0] is template and cached[1] == assets.digest:
+        return cached[2]
+    rewritten = rewrite_urls(template, assets.url)
+    _rewritten_cache[path] = (template, assets.digest, rewritten)
+    return rewritten
+
+
+def _load_compiled(path):
+    key = _file_key(path)
+    cached = _template_cache.get(path)
+    if cached is not None:
+        keys, template = cached
+        try:
+            if all(_file_key(dependency) == dependency_key for dependency, dependency_key in keys):
+                return template
+        except OSError:
+            pass
+    with open(path, "r") as f:
+        template = compile_template(f.read(), path)
+    keys = [(path, key)] + [(dependency, _file_key(dependency))
+                            for dependency in template.dependencies[1:]]
+    _template_cache[path] = (keys, template)
+    return template
@@ -0,0 +1,191 @@
+import errno
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import asset_fingerprint
+from asset_fingerprint import (
+    AssetMap,
+    fingerprint_assets,
+    fingerprinted_path,
+    remove_fingerprinted_assets,
+)
+from block_markdown import markdown_to_html_node
+from build_manifest import BuildManifest, hash_file
+from page_generation import generate_pages_recursive
+from template_engine import compile_template, load_template, rewrite_urls
+
+
+class TestAssetMap(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetMap({"/index.css": "/index.0123456789.css"}, "asset-manifest.json")
+
+    def test_url(self):
+        self.assertEqual(self.assets.url("/index.css"), "/index.0123456789.css")
+        self.assertEqual(self.assets.url("/index.css?v=1"), "/index.0123456789.css?v=1")
+        self.assertEqual(self.assets.url("/index.css#top"), "/index.0123456789.css#top")
+        self.assertEqual(self.assets.url("/other.css"), "/other.css")
+
+    def test_rewrite_template(self):
+        template = compile_template(
+            '<link href="/index.css"><img src=\'/index.css\'>{{ Title }}'
+            '<a href="/about">x</a>{{ Content }}'
+        )
+        rewritten = rewrite_urls(template, self.assets.url)
+        self.assertEqual(
+            rewritten.segments[0],
+            '<link href="/index.0123456789.css"><img src=\'/index.0123456789.css\'>',
+        )
+        self.assertEqual(rewritten.segments[2], '<a href="/about">x</a>')
+        self.assertNotEqual(rewritten.digest, template.digest)
+
+    def test_rendered_links_and_images(self):
+        asset_fingerprint.configure(self.assets)
+        try:
+            html = markdown_to_html_node("[style](/index.css) ![img](/index.css)").to_html()
+        finally:
+            asset_fingerprint.configure(None)
+        self.assertEqual(
+            html,
+            '<div><p><a href="/index.0123456789.css">style</a> '
+            '<img src="/index.0123456789.css" alt="img"></img></p></div>',
+        )
+
+    def test_configure_reports_changes(self):
+        try:
+            self.assertTrue(asset_fingerprint.configure(self.assets))
+            self.assertFalse(asset_fingerprint.configure(AssetMap(dict(self.assets.urls), "x")))
+            self.assertTrue(asset_fingerprint.configure(None))
+        finally:
+            asset_fingerprint.configure(None)
+
+
+class TestFingerprintAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public = os.path.join(self.tmp.name, "public")
+        os.makedirs(os.path.join(self.public, "images"))
+        self.css = self.write(os.path.join(self.public, "index.css"), "body {}")
+        self.png = self.write(os.path.join(self.public, "images", "a.png"), "png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        # A new inode, as the build writes public/; the hashed names share
+        # the old one.
+        if os.path.exists(path):
+            os.remove(path)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def fingerprint(self):
+        with redirect_stdout(StringIO()):
+            return fingerprint_assets(self.public, [self.css, self.png])
+
+    def test_writes_fingerprinted_files_and_manifest(self):
+        asset_map, stats = self.fingerprint()
+        hashed = fingerprinted_path(self.css, hash_file(self.css))
+        self.assertTrue(os.path.isfile(hashed))
+        self.assertTrue(os.path.isfile(self.css))
+        self.assertEqual(asset_map.url("/index.css"), "/" + os.path.basename(hashed))
+        self.assertTrue(asset_map.url("/images/a.png").startswith("/images/a."))
+        with open(os.path.join(self.public, "asset-manifest.json")) as f:
+            self.assertEqual(json.load(f), asset_map.urls)
+        self.assertEqual(stats.fingerprinted_files, 2)
+
+    def test_fingerprinted_names_are_links(self):
+        self.fingerprint()
+        hashed = fingerprinted_path(self.css, hash_file(self.css))
+        self.assertTrue(os.path.samefile(hashed, self.css))
+
+    def test_copied_where_links_fail(self):
+        with patch("asset_publish.os.link", side_effect=OSError(errno.EXDEV, "cross-device")):
+            self.fingerprint()
+        hashed = fingerprinted_path(self.css, hash_file(self.css))
+        self.assertFalse(os.path.samefile(hashed, self.css))
+        with open(hashed) as f:
+            self.assertEqual(f.read(), "body {}")
+
+    def test_unchanged_assets_reused(self):
+        first, _ = self.fingerprint()
+        second, stats = self.fingerprint()
+        self.assertEqual(first.urls, second.urls)
+        self.assertEqual((stats.fingerprinted_files, stats.unchanged_files), (0, 2))
+
+    def test_changed_asset_gets_new_name(self):
+        first, _ = self.fingerprint()
+        self.write(self.css, "body { color: red }")
+        second, stats = self.fingerprint()
+        self.assertNotEqual(first.url("/index.css"), second.url("/index.css"))
+        self.assertEqual(stats.removed_files, 1)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.public, first.url("/index.css").lstrip("/"))
+        ))
+
+    def test_remove_fingerprinted_assets(self):
+        self.fingerprint()
+        self.assertEqual(remove_fingerprinted_assets(self.public), 2)
+        self.assertEqual(sorted(os.listdir(self.public)), ["images", "index.css"])
+
+
+class TestFingerprintedBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        os.makedirs(self.content)
+        os.makedirs(self.public)
+        with open(os.path.join(self.content, "index.md"), "w") as f:
+            f.write("# Home\n\n![logo](/logo.png)")
+        with open(self.template, "w") as f:
+            f.write('<link href="/index.css">{{ Title }}{{ Content }}')
+        self.css = os.path.join(self.public, "index.css")
+        self.logo = os.path.join(self.public, "logo.png")
+        for path in (self.css, self.logo):
+            with open(path, "w") as f:
+                f.write(path)
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+
+    def tearDown(self):
+        asset_fingerprint.configure(None)
+        self.tmp.cleanup()
+
+    def build(self):
+        with redirect_stdout(StringIO()) as out:
+            asset_map, _ = fingerprint_assets(self.public, [self.css, self.logo])
+            asset_fingerprint.configure(asset_map)
+            generate_pages_recursive(
+                self.content, self.template, self.public, self.manifest, explain=True
+            )
+        with open(os.path.join(self.public, "index.html")) as f:
+            return asset_map, f.read(), out.getvalue()
+
+    def test_page_points_at_fingerprinted_assets(self):
+        asset_map, html, _ = self.build()
+        self.assertIn(f'href="{asset_map.url("/index.css")}"', html)
+        self.assertIn(f'src="{asset_map.url("/logo.png")}"', html)
+        self.assertEqual(load_template(self.template).segments[0],
+                         f'<link href="{asset_map.url("/index.css")}">')
+
+    def test_asset_change_rebuilds_pages(self):
+        self.build()
+        _, _, out = self.build()
+        self.assertIn("up to date", out)
+        os.remove(self.logo)
+        with open(self.logo, "w") as f:
+            f.write("new logo")
+        asset_map, html, out = self.build()
+        self.assertIn("asset-manifest.json changed", out)
+        self.assertIn(f'src="{asset_map.url("/logo.png")}"', html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import errno
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import asset_publish
+from asset_publish import AssetPublisher
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+
+
+class TestAssetPublisher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name, data):
+        with open(self.path(name), "wb") as f:
+            f.write(data)
+
+    def read(self, name):
+        with open(self.path(name), "rb") as f:
+            return f.read()
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            AssetPublisher("teleport")
+
+    def test_every_strategy_produces_identical_bytes(self):
+        self.write("src.bin", os.urandom(200000))
+        for strategy in ("auto",) + asset_publish.publish_strategies:
+            publisher = AssetPublisher(strategy)
+            used = publisher.publish([(self.path("src.bin"), self.path(f"{strategy}.bin"))])
+            self.assertEqual(len(used), 1)
+            self.assertIn(used[0], asset_publish.publish_strategies)
+            self.assertEqual(self.read(f"{strategy}.bin"), self.read("src.bin"))
+
+    def test_preserves_mtime(self):
+        self.write("src.bin", b"data")
+        os.utime(self.path("src.bin"), ns=(0, 1_000_000_000))
+        AssetPublisher("auto").publish([(self.path("src.bin"), self.path("dst.bin"))])
+        self.assertEqual(os.stat(self.path("dst.bin")).st_mtime_ns, 1_000_000_000)
+
+    def test_falls_back_when_unsupported(self):
+        self.write("src.bin", b"data")
+
+        def unsupported(from_path, dest_path):
+            raise OSError(errno.EXDEV, "cross-device link")
+
+        with patch.dict(asset_publish.publish_functions, {"hardlink": unsupported}):
+            publisher = AssetPublisher("hardlink")
+            used = publisher.publish([(self.path("src.bin"), self.path("dst.bin"))])
+        self.assertEqual(used, ["copy"])
+        self.assertEqual(self.read("dst.bin"), b"data")
+
+    def test_real_errors_are_raised(self):
+        with self.assertRaises(FileNotFoundError):
+            AssetPublisher("auto").publish([(self.path("missing"), self.path("dst.bin"))])
+
+    def test_replacing_hardlinked_output_keeps_source(self):
+        self.write("src.bin", b"original")
+        AssetPublisher("hardlink").publish([(self.path("src.bin"), self.path("dst.bin"))])
+        self.write("other.bin", b"other")
+        AssetPublisher("copy").publish([(self.path("other.bin"), self.path("dst.bin"))])
+        self.assertEqual(self.read("src.bin"), b"original")
+        self.assertEqual(self.read("dst.bin"), b"other")
+
+    def test_dedupe_stores_identical_content_once(self):
+        self.write("a.png", b"same bytes")
+        self.write("b.png", b"same bytes")
+        self.write("c.png", b"different")
+        publisher = AssetPublisher("copy", workers=2, dedupe=True)
+        used = publisher.publish([
+            (self.path("a.png"), self.path("out-a.png")),
+            (self.path("b.png"), self.path("out-b.png")),
+            (self.path("c.png"), self.path("out-c.png")),
+        ])
+        self.assertEqual(sorted(used), ["copy", "copy", "dedupe"])
+        self.assertTrue(os.path.samefile(self.path("out-a.png"), self.path("out-b.png")))
+        self.assertEqual(self.read("out-b.png"), b"same bytes")
+
+
+class TestSyncWithPublisher(unittest.TestCase):
+    def test_report_lists_strategies(self):
+        with tempfile.TemporaryDirectory() as root:
+            static = os.path.join(root, "static")
+            os.makedirs(static)
+            for name in ("a.css", "b.css"):
+                with open(os.path.join(static, name), "w") as f:
+                    f.write(name)
+            manifest = BuildManifest(os.path.join(root, "manifest.json"))
+            stats = sync_files_recursive(
+                static, os.path.join(root, "public"), manifest,
+                publisher=AssetPublisher("copy", workers=2),
+            )
+        self.assertEqual(stats.strategies, {"copy": 2})
+        self.assertIn("[copy: 2]", stats.report())
+
+    def sync(self, root, manifest):
+        return sync_files_recursive(
+            os.path.join(root, "static"), os.path.join(root, "public"), manifest,
+            publisher=AssetPublisher("copy", workers=2, dedupe=True),
+        )
+
+    def write_static(self, root, name, data):
+        with open(os.path.join(root, "static", name), "wb") as f:
+            f.write(data)
+
+    def test_deduped_assets_stay_linked(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "static"))
+            self.write_static(root, "a.png", b"same bytes")
+            self.write_static(root, "b.png", b"same bytes")
+            manifest = BuildManifest(os.path.join(root, "manifest.json"))
+            self.sync(root, manifest)
+            manifest.save()
+            manifest = BuildManifest.load(manifest.path)
+            stats = self.sync(root, manifest)
+            self.assertEqual(stats.copied_files, 0)
+            self.assertTrue(os.path.samefile(
+                os.path.join(root, "public", "a.png"), os.path.join(root, "public", "b.png")))
+
+            # Touching a source without changing it keeps the link too.
+            os.utime(os.path.join(root, "static", "b.png"), ns=(0, 10**9))
+            self.assertEqual(self.sync(root, manifest).copied_files, 0)
+            self.write_static(root, "b.png", b"new bytes!")
+            self.assertEqual(self.sync(root, manifest).copied_files, 1)
+            with open(os.path.join(root, "public", "b.png"), "rb") as f:
+                self.assertEqual(f.read(), b"new bytes!")
+            with open(os.path.join(root, "public", "a.png"), "rb") as f:
+                self.assertEqual(f.read(), b"same bytes")
+
+    def test_new_duplicate_of_published_asset_is_linked(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "static"))
+            self.write_static(root, "a.png", b"same bytes")
+            manifest = BuildManifest(os.path.join(root, "manifest.json"))
+            self.sync(root, manifest)
+            self.write_static(root, "b.png", b"same bytes")
+            stats = self.sync(root, manifest)
+            self.assertEqual(stats.strategies, {"dedupe": 1})
+            self.assertTrue(os.path.samefile(
+                os.path.join(root, "public", "a.png"), os.path.join(root, "public", "b.png")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import link_graph
+import output_cache
+from async_pages import generate_pages_async
+from build_manifest import BuildManifest
+from page_generation import generate_pages_recursive
+from test_support import SiteTestCase
+
+
+class TestAsyncPages(SiteTestCase):
+    template_text = "<title>{{ Title }}</title>\n{{ Nav }}<main>{{ Content }}</main>\n"
+
+    def setUp(self):
+        super().setUp()
+        for i in range(30):
+            self.write(
+                os.path.join(f"section{i % 3}", f"part{i % 2}", f"page{i}.md"),
+                f"# Page {i}\r\n\r\nSome **bold** text\n\n```\ncode\n\nblock\n```",
+            )
+        self.write(
+            os.path.join("section1", "_template.html"),
+            "<section>{{ Nav }}{{ Title }}{{ Content }}</section>",
+        )
+
+    def tearDown(self):
+        output_cache.configure(None)
+
+    def build(self, name, use_async, manifest=False, io_workers=4):
+        dest = os.path.join(self.root, name)
+        build_manifest = None
+        if manifest:
+            build_manifest = BuildManifest.load(os.path.join(self.root, f"{name}.json"))
+        with redirect_stdout(StringIO()) as out:
+            if use_async:
+                generate_pages_async(
+                    self.content, self.template, dest, build_manifest, io_workers=io_workers
+                )
+            else:
+                generate_pages_recursive(self.content, self.template, dest, build_manifest)
+        if build_manifest is not None:
+            build_manifest.save()
+        return out.getvalue()
+
+    def test_matches_sync_build(self):
+        self.build("sync", False)
+        for io_workers in (1, 4):
+            self.build(f"async{io_workers}", True, io_workers=io_workers)
+            self.assertEqual(
+                self.outputs(os.path.join(self.root, f"async{io_workers}")),
+                self.outputs(os.path.join(self.root, "sync")),
+            )
+        self.assertEqual(len(self.outputs(os.path.join(self.root, "sync"))), 30)
+
+    def test_manifest_matches_sync_build(self):
+        self.build("sync", False, manifest=True)
+        self.build("async", True, manifest=True)
+        with open(os.path.join(self.root, "sync.json")) as f:
+            expected = f.read().replace("sync", "async")
+        with open(os.path.join(self.root, "async.json")) as f:
+            self.assertEqual(json.loads(f.read()), json.loads(expected))
+
+    def test_incremental(self):
+        self.assertIn("generated 30, skipped 0", self.build("site", True, manifest=True))
+        self.assertIn("generated 0, skipped 30", self.build("site", True, manifest=True))
+        os.remove(os.path.join(self.content, "section0", "part0", "page0.md"))
+        with open(os.path.join(self.content, "section2", "part0", "page2.md"), "w") as f:
+            f.write("# Changed")
+        self.assertIn(
+            "generated 1, skipped 28 up to date, removed 1",
+            self.build("site", True, manifest=True),
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, "site", "section0", "part0", "page0.html"))
+        )
+
+    def test_output_cache(self):
+        self.build("sync", False)
+        output_cache.configure(os.path.join(self.root, "cache"))
+        self.build("first", True)
+        cache = output_cache.configure(os.path.join(self.root, "cache"))
+        self.build("second", True)
+        self.assertEqual((cache.hits, cache.misses), (30, 0))
+        self.assertEqual(
+            self.outputs(os.path.join(self.root, "second")),
+            self.outputs(os.path.join(self.root, "sync")),
+        )
+
+    def test_cached_pages_collected(self):
+        output_cache.configure(os.path.join(self.root, "cache"))
+        graph = link_graph.configure(self.public)
+        self.addCleanup(link_graph.configure, None)
+        self.build("first", True)
+        rendered = graph.take_pages()
+        self.build("second", True)
+        self.assertEqual(output_cache.active.hits, 30)
+        self.assertEqual(graph.take_pages(), rendered)
+
+    def test_render_error_stops_build(self):
+        with open(os.path.join(self.content, "untitled.md"), "w") as f:
+            f.write("no title")
+        with self.assertRaises(ValueError):
+            self.build("site", True)
+
+
+if __name__ == "__main__":
+    unittest.main()
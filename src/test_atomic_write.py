@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from atomic_write import (
+    encode_text,
+    replace_if_changed,
+    temp_path,
+    write_bytes_if_changed,
+    write_text_if_changed,
+)
+from page_generation import generate_page
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "page.html")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def age(self, path):
+        os.utime(path, (1000, 1000))
+
+    def test_new_file_written(self):
+        self.assertTrue(write_text_if_changed(self.path, "<p>hi</p>"))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "<p>hi</p>")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_unchanged_file_keeps_mtime(self):
+        write_text_if_changed(self.path, "<p>hi</p>")
+        self.age(self.path)
+        self.assertFalse(write_text_if_changed(self.path, "<p>hi</p>"))
+        self.assertEqual(os.stat(self.path).st_mtime, 1000)
+
+    def test_changed_file_replaced(self):
+        write_bytes_if_changed(self.path, b"<p>hi</p>")
+        self.age(self.path)
+        # Same size, different bytes.
+        self.assertTrue(write_bytes_if_changed(self.path, b"<p>ho</p>"))
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"<p>ho</p>")
+        self.assertNotEqual(os.stat(self.path).st_mtime, 1000)
+
+    def test_encode_text_matches_text_mode_write(self):
+        text = "café\nline two\n"
+        with open(self.path, "w") as f:
+            f.write(text)
+        with open(self.path, "rb") as f:
+            self.assertEqual(encode_text(text), f.read())
+
+    def test_replace_if_changed(self):
+        write_text_if_changed(self.path, "same")
+        self.age(self.path)
+        tmp_path = temp_path(self.path)
+        with open(tmp_path, "w") as f:
+            f.write("same")
+        self.assertFalse(replace_if_changed(tmp_path, self.path))
+        self.assertFalse(os.path.exists(tmp_path))
+        self.assertEqual(os.stat(self.path).st_mtime, 1000)
+        with open(tmp_path, "w") as f:
+            f.write("other")
+        self.assertTrue(replace_if_changed(tmp_path, self.path))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "other")
+
+
+class TestUnchangedPages(unittest.TestCase):
+    def test_regenerated_page_keeps_mtime(self):
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, "page.md")
+            template = os.path.join(root, "template.html")
+            dest = os.path.join(root, "page.html")
+            with open(source, "w") as f:
+                f.write("# Title\n\nBody")
+            with open(template, "w") as f:
+                f.write("{{ Title }}{{ Content }}")
+            for streaming in (False, True):
+                generate_page(source, template, dest, streaming)
+                os.utime(dest, (1000, 1000))
+                generate_page(source, template, dest, streaming)
+                self.assertEqual(os.stat(dest).st_mtime, 1000)
+            with open(source, "w") as f:
+                f.write("# Title\n\nNew body")
+            generate_page(source, template, dest, True)
+            self.assertNotEqual(os.stat(dest).st_mtime, 1000)
+            self.assertEqual(sorted(os.listdir(root)), ["page.html", "page.md", "template.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import block_cache
+from block_cache import BlockCache
+from block_markdown import lex_block, lex_markdown, lines_to_html_node, markdown_to_html_node
+from test_support import SiteTestCase
+
+shared_blocks = (
+    "> **Disclaimer:** opinions are my own",
+    "* [Home](/)\n* [Blog](/blog/)\n* [About](/about/)",
+)
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_hit_returns_same_html(self):
+        cache = BlockCache()
+        block = lex_block("Some **bold** and a [link](/x)")
+        first = cache.render(block)
+        self.assertEqual(first, lines_to_html_node(*block).to_html())
+        self.assertIs(cache.render(block), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_render_blocks_matches_markdown_to_html_node(self):
+        markdown = "# Title\n\n" + "\n\n".join(shared_blocks) + "\n\n```\ncode\n```"
+        cache = BlockCache()
+        self.assertEqual(
+            cache.render_blocks(lex_markdown(markdown)),
+            markdown_to_html_node(markdown).to_html(),
+        )
+
+    def test_lru_eviction(self):
+        cache = BlockCache(max_size=40, max_entry_size=40)
+        a, b, c = (lex_block(text * 5) for text in "abc")
+        cache.render(a)
+        cache.render(b)
+        cache.render(a)
+        cache.render(c)
+        self.assertEqual(list(cache.entries), [a, c])
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, 40)
+
+    def test_large_blocks_not_stored(self):
+        cache = BlockCache(max_size=1000, max_entry_size=10)
+        cache.render(lex_block("a long paragraph of text"))
+        self.assertEqual(len(cache.entries), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_invalid_block_not_cached(self):
+        cache = BlockCache()
+        with self.assertRaises(ValueError):
+            cache.render(lex_block("**unclosed"))
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_stats_round_trip(self):
+        worker = BlockCache()
+        worker.render(lex_block("x"))
+        worker.render(lex_block("x"))
+        parent = BlockCache()
+        parent.add_stats(worker.take_stats())
+        self.assertEqual((parent.hits, parent.misses), (1, 1))
+        self.assertEqual((worker.hits, worker.misses), (0, 0))
+        self.assertIn("50.0% hit rate", parent.report())
+
+
+class TestCachedGeneration(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(8):
+            self.write(
+                f"page{i}.md", f"# Page {i}\n\n{shared_blocks[0]}\n\nBody *{i}*\n\n{shared_blocks[1]}"
+            )
+
+    def tearDown(self):
+        block_cache.configure(0)
+
+    def build(self, name, jobs=1, streaming=False):
+        return self.render_pages(name, jobs, streaming)[0]
+
+    def test_output_identical_with_cache(self):
+        block_cache.configure(0)
+        expected = self.build("plain")
+        for jobs in (1, 2):
+            for streaming in (False, True):
+                cache = block_cache.configure(2**20)
+                self.assertEqual(self.build(f"cached-{jobs}-{streaming}", jobs, streaming), expected)
+                # 8 pages of 4 blocks; the two shared blocks hit after the
+                # first page rendered by each process.
+                self.assertEqual(cache.hits + cache.misses, 32)
+                self.assertGreaterEqual(cache.hits, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
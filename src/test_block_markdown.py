@@ -1,6 +1,8 @@
+import io
 import unittest
 
-from block_markdown import block_to_block_type, markdown_to_blocks, block_type_paragraph, block_type_heading, block_type_code, block_type_quote, block_type_ulist, block_type_olist, markdown_to_html_node
+import block_markdown
+from block_markdown import block_to_block_type, iter_lexed_blocks, lex_markdown, markdown_to_blocks, block_type_paragraph, block_type_heading, block_type_code, block_type_quote, block_type_ulist, block_type_olist, markdown_to_html_node
 
 
 class TestMarkdownToBlocks(unittest.TestCase):
@@ -200,5 +202,102 @@ this is paragraph text
         )
 
 
+class TestLexer(unittest.TestCase):
+    def test_types_and_lines(self):
+        md = "# Title\n\n> a\n> b\n\n- x\n- y\n\n1. one\n2. two\n\nplain\ntext"
+        self.assertEqual(list(lex_markdown(md)), [
+            (block_type_heading, ("# Title",)),
+            (block_type_quote, ("> a", "> b")),
+            (block_type_ulist, ("- x", "- y")),
+            (block_type_olist, ("1. one", "2. two")),
+            (block_type_paragraph, ("plain", "text")),
+        ])
+
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "before\n\n```\ndef f():\n\n\n    return 1\n```\n\nafter"
+        blocks = list(lex_markdown(md))
+        self.assertEqual(blocks[1], (block_type_code, ("```", "def f():", "", "", "    return 1", "```")))
+        self.assertEqual(len(blocks), 3)
+        html = markdown_to_html_node(md).to_html()
+        self.assertIn("<pre><code>def f():\n\n\n    return 1\n</code></pre>", html)
+
+    def test_fence_info_string_is_not_code(self):
+        md = "```python\nx = 1\n```"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(), "<div><pre><code>x = 1\n</code></pre></div>"
+        )
+
+    def test_unclosed_fence_is_plain_text(self):
+        md = "```\nnot code\n\nstill text"
+        self.assertEqual(markdown_to_blocks(md), ["```\nnot code", "still text"])
+        self.assertEqual(block_to_block_type("```\nnot code"), block_type_paragraph)
+
+    def test_unclosed_fence_lookahead_is_bounded(self):
+        consumed = []
+
+        def pieces():
+            yield "```\nstray"
+            for i in range(10000):
+                consumed.append(i)
+                yield f"paragraph {i}"
+
+        old_limit = block_markdown.max_fence_chars
+        block_markdown.max_fence_chars = 100
+        try:
+            blocks = block_markdown.lex_pieces(pieces())
+            self.assertEqual(next(blocks), (block_type_paragraph, ("```", "stray")))
+            self.assertLess(len(consumed), 20)
+            self.assertEqual(next(blocks), (block_type_paragraph, ("paragraph 0",)))
+            md = "```\nstray\n\n" + "word\n\n" * 30 + "```\ncode\n```"
+            self.assertEqual(list(lex_markdown(md))[-1], (block_type_code, ("```", "code", "```")))
+        finally:
+            block_markdown.max_fence_chars = old_limit
+
+    def test_inline_code_line_does_not_open_fence(self):
+        md = "```inline```\n\ntext\n\n```\ncode\n```"
+        self.assertEqual(
+            [block_type for block_type, _ in lex_markdown(md)],
+            [block_type_paragraph, block_type_paragraph, block_type_code],
+        )
+
+    def test_text_after_closing_fence(self):
+        md = "```\ncode  \n\n```\nafter\n* not a list"
+        self.assertEqual(
+            list(lex_markdown(md)),
+            [
+                (block_type_code, ("```", "code  ", "", "```")),
+                (block_type_paragraph, ("after", "* not a list")),
+            ],
+        )
+
+    def test_whitespace_lines(self):
+        self.assertEqual(markdown_to_blocks("a\n \nb"), ["a\n \nb"])
+        self.assertEqual(markdown_to_blocks("a\n\n   \n\nb\n\n\n"), ["a", "b"])
+        self.assertEqual(block_to_block_type("* a\n  \n* b"), block_type_paragraph)
+        self.assertEqual(markdown_to_blocks("  * a\n* b   \n  "), ["* a\n* b"])
+        self.assertEqual(block_to_block_type("* a\n* "), block_type_paragraph)
+
+
+class TestIterLexedBlocks(unittest.TestCase):
+    def test_matches_lex_markdown(self):
+        documents = [
+            "",
+            "single block",
+            "Block 1\n\nBlock 2\n\nBlock 3",
+            "a\n\n\nb",
+            "a\n\n\n\nb",
+            "a\n\n\n\n\nb\n",
+            "a\n\n   \n\nb",
+            "\n\n# Title\n\n* one\n* two\n\n```\ncode\n\nmore\n```\n\n",
+            "```\nunclosed\n\n> quote",
+        ]
+        documents.append("```\ncode\n```  x\nmore\n```\n\ntail")
+        documents.append("```\ncode  \n\n```\nafter\n\n```\n")
+        for markdown in documents:
+            for chunk_size in (1, 2, 3, 7, 65536):
+                blocks = list(iter_lexed_blocks(io.StringIO(markdown), chunk_size))
+                self.assertEqual(blocks, list(lex_markdown(markdown)), (markdown, chunk_size))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import page_generation
+from build_manifest import BuildManifest, RENDERER_VERSION, hash_file
+from page_generation import generate_pages_recursive
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.dest = os.path.join(self.root, "index.html")
+        self.manifest = BuildManifest(os.path.join(self.root, "manifest.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_new_page(self):
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s", {"template.html": "t"})
+        self.assertEqual(reason, "new page")
+
+    def test_up_to_date(self):
+        open(self.dest, "w").close()
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        self.assertIsNone(self.manifest.rebuild_reason("a.md", self.dest, "s", {"template.html": "t"}))
+
+    def test_source_changed(self):
+        open(self.dest, "w").close()
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s2", {"template.html": "t"})
+        self.assertEqual(reason, "source changed")
+
+    def test_template_changed(self):
+        open(self.dest, "w").close()
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s", {"template.html": "t2"})
+        self.assertEqual(reason, "template.html changed")
+
+    def test_different_template(self):
+        open(self.dest, "w").close()
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s", {"_template.html": "t"})
+        self.assertEqual(reason, "template changed")
+
+    def test_output_missing(self):
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s", {"template.html": "t"})
+        self.assertEqual(reason, "output missing")
+
+    def test_renderer_version_changed(self):
+        open(self.dest, "w").close()
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        self.manifest.pages["a.md"]["renderer_version"] = RENDERER_VERSION + "-old"
+        reason = self.manifest.rebuild_reason("a.md", self.dest, "s", {"template.html": "t"})
+        self.assertEqual(reason, "renderer version changed")
+
+    def test_save_and_load(self):
+        self.manifest.record("a.md", self.dest, "s", {"template.html": "t"})
+        self.manifest.save()
+        loaded = BuildManifest.load(self.manifest.path)
+        self.assertEqual(loaded.pages, self.manifest.pages)
+
+    def test_load_corrupt(self):
+        with open(self.manifest.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(BuildManifest.load(self.manifest.path).pages, {})
+
+    def test_remove_missing(self):
+        self.manifest.record("a.md", "a.html", "s", {"template.html": "t"})
+        self.manifest.record("b.md", "b.html", "s", {"template.html": "t"})
+        removed = self.manifest.remove_missing(["a.md"])
+        self.assertEqual(removed, [("b.md", "b.html")])
+        self.assertEqual(list(self.manifest.pages), ["a.md"])
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nBody")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def build(self):
+        with patch.object(page_generation, "generate_page",
+                          wraps=page_generation.generate_page) as spy, \
+                redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, self.public, self.manifest)
+        return sorted(call.args[0] for call in spy.call_args_list)
+
+    def test_first_build_generates_everything(self):
+        self.assertEqual(len(self.build()), 2)
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertEqual(f.read(), "<title>Post</title><div><h1>Post</h1><p>Body</p></div>")
+
+    def test_second_build_skips_unchanged(self):
+        self.build()
+        self.assertEqual(self.build(), [])
+
+    def test_only_changed_page_rebuilt(self):
+        self.build()
+        post = os.path.join(self.content, "blog", "post.md")
+        self.write(post, "# Post\n\nEdited")
+        self.assertEqual(self.build(), [post])
+
+    def test_template_change_rebuilds_everything(self):
+        self.build()
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(len(self.build()), 2)
+
+    def test_deleted_source_removes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "post.html")))
+        self.assertNotIn(os.path.join(self.content, "blog", "post.md"), self.manifest.pages)
+
+    def test_section_template_and_partial_dependencies(self):
+        blog = os.path.join(self.content, "blog")
+        partial = os.path.join(self.root, "partials", "footer.html")
+        os.makedirs(os.path.dirname(partial))
+        self.write(partial, "<footer>f</footer>")
+        self.write(os.path.join(blog, "_template.html"),
+                   "<b>{{ Title }}</b>{{ Content }}{{> ../../partials/footer.html }}")
+        self.build()
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertEqual(
+                f.read(), "<b>Post</b><div><h1>Post</h1><p>Body</p></div><footer>f</footer>")
+        post = os.path.join(blog, "post.md")
+        self.assertEqual(
+            set(self.manifest.pages[post]["dependencies"]),
+            {os.path.join(blog, "_template.html"), os.path.normpath(partial)},
+        )
+
+        # Editing the blog's partial or the root template only touches
+        # the pages that use them.
+        self.write(partial, "<footer>changed</footer>")
+        self.assertEqual(self.build(), [post])
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(self.build(), [os.path.join(self.content, "index.md")])
+
+        os.remove(os.path.join(blog, "_template.html"))
+        self.assertEqual(self.build(), [post])
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertTrue(f.read().startswith("<h1>Post</h1>"))
+
+    def test_records_source_hash(self):
+        self.build()
+        index = os.path.join(self.content, "index.md")
+        self.assertEqual(self.manifest.pages[index]["source_hash"], hash_file(index))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import block_markdown
+import build_log
+import build_profile
+from inline_markdown import text_to_textnodes
+from page_generation import find_pages
+from test_support import SiteTestCase
+
+
+class TestBuildProfile(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            self.write(f"page{i}.md", f"# Page {i}\n\nSome **bold** text\n\n* a [link](/p{i})\n* b")
+
+    def tearDown(self):
+        build_profile.disable()
+        build_log.set_verbosity(build_log.summary)
+
+    def build(self, name, jobs=1, streaming=False):
+        return self.render_pages(name, jobs, streaming)
+
+    def test_profiled_output_matches(self):
+        expected, _ = self.build("plain")
+        for streaming in (False, True):
+            profile = build_profile.enable()
+            outputs, _ = self.build(f"profiled-{streaming}", streaming=streaming)
+            self.assertEqual(outputs, expected)
+            self.assertEqual(len(profile.pages), 4)
+            path, total, stages = profile.pages[0]
+            self.assertEqual(len(stages), len(build_profile.stage_names))
+            self.assertGreater(stages[build_profile.stage_names.index("inline")], 0)
+            self.assertGreater(total, 0)
+
+    def test_parallel_workers_report_timings(self):
+        profile = build_profile.enable()
+        self.build("parallel", jobs=2)
+        self.assertEqual(sorted(page[0] for page in profile.pages),
+                         sorted(from_path for from_path, _ in find_pages(self.content, "x")))
+        self.assertIn("pages/sec", profile.report())
+
+    def test_disable_restores_inline_parser(self):
+        build_profile.enable()
+        self.assertIsNot(block_markdown.text_to_textnodes, text_to_textnodes)
+        build_profile.disable()
+        self.assertIs(block_markdown.text_to_textnodes, text_to_textnodes)
+
+    def test_cprofile_dump_for_one_page(self):
+        dump_path = os.path.join(self.root, "page.prof")
+        page = os.path.join(self.content, "page2.md")
+        build_profile.enable(page, dump_path)
+        _, out = self.build("dumped")
+        self.assertTrue(os.path.exists(dump_path))
+        self.assertEqual(out.count("cProfile for"), 1)
+
+    def test_report_lists_slowest_pages(self):
+        profile = build_profile.BuildProfile()
+        profile.wall_seconds = 2.0
+        profile.pages = [
+            ("a.md", 0.5, (0.1, 0, 0.4, 0, 0, 0, 0)),
+            ("b.md", 1.5, (0, 0, 0, 0, 0, 0, 1.5)),
+        ]
+        report = profile.report(slowest=1)
+        self.assertIn("2 page(s) in 2.000 s (1.0 pages/sec)", report)
+        self.assertIn("b.md (mostly write)", report)
+        self.assertNotIn("a.md", report)
+
+
+class TestVerbosity(unittest.TestCase):
+    def tearDown(self):
+        build_log.set_verbosity(build_log.summary)
+
+    def log_all(self):
+        with redirect_stdout(StringIO()) as out:
+            build_log.log("summary")
+            build_log.log("file", build_log.per_file)
+        return out.getvalue().split()
+
+    def test_levels(self):
+        self.assertEqual(self.log_all(), ["summary"])
+        build_log.set_verbosity(build_log.per_file)
+        self.assertEqual(self.log_all(), ["summary", "file"])
+        build_log.set_verbosity(build_log.quiet)
+        self.assertEqual(self.log_all(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
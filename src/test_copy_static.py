@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+
+
+class TestSyncFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "public")
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "a.png"), "PNGDATA")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def sync(self, use_hash=False):
+        return sync_files_recursive(self.static, self.public, self.manifest, use_hash)
+
+    def test_first_sync_copies_everything(self):
+        stats = self.sync()
+        self.assertEqual(stats.copied_files, 2)
+        self.assertEqual(stats.copied_bytes, 14)
+        with open(os.path.join(self.public, "images", "a.png")) as f:
+            self.assertEqual(f.read(), "PNGDATA")
+
+    def test_second_sync_skips_unchanged(self):
+        self.sync()
+        stats = self.sync()
+        self.assertEqual(stats.copied_files, 0)
+        self.assertEqual(stats.skipped_files, 2)
+        self.assertEqual(stats.skipped_bytes, 14)
+
+    def test_changed_file_is_copied(self):
+        self.sync()
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        stats = self.sync()
+        self.assertEqual(stats.copied_files, 1)
+        with open(os.path.join(self.public, "index.css")) as f:
+            self.assertEqual(f.read(), "body { margin: 0 }")
+
+    def test_hash_mode_skips_touched_file(self):
+        self.sync()
+        css = os.path.join(self.static, "index.css")
+        os.utime(css, ns=(0, os.stat(css).st_mtime_ns + 10**9))
+        self.assertEqual(self.sync(use_hash=True).copied_files, 0)
+        self.assertEqual(self.sync().copied_files, 0)
+
+    def test_prunes_removed_source(self):
+        self.sync()
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        stats = self.sync()
+        self.assertEqual(stats.pruned_files, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "images")))
+
+    def test_does_not_prune_unrecorded_outputs(self):
+        self.sync()
+        page = os.path.join(self.public, "index.html")
+        self.write(page, "<html></html>")
+        self.sync()
+        self.assertTrue(os.path.exists(page))
+
+
+if __name__ == "__main__":
+    unittest.main()
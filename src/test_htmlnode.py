@@ -1,3 +1,4 @@
+import io
 import unittest
 from unittest.mock import MagicMock
 
@@ -28,6 +29,25 @@ class TestHTMLNode(unittest.TestCase):
         self.assertEqual(node.props_to_html(),
                          " class=\"my-class\" id=\"my-id\"")
 
+    def test_props_round_trip(self):
+        node = HTMLNode("a", "link", None, {"href": "/", "class": "nav"})
+        self.assertEqual(node.props, {"href": "/", "class": "nav"})
+        self.assertEqual(node.props_to_html(), " href=\"/\" class=\"nav\"")
+
+    def test_props_are_not_shared_with_caller(self):
+        props = {"href": "/"}
+        node = HTMLNode("a", "link", None, props)
+        props["href"] = "/changed"
+        with self.assertRaises(TypeError):
+            node.props["href"] = "/also-changed"
+        self.assertEqual(node.props_to_html(), " href=\"/\"")
+        node.props = {**node.props, "href": "/assigned"}
+        self.assertEqual(node.props_to_html(), " href=\"/assigned\"")
+
+    def test_no_instance_dict(self):
+        for node in (HTMLNode(), LeafNode("b", "x"), ParentNode("p", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
 
 class TestLeafNode(unittest.TestCase):
     def test_to_html_raise_value_error(self):
@@ -161,6 +181,47 @@ class TestParentNodeToHtml(unittest.TestCase):
             "<h2><b>Bold text</b>Normal text<i>italic text</i>Normal text</h2>",
         )
 
+    def test_children_are_shared(self):
+        children = [LeafNode("b", "x")]
+        node = ParentNode("p", children)
+        self.assertIs(node.children, children)
+
+
+class TestParentNodeRenderTo(unittest.TestCase):
+    def test_render_to_matches_to_html(self):
+        node = ParentNode(
+            "ul",
+            [
+                ParentNode("li", [LeafNode("b", "one"), LeafNode(None, " item")]),
+                ParentNode("li", [LeafNode("a", "two", {"href": "/two"})]),
+            ],
+            {"class": "list"},
+        )
+        stream = io.StringIO()
+        node.render_to(stream)
+        self.assertEqual(stream.getvalue(), node.to_html())
+        self.assertEqual(
+            stream.getvalue(),
+            "<ul class=\"list\"><li><b>one</b> item</li><li><a href=\"/two\">two</a></li></ul>",
+        )
+
+    def test_leaf_render_to(self):
+        stream = io.StringIO()
+        LeafNode("i", "text").render_to(stream)
+        self.assertEqual(stream.getvalue(), "<i>text</i>")
+
+    def test_deeply_nested(self):
+        node = LeafNode(None, "core")
+        for _ in range(10000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertEqual(html, "<span>" * 10000 + "core" + "</span>" * 10000)
+
+    def test_invalid_nested_child_raises(self):
+        node = ParentNode("div", [ParentNode("p", [LeafNode(None, "ok")]), ParentNode(None, [])])
+        with self.assertRaises(ValueError):
+            node.to_html()
+
 
 if __name__ == '__main__':
     unittest.main()
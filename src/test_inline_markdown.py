@@ -1,3 +1,4 @@
+import random
 import unittest
 from inline_markdown import (
     split_nodes_delimiter,
@@ -304,5 +305,49 @@ class TestInlineMarkdown(unittest.TestCase):
         )
 
 
+def split_passes(text):
+    nodes = [TextNode(text, text_type_text)]
+    nodes = split_nodes_delimiter(nodes, "**", text_type_bold)
+    nodes = split_nodes_delimiter(nodes, "*", text_type_italic)
+    nodes = split_nodes_delimiter(nodes, "`", text_type_code)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+class TestTextToTextNodesMatchesSplitPasses(unittest.TestCase):
+    def assertSameAsSplitPasses(self, text):
+        try:
+            expected = split_passes(text)
+        except ValueError:
+            with self.assertRaises(ValueError):
+                text_to_textnodes(text)
+            return
+        self.assertListEqual(expected, text_to_textnodes(text), text)
+
+    def test_nested_delimiters(self):
+        for text in [
+            "**bold with *star* and `tick`**",
+            "*a **b** c*",
+            "***",
+            "****",
+            "`code with [link](url)`",
+            "**[bold link](url)**",
+            "![img](a.png)[link](b)![](c)",
+            "[a](b)[c](d) tail",
+            "![a](b) and ![a](b) twice",
+            "[not closed](",
+            "",
+        ]:
+            self.assertSameAsSplitPasses(text)
+
+    def test_random_inputs(self):
+        rng = random.Random(1234)
+        pieces = ["**", "*", "`", "![", "[", "]", "(", ")", "a", "b c", " ", "\n", "x.png"]
+        for _ in range(3000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 14)))
+            self.assertSameAsSplitPasses(text)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,178 @@
+import os
+import shutil
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import block_cache
+import link_graph
+import output_cache
+from build_manifest import BuildManifest
+from inline_markdown import text_to_textnodes
+from link_graph import resolve_link
+from page_generation import page_links
+from page_text import PageText
+from test_support import SiteTestCase
+from watch import SiteWatcher
+
+
+class TestResolveLink(unittest.TestCase):
+    def test_internal_paths(self):
+        self.assertEqual(resolve_link("/", "/index.html"), "/")
+        self.assertEqual(resolve_link("/blog/", "/index.html"), "/blog/")
+        self.assertEqual(resolve_link("/a/../b.png?x=1#top", "/index.html"), "/b.png")
+        self.assertEqual(resolve_link("/my%20page", "/index.html"), "/my page")
+
+    def test_relative_paths(self):
+        self.assertEqual(resolve_link("img.png", "/blog/index.html"), "/blog/img.png")
+        self.assertEqual(resolve_link("../", "/blog/post.html"), "/")
+        self.assertEqual(resolve_link("./post/", "/blog/index.html"), "/blog/post/")
+
+    def test_external_and_same_page(self):
+        for url in ("https://example.com/", "//cdn.example.com/a.js", "mailto:a@b.c", "#top", ""):
+            self.assertIsNone(resolve_link(url, "/index.html"), url)
+
+    def test_collected_urls(self):
+        collector = PageText(terms=False)
+        collector.add_nodes(text_to_textnodes("[a](/a) **b** ![c](/c.png) and `[d](/d)`"))
+        self.assertEqual(collector.urls, ["/a", "/c.png"])
+
+
+class TestLinkGraphBuild(SiteTestCase):
+    template_text = "{{ Title }}{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        self.write_static("images/logo.png", "png")
+        self.write("index.md", "# Home\n\n[Blog](/blog) ![logo](/images/logo.png)")
+        self.write("blog/index.md", "# Blog\n\n[Home](../) [Post](post.html) [Missing](/nope/)")
+        self.write("blog/post.md", "# Post\n\n[Back](/blog/) [Site](https://example.com)")
+        self.graph = link_graph.configure(self.public)
+
+    def tearDown(self):
+        link_graph.configure(None)
+        output_cache.configure(None)
+        block_cache.configure(0)
+
+    def build(self, jobs=1, link_source=page_links):
+        self.build_site(jobs)
+        self.graph.update(self.manifest, link_source)
+        return self.graph.check(self.manifest)
+
+    def test_dead_links_found(self):
+        self.assertEqual(self.build(), [(os.path.join(self.content, "blog", "index.md"), "/nope/")])
+        self.assertEqual(
+            self.manifest.links[os.path.join(self.content, "index.md")]["urls"],
+            ["/blog", "/images/logo.png"],
+        )
+
+    def test_links_saved_with_manifest(self):
+        self.build()
+        self.manifest.save()
+        loaded = BuildManifest.load(self.manifest.path)
+        self.assertEqual(loaded.links, self.manifest.links)
+
+    def test_unchanged_pages_not_read_again(self):
+        self.build()
+        calls = []
+
+        def link_source(from_path):
+            calls.append(from_path)
+            return page_links(from_path)
+
+        self.write("blog/index.md", "# Blog\n\n[Home](/)")
+        self.assertEqual(self.build(link_source=link_source), [])
+        self.assertEqual(calls, [])
+
+    def test_removed_target_breaks_unchanged_page(self):
+        self.build()
+        os.remove(os.path.join(self.static, "images", "logo.png"))
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        dead = self.build()
+        self.assertIn((os.path.join(self.content, "index.md"), "/images/logo.png"), dead)
+        self.assertIn((os.path.join(self.content, "blog", "index.md"), "post.html"), dead)
+
+    def test_unchanged_site_not_checked_again(self):
+        self.build()
+        self.manifest.save()
+        self.manifest = BuildManifest.load(self.manifest.path)
+        self.graph = link_graph.configure(self.public)
+        with patch("link_graph.link_candidates", wraps=link_graph.link_candidates) as candidates:
+            dead = self.build()
+        self.assertEqual(dead, [(os.path.join(self.content, "blog", "index.md"), "/nope/")])
+        candidates.assert_not_called()
+
+    def test_added_target_fixes_unchanged_page(self):
+        self.build()
+        self.manifest.save()
+        self.manifest = BuildManifest.load(self.manifest.path)
+        self.graph = link_graph.configure(self.public)
+        self.write("nope/index.md", "# Nope\n\n[Home](/)")
+        with patch("link_graph.resolve_link", wraps=resolve_link) as resolve:
+            self.assertEqual(self.build(), [])
+        # Only the new page's link was resolved.
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_output_cache_hits_collected(self):
+        output_cache.configure(os.path.join(self.root, "cache"))
+        self.build()
+        shutil.rmtree(self.public)
+        self.manifest = BuildManifest(self.manifest.path)
+        self.assertEqual(len(self.build()), 1)
+        self.assertEqual(output_cache.active.hits, 3)
+
+    def test_block_cache_hits_collected(self):
+        cache = block_cache.configure(2**20)
+        self.write("copy.md", "# Copy\n\n[Missing](/nope/)")
+        self.write("blog/copy.md", "# Copy\n\n[Missing](/nope/)")
+        self.assertEqual(len(self.build()), 3)
+        self.assertGreater(cache.hits, 0)
+
+    def test_parallel_build(self):
+        for i in range(4):
+            self.write(f"page{i}.md", f"# Page {i}\n\n[Gone](/gone{i})")
+        self.assertEqual(len(self.build(jobs=2)), 5)
+
+
+class TestWatchedLinks(SiteTestCase):
+    template_text = "{{ Title }}{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        self.write("index.md", "# Home\n\n[About](/about.html)")
+        self.write("about.md", "# About\n\n[Home](/)")
+        self.graph = link_graph.configure(self.public)
+        self.build_site()
+        self.graph.update(self.manifest, page_links)
+        self.watcher = SiteWatcher(
+            self.content, self.static, self.template, self.public, self.manifest,
+        )
+
+    def tearDown(self):
+        link_graph.configure(None)
+        self.watcher.close()
+
+    def write(self, name, text):
+        path = super().write(name, text)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def poll(self):
+        with redirect_stdout(StringIO()) as out:
+            self.watcher.poll()
+        return out.getvalue()
+
+    def test_new_and_fixed_dead_links_reported(self):
+        os.remove(os.path.join(self.content, "about.md"))
+        out = self.poll()
+        self.assertIn(f"Dead link in {os.path.join(self.content, 'index.md')}: /about.html", out)
+        self.write("index.md", "# Home\n\nNo links")
+        out = self.poll()
+        self.assertNotIn("Dead link", out)
+        self.assertIn("Fixed 1 dead link(s)", out)
+        self.assertEqual(self.watcher.dead_links, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import link_graph
+import output_cache
+import search_index
+from output_cache import OutputCache, make_key
+from page_generation import page_cache_key
+from test_support import SiteTestCase
+from template_engine import compile_template
+
+
+class TestOutputCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = OutputCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_store_then_fetch(self):
+        page = self.write("page.html", "<p>hi</p>")
+        key = make_key(["a"])
+        dest = os.path.join(self.tmp.name, "out.html")
+        self.assertFalse(self.cache.fetch(key, dest))
+        self.cache.store(key, page)
+        self.assertTrue(self.cache.fetch(key, dest))
+        self.assertEqual(self.read(dest), "<p>hi</p>")
+        self.assertEqual(self.cache.take_stats(), (1, 1, 1))
+        # Nothing is left behind in the temp directory.
+        self.assertEqual(os.listdir(self.cache.tmp_dir), [])
+
+    def test_text_stored_with_page(self):
+        page = self.write("page.html", "x" * 100)
+        key = make_key(["a"])
+        self.assertIsNone(self.cache.fetch_text(key))
+        self.cache.store(key, page, {"urls": ["/b"], "terms": None})
+        self.assertEqual(self.cache.fetch_text(key), {"urls": ["/b"], "terms": None})
+        text_size = os.path.getsize(self.cache.text_path(key))
+        stats = self.cache.stats()
+        self.assertEqual((stats.entries, stats.size), (1, 100 + text_size))
+        self.assertEqual(self.cache.prune(0), (1, 100 + text_size))
+        self.assertFalse(os.path.exists(self.cache.text_path(key)))
+
+    def test_key_parts_are_separated(self):
+        self.assertNotEqual(make_key(["ab", "c"]), make_key(["a", "bc"]))
+
+    def test_prune_evicts_least_recently_used(self):
+        page = self.write("page.html", "x" * 100)
+        keys = [make_key([str(i)]) for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.store(key, page)
+            os.utime(self.cache.entry_path(key), (1000 + i, 1000 + i))
+        # Fetching the oldest entry marks it as recently used.
+        self.cache.fetch(keys[0], os.path.join(self.tmp.name, "out.html"))
+        self.assertEqual(self.cache.prune(200), (1, 100))
+        self.assertFalse(os.path.exists(self.cache.entry_path(keys[1])))
+        stats = self.cache.stats()
+        self.assertEqual((stats.entries, stats.size), (2, 200))
+        self.assertEqual(self.cache.prune(0), (2, 200))
+        self.assertEqual(self.cache.stats().entries, 0)
+
+    def test_prune_removes_abandoned_temp_files(self):
+        os.makedirs(self.cache.tmp_dir)
+        old = os.path.join(self.cache.tmp_dir, "old.tmp")
+        new = os.path.join(self.cache.tmp_dir, "new.tmp")
+        for path in (old, new):
+            with open(path, "w") as f:
+                f.write("partial")
+        stale = time.time() - output_cache.stale_tmp_seconds - 60
+        os.utime(old, (stale, stale))
+        self.cache.prune(2**20)
+        self.assertEqual(os.listdir(self.cache.tmp_dir), ["new.tmp"])
+
+    def test_stats_of_missing_cache(self):
+        self.assertIn("0 page(s)", self.cache.stats().report())
+
+
+class TestPageCacheKey(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.page = os.path.join(self.tmp.name, "page.md")
+        with open(self.page, "w") as f:
+            f.write("# Title")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def key(self, template_text, dest="public/a/page.html"):
+        template = compile_template(template_text)
+        return page_cache_key(self.page, template, dest, "public")
+
+    def test_template_change_changes_key(self):
+        self.assertNotEqual(
+            self.key("{{ Title }}{{ Content }}"), self.key("<b>{{ Title }}</b>{{ Content }}")
+        )
+
+    def test_nav_only_matters_when_used(self):
+        plain = "{{ Title }}{{ Content }}"
+        self.assertEqual(self.key(plain), self.key(plain, "public/b/page.html"))
+        nav = "{{ Nav }}{{ Title }}{{ Content }}"
+        self.assertNotEqual(self.key(nav), self.key(nav, "public/b/page.html"))
+
+    def test_source_change_changes_key(self):
+        template = "{{ Title }}{{ Content }}"
+        before = self.key(template)
+        with open(self.page, "w") as f:
+            f.write("# Other title")
+        self.assertNotEqual(self.key(template), before)
+
+
+class TestCachedPageGeneration(SiteTestCase):
+    template_text = "<title>{{ Title }}</title>{{ Nav }}{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        for name in ("index.md", os.path.join("blog", "post.md")):
+            self.write(name, f"# {name}\n\nSome *text*")
+        self.cache_dir = os.path.join(self.root, "cache")
+
+    def tearDown(self):
+        output_cache.configure(None)
+        link_graph.configure(None)
+        search_index.configure(None)
+
+    def build(self, name, jobs=1):
+        return self.render_pages(name, jobs)[0]
+
+    def test_second_build_is_served_from_cache(self):
+        expected = self.build("plain")
+        for jobs in (1, 2):
+            # A fresh cache object per build, as on another machine.
+            output_cache.configure(self.cache_dir)
+            self.assertEqual(self.build(f"cached-{jobs}", jobs), expected)
+            cache = output_cache.configure(self.cache_dir)
+            self.assertEqual(self.build(f"again-{jobs}", jobs), expected)
+            self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_hits_collected_without_reading_markdown(self):
+        self.write("index.md", "# Home\n\n[The ring](/ring/) is *here*")
+        output_cache.configure(self.cache_dir)
+        graph = link_graph.configure(self.public)
+        indexer = search_index.configure(self.public)
+        rendered = self.build("cold")
+        graph.take_pages()
+        terms = {path: page[2] for path, page in indexer.take_pages().items()}
+        for jobs in (1, 2):
+            with patch("page_generation.markdown_to_html_node", side_effect=AssertionError):
+                self.assertEqual(self.build(f"warm-{jobs}", jobs), rendered)
+            self.assertEqual(graph.take_pages()[os.path.join(self.content, "index.md")], ["/ring/"])
+            pages = indexer.take_pages()
+            self.assertEqual({path: page[2] for path, page in pages.items()}, terms)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+
+from page_generation import (
+    breadcrumb_nav,
+    chunk_pages,
+    extract_title,
+    extract_title_from_file,
+    find_pages,
+    generate_page,
+    generate_pages,
+)
+
+
+class TestExtractTitle(unittest.TestCase):
+    def test_title(self):
+        self.assertEqual(extract_title("Intro\n# Hello\n## Sub"), "Hello")
+
+    def test_no_title(self):
+        with self.assertRaises(ValueError):
+            extract_title("## Only a subheading")
+
+    def test_title_from_file(self):
+        with tempfile.TemporaryFile("w+") as f:
+            f.write("Intro\n# Hello\n## Sub")
+            f.seek(0)
+            self.assertEqual(extract_title_from_file(f), "Hello")
+
+
+class TestBreadcrumbNav(unittest.TestCase):
+    def test_root_page(self):
+        self.assertEqual(
+            breadcrumb_nav(os.path.join("public", "index.html"), "public"),
+            '<nav><a href="/">Home</a></nav>',
+        )
+
+    def test_nested_page(self):
+        self.assertEqual(
+            breadcrumb_nav(os.path.join("public", "blog", "2024", "post.html"), "public"),
+            '<nav><a href="/">Home</a> / <a href="/blog/">blog</a>'
+            ' / <a href="/blog/2024/">2024</a></nav>',
+        )
+
+
+class TestChunkPages(unittest.TestCase):
+    def test_chunks_cover_all_pages_in_order(self):
+        pages = list(range(37))
+        chunks = chunk_pages(pages, 3)
+        self.assertEqual([p for chunk in chunks for p in chunk], pages)
+        self.assertLessEqual(len(chunks), 12)
+
+    def test_fewer_pages_than_workers(self):
+        self.assertEqual(chunk_pages([1, 2], 8), [[1], [2]])
+
+    def test_no_pages(self):
+        self.assertEqual(chunk_pages([], 4), [])
+
+
+class TestParallelGeneration(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.template = os.path.join(root, "template.html")
+        for i in range(12):
+            section = os.path.join(self.content, f"section{i % 3}")
+            os.makedirs(section, exist_ok=True)
+            with open(os.path.join(section, f"page{i}.md"), "w") as f:
+                f.write(f"# Page {i}\n\nSome **bold** text and a [link](/p{i})\n\n* a\n* b")
+        with open(self.template, "w") as f:
+            f.write("<title>{{ Title }}</title>\n<main>{{ Content }}</main>\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, dest, jobs):
+        pages = find_pages(self.content, dest)
+        generate_pages(pages, self.template, jobs)
+        outputs = {}
+        for _, dest_path in pages:
+            with open(dest_path, "rb") as f:
+                outputs[os.path.relpath(dest_path, dest)] = f.read()
+        return outputs
+
+    def test_parallel_matches_serial(self):
+        serial = self.build(os.path.join(self.tmp.name, "serial"), 1)
+        parallel = self.build(os.path.join(self.tmp.name, "parallel"), 4)
+        self.assertEqual(len(serial), 12)
+        self.assertEqual(serial, parallel)
+
+
+class TestStreamingGeneration(unittest.TestCase):
+    def test_streaming_matches_in_memory(self):
+        content_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "content")
+        template = os.path.join(content_dir, "..", "template.html")
+        with tempfile.TemporaryDirectory() as root:
+            for from_path, _ in find_pages(content_dir, root):
+                generate_page(from_path, template, os.path.join(root, "memory.html"))
+                generate_page(from_path, template, os.path.join(root, "stream.html"), True)
+                with open(os.path.join(root, "memory.html"), "rb") as f:
+                    expected = f.read()
+                with open(os.path.join(root, "stream.html"), "rb") as f:
+                    self.assertEqual(f.read(), expected)
+
+    def test_repeated_content_slot(self):
+        with tempfile.TemporaryDirectory() as root:
+            source = os.path.join(root, "page.md")
+            template = os.path.join(root, "template.html")
+            with open(source, "w") as f:
+                f.write("# Title\n\nBody")
+            with open(template, "w") as f:
+                f.write("{{ Content }}|{{ Title }}|{{ Content }}")
+            generate_page(source, template, os.path.join(root, "memory.html"))
+            generate_page(source, template, os.path.join(root, "stream.html"), True)
+            with open(os.path.join(root, "memory.html")) as f:
+                expected = f.read()
+            with open(os.path.join(root, "stream.html")) as f:
+                self.assertEqual(f.read(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
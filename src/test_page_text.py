@@ -0,0 +1,93 @@
+import os
+import tracemalloc
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import block_cache
+import link_graph
+import search_index
+from inline_markdown import text_to_textnodes
+from page_generation import generate_page, page_links, page_search_text
+from page_text import BlockText, PageText
+from test_support import SiteTestCase
+
+
+class TestPageText(unittest.TestCase):
+    def test_links_and_terms(self):
+        collector = PageText()
+        for text in ("[The ring](/ring/) went **to** Mordor,", "![map](/map.png) the `Ring!`"):
+            collector.add_nodes(text_to_textnodes(text))
+        self.assertEqual(collector.urls, ["/ring/", "/map.png"])
+        self.assertEqual(collector.terms, {
+            "the": [0, 6], "ring": [1, 7], "went": [2], "to": [3], "mordor": [4], "map": [5],
+        })
+
+    def test_blocks_continue_positions(self):
+        collector = PageText()
+        for text in ("one two", "[two](/two) one"):
+            block = BlockText()
+            block.add_nodes(text_to_textnodes(text))
+            collector.add_block(block)
+        self.assertEqual(collector.terms, {"one": [0, 3], "two": [1, 2]})
+        self.assertEqual(collector.urls, ["/two"])
+
+    def test_links_only(self):
+        collector = PageText(terms=False)
+        block = BlockText(tokens=False)
+        block.add_nodes(text_to_textnodes("[a](/a) words"))
+        collector.add_block(block)
+        self.assertIsNone(collector.terms)
+        self.assertIsNone(block.tokens)
+        self.assertEqual(collector.urls, ["/a"])
+
+
+class TestCollectedPages(SiteTestCase):
+    template_text = "{{ Title }}{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.content, "page.md")
+
+    def tearDown(self):
+        link_graph.configure(None)
+        search_index.configure(None)
+        block_cache.configure(0)
+
+    def test_cached_blocks_collected_again(self):
+        with open(self.source, "w") as f:
+            f.write("# Ring\n\n[One](/one) ring\n\n[One](/one) ring")
+        cache = block_cache.configure(2**20)
+        graph = link_graph.configure(self.public)
+        indexer = search_index.configure(self.public)
+        with redirect_stdout(StringIO()):
+            generate_page(self.source, self.template, os.path.join(self.root, "out.html"))
+        self.assertGreater(cache.hits, 0)
+        self.assertEqual(graph.take_pages()[self.source], ["/one", "/one"])
+        self.assertEqual(indexer.take_pages()[self.source][2], {"ring": [0, 2, 4], "one": [1, 3]})
+
+    def test_unrendered_pages(self):
+        with open(self.source, "w") as f:
+            f.write("# Ring\n\n[One](/one) ring")
+        self.assertEqual(page_links(self.source), ["/one"])
+        self.assertEqual(page_search_text(self.source), ("Ring", {"ring": [0, 2], "one": [1]}))
+
+    def test_streamed_page_not_held(self):
+        with open(self.source, "w") as f:
+            f.write("# Big\n\n")
+            for i in range(5000):
+                f.write(f"Plain *text* and **bold** with [a link](/page{i % 10})\n\n")
+        graph = link_graph.configure(self.public)
+        tracemalloc.start()
+        try:
+            with redirect_stdout(StringIO()):
+                generate_page(self.source, self.template, os.path.join(self.root, "out.html"), True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(graph.take_pages()[self.source]), 5000)
+        self.assertLess(peak, 2 * 2**20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import struct
+import unittest
+import zlib
+from contextlib import redirect_stdout
+from io import StringIO
+
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+from png_optimize import PngOptimizer, optimize_png, png_signature, read_chunks
+from test_support import SiteTestCase
+
+
+def chunk(chunk_type, body):
+    return struct.pack(">I4s", len(body), chunk_type) + body + struct.pack(
+        ">I", zlib.crc32(chunk_type + body)
+    )
+
+
+def make_png(width=64, height=64, seed=0, extra=(), split=3):
+    # An 8-bit grayscale image deflated at level 1 over several IDATs, so
+    # there is something to gain.
+    rows = b"".join(
+        b"\0" + bytes((x * y + seed) % 7 for x in range(width)) for y in range(height)
+    )
+    idat = zlib.compress(rows, 1)
+    step = -(-len(idat) // split)
+    parts = [idat[i:i + step] for i in range(0, len(idat), step)]
+    return b"".join(
+        [png_signature, chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))]
+        + [chunk(chunk_type, body) for chunk_type, body in extra]
+        + [chunk(b"IDAT", part) for part in parts]
+        + [chunk(b"IEND", b"")]
+    )
+
+
+def image_data(data):
+    chunks = read_chunks(data)
+    return zlib.decompress(b"".join(body for chunk_type, body in chunks if chunk_type == b"IDAT"))
+
+
+class TestOptimizePng(unittest.TestCase):
+    def test_lossless_and_smaller(self):
+        data = make_png(extra=[(b"tEXt", b"Comment\0hello" * 50), (b"tRNS", b"\0\1")])
+        optimized = optimize_png(data)
+        self.assertLess(len(optimized), len(data))
+        self.assertEqual(image_data(optimized), image_data(data))
+        self.assertEqual(
+            [chunk_type for chunk_type, _ in read_chunks(optimized)],
+            [b"IHDR", b"tRNS", b"IDAT", b"IEND"],
+        )
+
+    def test_not_smaller(self):
+        self.assertIsNone(optimize_png(optimize_png(make_png())))
+
+    def test_invalid_input(self):
+        data = bytearray(make_png())
+        data[40] ^= 0xFF
+        self.assertIsNone(optimize_png(bytes(data)))
+        self.assertIsNone(optimize_png(b"GIF89a"))
+        self.assertIsNone(optimize_png(make_png()[:-12]))
+
+    def test_animated_png_left_alone(self):
+        self.assertIsNone(optimize_png(make_png(extra=[(b"acTL", b"\0" * 8)])))
+
+
+class TestOptimizeAssets(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.root, "cache")
+        self.write_static("images/a.png", make_png(seed=1))
+        self.write_static("images/b.png", make_png(seed=2))
+        self.write_static("index.css", b"body {}")
+        self.a = os.path.join(self.public, "images", "a.png")
+
+    def build(self, workers=1):
+        with redirect_stdout(StringIO()):
+            sync_stats = sync_files_recursive(self.static, self.public, self.manifest)
+            stats = PngOptimizer(self.cache_dir, workers).optimize_assets(
+                self.manifest, self.manifest.assets
+            )
+        return sync_stats, stats
+
+    def test_optimizes_published_pngs(self):
+        _, stats = self.build(workers=2)
+        self.assertEqual(stats.optimized_files, 2)
+        self.assertGreater(stats.original_bytes, stats.optimized_bytes)
+        with open(self.a, "rb") as f:
+            published = f.read()
+        with open(os.path.join(self.static, "images", "a.png"), "rb") as f:
+            source = f.read()
+        self.assertLess(len(published), len(source))
+        self.assertEqual(image_data(published), image_data(source))
+        self.assertEqual(
+            os.stat(self.a).st_mtime_ns,
+            os.stat(os.path.join(self.static, "images", "a.png")).st_mtime_ns,
+        )
+
+    def test_unchanged_images_untouched(self):
+        self.build()
+        stat = os.stat(self.a)
+        sync_stats, stats = self.build()
+        self.assertEqual(sync_stats.copied_files, 0)
+        self.assertEqual(stats.unchanged_files, 2)
+        self.assertEqual(os.stat(self.a).st_ino, stat.st_ino)
+
+    def test_results_cached_by_content(self):
+        self.build()
+        os.remove(self.a)
+        self.manifest = BuildManifest(self.manifest.path)
+        _, stats = self.build()
+        self.assertEqual((stats.optimized_files, stats.cached_files), (0, 2))
+
+    def test_changed_image_reoptimized(self):
+        self.build()
+        source = self.write_static("images/a.png", make_png(seed=3))
+        stat = os.stat(source)
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        sync_stats, stats = self.build()
+        self.assertEqual(sync_stats.copied_files, 1)
+        self.assertEqual(stats.optimized_files, 1)
+        with open(self.a, "rb") as f:
+            self.assertEqual(image_data(f.read()), image_data(make_png(seed=3)))
+
+    def test_originals_restored_when_disabled(self):
+        self.build()
+        self.manifest.optimized_assets.clear()
+        with redirect_stdout(StringIO()):
+            sync_stats = sync_files_recursive(self.static, self.public, self.manifest)
+        self.assertEqual(sync_stats.copied_files, 2)
+        with open(self.a, "rb") as f:
+            self.assertEqual(f.read(), make_png(seed=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import gzip
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+from precompress import precompress_tree, remove_precompressed
+
+
+class TestPrecompressTree(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("index.html", b"<p>hello</p>" * 100)
+        self.write("index.css", b"body { margin: 0 }\n" * 50)
+        self.write("images/logo.png", b"\x89PNG" * 200)
+        self.write("tiny.js", b"1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name, data):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def test_compresses_text_and_skips_others(self):
+        stats = precompress_tree(self.root)
+        self.assertEqual(stats.compressed_files, 2)
+        self.assertEqual(stats.skipped_files, 2)
+        with gzip.open(self.path("index.html.gz")) as f:
+            self.assertEqual(f.read(), b"<p>hello</p>" * 100)
+        self.assertTrue(os.path.exists(self.path("index.css.gz")))
+        self.assertFalse(os.path.exists(self.path("images/logo.png.gz")))
+        self.assertFalse(os.path.exists(self.path("tiny.js.gz")))
+        self.assertLess(stats.compressed_bytes, stats.original_bytes)
+
+    def test_gz_shares_source_mtime(self):
+        precompress_tree(self.root)
+        self.assertEqual(
+            os.stat(self.path("index.html.gz")).st_mtime_ns,
+            os.stat(self.path("index.html")).st_mtime_ns,
+        )
+
+    def test_second_run_is_incremental(self):
+        precompress_tree(self.root)
+        stats = precompress_tree(self.root)
+        self.assertEqual(stats.compressed_files, 0)
+        self.assertEqual(stats.unchanged_files, 2)
+
+    def test_changed_source_is_recompressed(self):
+        precompress_tree(self.root)
+        self.write("index.html", b"<p>changed</p>" * 100)
+        stat = os.stat(self.path("index.html"))
+        os.utime(self.path("index.html"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        stats = precompress_tree(self.root)
+        self.assertEqual(stats.compressed_files, 1)
+        with gzip.open(self.path("index.html.gz")) as f:
+            self.assertEqual(f.read(), b"<p>changed</p>" * 100)
+
+    def test_orphaned_gz_removed(self):
+        precompress_tree(self.root)
+        os.remove(self.path("index.css"))
+        stats = precompress_tree(self.root)
+        self.assertEqual(stats.removed_files, 1)
+        self.assertFalse(os.path.exists(self.path("index.css.gz")))
+
+    def test_excluded_files_not_compressed(self):
+        precompress_tree(self.root)
+        stats = precompress_tree(self.root, excluded={self.path("index.html")})
+        self.assertEqual(stats.removed_files, 1)
+        self.assertFalse(os.path.exists(self.path("index.html.gz")))
+        self.assertTrue(os.path.exists(self.path("index.css.gz")))
+
+    def test_remove_precompressed(self):
+        self.write("data.tar.gz", b"archive")
+        precompress_tree(self.root, protected={self.path("data.tar.gz")})
+        self.assertEqual(remove_precompressed(self.root, {self.path("data.tar.gz")}), 2)
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ["data.tar.gz", "images", "index.css", "index.html", "tiny.js"],
+        )
+
+    def test_protected_gz_assets_kept(self):
+        self.write("data.tar.gz", b"archive")
+        stats = precompress_tree(self.root, protected={self.path("data.tar.gz")})
+        self.assertEqual(stats.removed_files, 0)
+        self.assertTrue(os.path.exists(self.path("data.tar.gz")))
+
+    def test_static_assets_compressed(self):
+        static = os.path.join(self.root, "static")
+        public = os.path.join(self.root, "public")
+        os.makedirs(static)
+        with open(os.path.join(static, "index.css"), "wb") as f:
+            f.write(b"body { margin: 0 }\n" * 50)
+        manifest = BuildManifest(os.path.join(self.root, "manifest.json"))
+        with redirect_stdout(StringIO()):
+            sync_files_recursive(static, public, manifest)
+        stats = precompress_tree(public, protected=set(manifest.assets))
+        self.assertEqual(stats.compressed_files, 1)
+        with gzip.open(os.path.join(public, "index.css.gz")) as f:
+            self.assertEqual(f.read(), b"body { margin: 0 }\n" * 50)
+
+    def test_shipped_gz_not_overwritten(self):
+        self.write("index.css.gz", b"shipped")
+        precompress_tree(self.root, protected={self.path("index.css"), self.path("index.css.gz")})
+        with open(self.path("index.css.gz"), "rb") as f:
+            self.assertEqual(f.read(), b"shipped")
+
+
+if __name__ == "__main__":
+    unittest.main()
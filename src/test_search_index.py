@@ -0,0 +1,202 @@
+import os
+import shutil
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import block_cache
+import output_cache
+import search_index
+from async_pages import generate_pages_async
+from build_manifest import BuildManifest
+from inline_markdown import text_to_textnodes
+from page_generation import generate_pages_recursive, page_search_text
+from page_text import PageText
+from search_index import (
+    SearchIndexReader,
+    decode_varint,
+    encode_index,
+    encode_varint,
+    page_url,
+)
+from test_support import SiteTestCase
+
+
+def make_index(pages):
+    # pages: (url, text), with terms collected as rendering collects them.
+    indexed = []
+    for url, text in pages:
+        collector = PageText()
+        collector.add_nodes(text_to_textnodes(text))
+        info = {"source": url, "hash": "", "url": url, "title": url.strip("/")}
+        indexed.append((info, collector.terms))
+    return SearchIndexReader(encode_index(indexed))
+
+
+class TestIndexFormat(unittest.TestCase):
+    def test_varint_round_trip(self):
+        for value in (0, 1, 127, 128, 300, 2**32 + 5):
+            out = bytearray()
+            encode_varint(value, out)
+            self.assertEqual(decode_varint(out, 0), (value, len(out)))
+
+    def test_page_url(self):
+        public = os.path.join("site", "public")
+        self.assertEqual(page_url(os.path.join(public, "index.html"), public), "/")
+        self.assertEqual(page_url(os.path.join(public, "a", "index.html"), public), "/a/")
+        self.assertEqual(page_url(os.path.join(public, "a", "b.html"), public), "/a/b.html")
+
+    def test_postings_round_trip(self):
+        reader = make_index([("/a/", "one two one"), ("/b/", "two")])
+        self.assertEqual(reader.postings("one"), {0: [0, 2]})
+        self.assertEqual(reader.postings("two"), {0: [1], 1: [0]})
+        self.assertEqual(reader.postings("three"), {})
+        self.assertEqual([term for term, _ in reader.terms()], ["one", "two"])
+
+    def test_not_an_index(self):
+        with self.assertRaises(ValueError):
+            SearchIndexReader(b"\0" * 64)
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.reader = make_index([
+            ("/hobbits/", "Hobbits live in the Shire. The ring went to Mordor."),
+            ("/ring/", "The **One Ring** was forged in Mordor. One ring, one ring."),
+            ("/elves/", "Elves live in Rivendell."),
+        ])
+
+    def test_all_terms_required(self):
+        self.assertEqual([r["url"] for r in self.reader.search("live")], ["/elves/", "/hobbits/"])
+        self.assertEqual([r["url"] for r in self.reader.search("elves shire")], [])
+        self.assertEqual(self.reader.search("  "), [])
+
+    def test_phrases_rank_first(self):
+        results = self.reader.search("one ring")
+        self.assertEqual([r["url"] for r in results], ["/ring/"])
+        self.assertEqual(results[0]["title"], "ring")
+        results = self.reader.search("RING mordor")
+        self.assertEqual([r["url"] for r in results], ["/ring/", "/hobbits/"])
+
+    def test_limit(self):
+        self.assertEqual(len(self.reader.search("in", limit=2)), 2)
+
+
+class TestIndexedBuild(SiteTestCase):
+    template_text = "{{ Title }}{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.root, "cache")
+        self.index_path = os.path.join(self.public, "search-index.bin")
+        self.write("index.md", "# Home\n\nWelcome to the **Shire**.")
+        self.write("ring/index.md", "# The Ring\n\nForged in `Mordor`, see [home](/).")
+
+    def tearDown(self):
+        search_index.configure(None)
+        output_cache.configure(None)
+        block_cache.configure(0)
+
+    def build(self, jobs=1):
+        indexer = search_index.configure(self.public)
+        self.build_site(jobs)
+        self.manifest.save()
+        indexer.write(self.manifest, page_search_text)
+        return SearchIndexReader.open(self.index_path)
+
+    def urls(self, reader, query):
+        return [result["url"] for result in reader.search(query)]
+
+    def test_indexes_rendered_text(self):
+        reader = self.build()
+        self.assertEqual(self.urls(reader, "shire"), ["/"])
+        self.assertEqual(self.urls(reader, "mordor home"), ["/ring/"])
+        self.assertEqual(reader.search("forged")[0]["title"], "The Ring")
+        reader.close()
+
+    def test_incremental_build_updates_index(self):
+        self.build().close()
+        self.write("ring/index.md", "# The Ring\n\nNow in Rivendell.")
+        self.write("elves/index.md", "# Elves\n\nAlso in Rivendell.")
+        os.remove(os.path.join(self.content, "index.md"))
+        reader = self.build()
+        self.assertEqual(self.urls(reader, "rivendell"), ["/elves/", "/ring/"])
+        self.assertEqual(self.urls(reader, "mordor"), [])
+        self.assertEqual(self.urls(reader, "shire"), [])
+        reader.close()
+
+    def test_unchanged_pages_reused(self):
+        self.build().close()
+        with open(self.index_path, "rb") as f:
+            before = f.read()
+        calls = []
+
+        def index_source(from_path):
+            calls.append(from_path)
+            return page_search_text(from_path)
+
+        indexer = search_index.configure(self.public)
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, self.public, self.manifest)
+        indexer.write(self.manifest, index_source)
+        self.assertEqual(calls, [])
+        with open(self.index_path, "rb") as f:
+            self.assertEqual(f.read(), before)
+
+    def test_unchanged_index_not_decoded(self):
+        self.build().close()
+        indexer = search_index.configure(self.public)
+        with patch("search_index.load_index_pages", side_effect=AssertionError):
+            self.assertEqual(indexer.write(self.manifest, page_search_text), 2)
+
+    def test_later_writes_not_decoded(self):
+        self.build().close()
+        self.write("ring/index.md", "# The Ring\n\nNow in Rivendell.")
+        with patch("search_index.load_index_pages", side_effect=AssertionError):
+            self.build_site()
+            search_index.active.write(self.manifest, page_search_text)
+        reader = SearchIndexReader.open(self.index_path)
+        self.assertEqual(self.urls(reader, "rivendell"), ["/ring/"])
+        self.assertEqual(self.urls(reader, "shire"), ["/"])
+        reader.close()
+
+    def test_output_cache_hits_indexed(self):
+        output_cache.configure(self.cache_dir)
+        self.build().close()
+        shutil.rmtree(self.public)
+        os.remove(self.manifest.path)
+        self.manifest = BuildManifest(self.manifest.path)
+        reader = self.build()
+        self.assertEqual(output_cache.active.hits, 2)
+        self.assertEqual(self.urls(reader, "shire"), ["/"])
+        reader.close()
+
+    def test_block_cache_hits_indexed(self):
+        cache = block_cache.configure(2**20)
+        self.write("copy/index.md", "# Copy\n\nWelcome to the **Shire**.")
+        reader = self.build()
+        self.assertGreater(cache.hits, 0)
+        self.assertEqual(self.urls(reader, "welcome"), ["/", "/copy/"])
+        reader.close()
+
+    def test_parallel_build(self):
+        for i in range(4):
+            self.write(f"page{i}/index.md", f"# Page {i}\n\nNumber word{i}.")
+        reader = self.build(jobs=2)
+        self.assertEqual(self.urls(reader, "word3"), ["/page3/"])
+        self.assertEqual(len(self.urls(reader, "number")), 4)
+        reader.close()
+
+    def test_async_build(self):
+        indexer = search_index.configure(self.public)
+        with redirect_stdout(StringIO()):
+            generate_pages_async(self.content, self.template, self.public, self.manifest)
+        indexer.write(self.manifest, page_search_text)
+        reader = SearchIndexReader.open(self.index_path)
+        self.assertEqual(self.urls(reader, "mordor"), ["/ring/"])
+        reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
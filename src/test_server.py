@@ -0,0 +1,502 @@
+import gzip
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from server import (  # noqa: E402
+    CORSHTTPRequestHandler,
+    LiveReload,
+    PooledHTTPServer,
+    ResponseCache,
+    accepts_gzip,
+    cache_control_for,
+    default_cache_control_rules,
+    make_server,
+    make_watcher,
+)
+from test_png_optimize import make_png  # noqa: E402
+from test_support import SiteTestCase  # noqa: E402
+
+
+class QuietHandler(CORSHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    handler_class = QuietHandler
+    workers = 4
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.write("index.html", b"<html><body><p>home</p></body></html>")
+        self.write("index.css", b"body {}")
+        self.httpd = make_server(
+            handler_class=self.handler_class, port=0, directory=self.root, workers=self.workers,
+            keep_alive_timeout=0.5,
+        )
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,))
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def connect(self):
+        return http.client.HTTPConnection("localhost", self.port, timeout=5)
+
+    def get(self, path, headers=None):
+        conn = self.connect()
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+
+class TestPooledServer(ServerTestCase):
+    def test_get_file(self):
+        response, body = self.get("/index.css")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b"body {}")
+        self.assertEqual(response.getheader("Access-Control-Allow-Origin"), "*")
+
+    def test_keep_alive(self):
+        conn = self.connect()
+        conn.request("GET", "/index.css")
+        first = conn.getresponse()
+        first.read()
+        sock = conn.sock
+        conn.request("GET", "/index.html")
+        second = conn.getresponse()
+        second.read()
+        self.assertEqual(second.version, 11)
+        self.assertIs(conn.sock, sock)
+        conn.close()
+
+    def test_options_has_empty_body(self):
+        conn = self.connect()
+        conn.request("OPTIONS", "/")
+        response = conn.getresponse()
+        self.assertEqual(response.getheader("Content-Length"), "0")
+        self.assertEqual(response.read(), b"")
+        conn.close()
+
+    def test_slow_client_does_not_block_others(self):
+        slow = socket.create_connection(("localhost", self.port))
+        slow.sendall(b"GET /index.css HTTP/1.1\r\n")
+        try:
+            start = time.monotonic()
+            response, _ = self.get("/index.css")
+            self.assertEqual(response.status, 200)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            slow.close()
+
+    def test_client_disconnects_are_not_logged(self):
+        for error in (BrokenPipeError(), ConnectionResetError()):
+            with redirect_stderr(StringIO()) as err:
+                try:
+                    raise error
+                except OSError:
+                    self.httpd.handle_error(None, ("localhost", 0))
+            self.assertEqual(err.getvalue(), "")
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_hit_and_invalidate_on_change(self):
+        path = self.write("a.css", b"one")
+        cache = ResponseCache(1024)
+        first = cache.load(path)
+        self.assertIs(cache.load(path), first)
+        self.write("a.css", b"two!")
+        second = cache.load(path)
+        self.assertEqual(second.body, b"two!")
+        self.assertNotEqual(second.etag, first.etag)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_bytes=20, max_entry_bytes=20)
+        a = self.write("a", b"a" * 8)
+        b = self.write("b", b"b" * 8)
+        c = self.write("c", b"c" * 8)
+        cache.load(a)
+        cache.load(b)
+        cache.load(a)
+        cache.load(c)
+        self.assertEqual(list(cache.entries), [a, c])
+        self.assertEqual(cache.size, 16)
+
+    def test_large_files_not_cached(self):
+        path = self.write("big", b"x" * 100)
+        cache = ResponseCache(max_bytes=1000, max_entry_bytes=50)
+        self.assertIsNone(cache.load(path))
+        self.assertEqual(cache.entries, {})
+
+    def test_cache_control_rules(self):
+        rules = (("/images/*", "public, max-age=31536000, immutable"),) + \
+            default_cache_control_rules
+        self.assertEqual(cache_control_for("/images/a.png", rules),
+                         "public, max-age=31536000, immutable")
+        self.assertEqual(cache_control_for("/majesty/", rules), "no-cache")
+        self.assertEqual(cache_control_for("/index.html", rules), "no-cache")
+        self.assertEqual(cache_control_for("/index.css", rules), "public, max-age=3600")
+        self.assertEqual(cache_control_for("/index.0123456789.css", rules),
+                         "public, max-age=3600")
+        self.assertEqual(cache_control_for("/index.min.css", rules), "public, max-age=3600")
+
+
+class TestConditionalGet(ServerTestCase):
+    def test_etag_and_if_none_match(self):
+        response, body = self.get("/index.css")
+        etag = response.getheader("ETag")
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=3600")
+        response, body = self.get("/index.css", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(response.getheader("ETag"), etag)
+
+    def test_if_modified_since(self):
+        response, _ = self.get("/index.css")
+        last_modified = response.getheader("Last-Modified")
+        response, _ = self.get("/index.css", {"If-Modified-Since": last_modified})
+        self.assertEqual(response.status, 304)
+        response, _ = self.get("/index.css", {"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})
+        self.assertEqual(response.status, 200)
+
+    def test_changed_file_is_served_fresh(self):
+        response, _ = self.get("/index.css")
+        etag = response.getheader("ETag")
+        self.write("index.css", b"body { color: red }")
+        response, body = self.get("/index.css", {"If-None-Match": etag})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b"body { color: red }")
+
+    def test_directory_index(self):
+        response, body = self.get("/")
+        self.assertEqual(body, b"<html><body><p>home</p></body></html>")
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+        self.assertEqual(self.get("/missing.css")[0].status, 404)
+
+    def test_head(self):
+        conn = self.connect()
+        conn.request("HEAD", "/index.css")
+        response = conn.getresponse()
+        self.assertEqual(response.getheader("Content-Length"), "7")
+        self.assertEqual(response.read(), b"")
+        conn.close()
+
+    def test_hit_rate_endpoint(self):
+        self.get("/index.css")
+        self.get("/index.css")
+        _, body = self.get("/__cache")
+        stats = json.loads(body)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+
+class TestFingerprintedAssets(ServerTestCase):
+    def test_only_manifest_urls_are_immutable(self):
+        self.write("index.0123456789.css", b"body {}")
+        self.write("q4.2024123100.pdf", b"report")
+        self.write("asset-manifest.json", json.dumps(
+            {"/index.css": "/index.0123456789.css"}).encode())
+        response, _ = self.get("/index.0123456789.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=31536000, immutable")
+        response, _ = self.get("/q4.2024123100.pdf")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=3600")
+        response, _ = self.get("/index.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=3600")
+
+    def test_manifest_reloaded(self):
+        self.write("index.0123456789.css", b"body {}")
+        response, _ = self.get("/index.0123456789.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=3600")
+        self.write("asset-manifest.json", json.dumps(
+            {"/index.css": "/index.0123456789.css"}).encode())
+        response, _ = self.get("/index.0123456789.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=31536000, immutable")
+
+
+class TestPrecompressedServing(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.css = b"body { margin: 0 }\n" * 50
+        self.write("site.css", self.css)
+        self.write("site.css.gz", gzip.compress(self.css, mtime=0))
+        self.sync_mtime("site.css")
+
+    def sync_mtime(self, name):
+        stat = os.stat(os.path.join(self.root, name))
+        os.utime(os.path.join(self.root, f"{name}.gz"), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    def test_gzip_variant_served(self):
+        response, body = self.get("/site.css", {"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(response.getheader("Content-Type"), "text/css")
+        self.assertEqual(gzip.decompress(body), self.css)
+
+    def test_identity_without_accept_encoding(self):
+        response, body = self.get("/site.css")
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(body, self.css)
+
+    def test_stale_variant_ignored(self):
+        self.write("site.css", b"body {}")
+        stat = os.stat(os.path.join(self.root, "site.css"))
+        os.utime(os.path.join(self.root, "site.css"),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        response, body = self.get("/site.css", {"Accept-Encoding": "gzip"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, b"body {}")
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip("gzip"))
+        self.assertTrue(accepts_gzip("br;q=1.0, gzip;q=0.5"))
+        self.assertTrue(accepts_gzip("*"))
+        self.assertFalse(accepts_gzip("gzip;q=0"))
+        self.assertFalse(accepts_gzip("identity"))
+        self.assertFalse(accepts_gzip(None))
+
+
+class TestSearchEndpoint(ServerTestCase):
+    def write_index(self, pages):
+        from inline_markdown import text_to_textnodes
+        from page_text import PageText
+        from search_index import encode_index
+
+        indexed = []
+        for url, title, text in pages:
+            collector = PageText()
+            collector.add_nodes(text_to_textnodes(text))
+            info = {"source": url, "hash": "", "url": url, "title": title}
+            indexed.append((info, collector.terms))
+        self.write("search-index.bin", encode_index(indexed))
+
+    def test_no_index(self):
+        response, _ = self.get("/search?q=ring")
+        self.assertEqual(response.status, 404)
+
+    def test_query(self):
+        self.write_index([
+            ("/", "Home", "The Shire"),
+            ("/ring/", "The Ring", "One ring to rule them all"),
+        ])
+        response, body = self.get("/search?q=One%20Ring")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Cache-Control"), "no-store")
+        result = json.loads(body)
+        self.assertEqual(result["query"], "One Ring")
+        self.assertEqual([r["url"] for r in result["results"]], ["/ring/"])
+        self.assertEqual(result["results"][0]["title"], "The Ring")
+        self.assertIn("took_ms", result)
+        _, body = self.get("/search?q=")
+        self.assertEqual(json.loads(body)["results"], [])
+        response, _ = self.get("/search?q=ring&limit=x")
+        self.assertEqual(response.status, 400)
+
+    def test_rebuilt_index_reloaded(self):
+        self.write_index([("/", "Home", "The Shire")])
+        _, body = self.get("/search?q=shire")
+        self.assertEqual(len(json.loads(body)["results"]), 1)
+        self.write_index([("/", "Home", "Rivendell"), ("/b/", "B", "more text here")])
+        _, body = self.get("/search?q=shire")
+        self.assertEqual(json.loads(body)["results"], [])
+        _, body = self.get("/search?q=rivendell")
+        self.assertEqual(json.loads(body)["results"][0]["url"], "/")
+
+
+class LiveReloadHandler(QuietHandler):
+    livereload = LiveReload()
+
+
+class TestLiveReload(ServerTestCase):
+    handler_class = LiveReloadHandler
+
+    def test_script_injected_into_html(self):
+        response, body = self.get("/")
+        self.assertIn(b"EventSource", body)
+        self.assertTrue(body.endswith(b"</body></html>"))
+        self.assertEqual(int(response.getheader("Content-Length")), len(body))
+
+    def test_other_files_untouched(self):
+        _, body = self.get("/index.css")
+        self.assertEqual(body, b"body {}")
+
+
+class TestLiveReloadStreams(ServerTestCase):
+    workers = 2
+
+    def setUp(self):
+        self.livereload = LiveReload()
+        self.handler_class = type("Handler", (QuietHandler,), {"livereload": self.livereload})
+        super().setUp()
+
+    def tearDown(self):
+        # Ends the streams, which would otherwise keep the server open.
+        self.livereload.close()
+        super().tearDown()
+
+    def open_stream(self):
+        stream = socket.create_connection(("localhost", self.port), timeout=5)
+        self.addCleanup(stream.close)
+        stream.sendall(b"GET /__livereload HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        head = b""
+        while b"\r\n\r\n" not in head:
+            head += stream.recv(4096)
+        self.assertTrue(head.startswith(b"HTTP/1.1 200"))
+        return stream
+
+    def test_streams_do_not_hold_workers(self):
+        streams = [self.open_stream() for _ in range(self.workers + 1)]
+        response, body = self.get("/index.css")
+        self.assertEqual(body, b"body {}")
+        self.livereload.notify()
+        for stream in streams:
+            self.assertIn(b"data: reload", stream.recv(4096))
+
+
+class TestWatchMode(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        import main as site
+
+        self.site = site
+        self.write("index.md", "# Home\n\nThe ring")
+        self.write_static("index.css", "body {}")
+        self.write_static("images/a.png", make_png(seed=1))
+        # The builder works on ./content, ./public and so on.
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+        self.addCleanup(self.reset_builder)
+        with redirect_stdout(StringIO()):
+            self.site.build(self.site.parse_args(
+                ["-q", "--fingerprint-assets", "--search-index", "--optimize-png"]
+            ))
+
+    def reset_builder(self):
+        import asset_fingerprint
+        import block_cache
+        import build_log
+        import link_graph
+        import output_cache
+        import png_optimize
+        import search_index
+
+        asset_fingerprint.configure(None)
+        block_cache.configure(0)
+        build_log.set_verbosity(build_log.summary)
+        link_graph.configure(None)
+        output_cache.configure(None)
+        png_optimize.configure(None)
+        search_index.configure(None)
+
+    def watch(self, build_args):
+        with redirect_stdout(StringIO()):
+            watcher = make_watcher(LiveReload(), build_args)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def public_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dir_path, name), self.public)
+            for dir_path, _, names in os.walk(self.public) for name in names
+        )
+
+    def test_build_flags_kept(self):
+        built = self.public_files()
+        watcher = self.watch(["-q", "--fingerprint-assets", "--search-index", "--optimize-png"])
+        self.assertEqual(self.public_files(), built)
+        self.write("about.md", "# About\n\nMordor")
+        self.write_static("images/b.png", make_png(seed=2))
+        with redirect_stdout(StringIO()):
+            watcher.poll()
+        with open(os.path.join(self.public, "asset-manifest.json")) as f:
+            self.assertIn("/images/b.png", json.load(f))
+        from search_index import SearchIndexReader
+
+        reader = SearchIndexReader.open(os.path.join(self.public, "search-index.bin"))
+        self.assertEqual([r["url"] for r in reader.search("mordor", 10)], ["/about.html"])
+        self.assertLess(
+            os.path.getsize(os.path.join(self.public, "images", "b.png")),
+            os.path.getsize(os.path.join(self.static, "images", "b.png")),
+        )
+
+
+class TestGracefulShutdown(unittest.TestCase):
+    def test_in_flight_request_completes(self):
+        started = threading.Event()
+
+        class SlowHandler(QuietHandler):
+            def do_GET(self):
+                started.set()
+                time.sleep(0.3)
+                body = b"done"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        httpd = PooledHTTPServer(("localhost", 0), SlowHandler, workers=2)
+        thread = threading.Thread(target=httpd.serve_forever, args=(0.05,))
+        thread.start()
+        result = {}
+
+        def client():
+            conn = http.client.HTTPConnection("localhost", httpd.server_address[1], timeout=5)
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            result["body"] = response.read()
+            result["connection"] = response.getheader("Connection")
+            conn.close()
+
+        client_thread = threading.Thread(target=client)
+        client_thread.start()
+        started.wait(5)
+        httpd.shutdown()
+        httpd.server_close()
+        thread.join()
+        client_thread.join()
+        self.assertEqual(result["body"], b"done")
+        self.assertEqual(result["connection"], "close")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+from page_generation import find_pages, generate_pages, generate_pages_recursive
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+    return path
+
+
+class SiteTestCase(unittest.TestCase):
+    # A throwaway site for build tests: content/, static/ and template.html
+    # in a temporary directory that is removed after the test, public/ as
+    # the output, and an unsaved manifest. Subclasses add pages in setUp.
+    template_text = "<title>{{ Title }}</title>{{ Content }}"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.public = os.path.join(self.root, "public")
+        self.template = os.path.join(self.root, "template.html")
+        self.manifest = BuildManifest(os.path.join(self.root, "manifest.json"))
+        os.makedirs(self.content)
+        os.makedirs(self.static)
+        write_file(self.template, self.template_text)
+
+    def write(self, name, text):
+        return write_file(os.path.join(self.content, name), text)
+
+    def write_static(self, name, data):
+        return write_file(os.path.join(self.static, name), data)
+
+    def outputs(self, dest):
+        # {path relative to dest: bytes} of every page's output.
+        outputs = {}
+        for _, dest_path in find_pages(self.content, dest):
+            with open(dest_path, "rb") as f:
+                outputs[os.path.relpath(dest_path, dest)] = f.read()
+        return outputs
+
+    def render_pages(self, name, jobs=1, streaming=False):
+        # Renders every page into a new directory, without a manifest, and
+        # returns the outputs and what the build printed.
+        dest = os.path.join(self.root, name)
+        with redirect_stdout(StringIO()) as out:
+            generate_pages(find_pages(self.content, dest), self.template, jobs, streaming, dest)
+        return self.outputs(dest), out.getvalue()
+
+    def build_site(self, jobs=1):
+        # An incremental build into public/ against self.manifest.
+        with redirect_stdout(StringIO()) as out:
+            sync_files_recursive(self.static, self.public, self.manifest)
+            generate_pages_recursive(
+                self.content, self.template, self.public, self.manifest, jobs=jobs
+            )
+        return out.getvalue()
@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+import unittest
+
+from template_engine import compile_template, load_template
+
+
+class TestCompileTemplate(unittest.TestCase):
+    def test_segments(self):
+        template = compile_template("<title>{{ Title }}</title>{{Content}}")
+        self.assertEqual(template.segments, ["<title>", "Title", "</title>", "Content", ""])
+        self.assertEqual(template.placeholders, {"Title", "Content"})
+
+    def test_unknown_placeholder(self):
+        with self.assertRaises(ValueError) as cm:
+            compile_template("{{ Title }}\n{{ Content }}\n{{ Author }}", "page.html")
+        self.assertIn("page.html:3", str(cm.exception))
+        self.assertIn("{{ Author }}", str(cm.exception))
+
+    def test_missing_placeholder(self):
+        with self.assertRaises(ValueError) as cm:
+            compile_template("<title>{{ Title }}</title>", "page.html")
+        self.assertIn("{{ Content }}", str(cm.exception))
+
+    def test_optional_placeholders(self):
+        template = compile_template("{{ Nav }}{{ Title }}{{ Date }}{{ Content }}")
+        self.assertEqual(template.placeholders, {"Title", "Content", "Date", "Nav"})
+
+
+class TestIncludes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_partials_are_inlined(self):
+        self.write("partials/head.html", "<title>{{ Title }}</title>{{> nav.html }}")
+        self.write("partials/nav.html", "{{ Nav }}")
+        path = self.write("page.html", "{{> partials/head.html }}<main>{{ Content }}</main>")
+        template = load_template(path)
+        self.assertEqual(
+            template.segments, ["<title>", "Title", "</title>", "Nav", "<main>", "Content", "</main>"]
+        )
+        self.assertEqual(template.dependencies, [
+            path,
+            os.path.join(self.root, "partials", "head.html"),
+            os.path.join(self.root, "partials", "nav.html"),
+        ])
+
+    def test_missing_partial(self):
+        path = self.write("page.html", "{{ Title }}\n{{> nope.html }}{{ Content }}")
+        with self.assertRaises(ValueError) as cm:
+            load_template(path)
+        self.assertIn("page.html:2: partial not found", str(cm.exception))
+
+    def test_include_cycle(self):
+        self.write("a.html", "{{> b.html }}")
+        self.write("b.html", "{{> a.html }}")
+        path = self.write("page.html", "{{ Title }}{{ Content }}{{> a.html }}")
+        with self.assertRaises(ValueError) as cm:
+            load_template(path)
+        self.assertIn("include cycle", str(cm.exception))
+
+    def test_partial_errors_point_at_partial(self):
+        self.write("footer.html", "\n{{ Author }}")
+        path = self.write("page.html", "{{ Title }}{{ Content }}{{> footer.html }}")
+        with self.assertRaises(ValueError) as cm:
+            load_template(path)
+        self.assertIn("footer.html:2: unknown placeholder", str(cm.exception))
+
+    def test_cache_invalidated_by_partial_change(self):
+        partial = self.write("footer.html", "old")
+        path = self.write("page.html", "{{ Title }}{{ Content }}{{> footer.html }}")
+        first = load_template(path)
+        self.assertIs(load_template(path), first)
+        self.write("footer.html", "new!")
+        os.utime(partial, ns=(0, os.stat(partial).st_mtime_ns + 10**9))
+        self.assertEqual(load_template(path).segments[-1], "new!")
+
+
+class TestRenderTemplate(unittest.TestCase):
+    def test_render_strings(self):
+        template = compile_template("<h1>{{ Title }}</h1>{{ Content }}<p>{{ Title }}</p>")
+        out = io.StringIO()
+        template.render_to(out, {"Title": "Hi", "Content": "<p>body</p>"})
+        self.assertEqual(out.getvalue(), "<h1>Hi</h1><p>body</p><p>Hi</p>")
+
+    def test_render_callable(self):
+        template = compile_template("{{ Title }}[{{ Content }}]")
+        out = io.StringIO()
+        template.render_to(out, {"Title": "T", "Content": lambda stream: stream.write("streamed")})
+        self.assertEqual(out.getvalue(), "T[streamed]")
+
+    def test_values_are_not_rescanned(self):
+        template = compile_template("{{ Title }}|{{ Content }}")
+        out = io.StringIO()
+        template.render_to(out, {"Title": "{{ Content }}", "Content": "x"})
+        self.assertEqual(out.getvalue(), "{{ Content }}|x")
+
+
+class TestLoadTemplate(unittest.TestCase):
+    def test_cached_until_modified(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "template.html")
+            with open(path, "w") as f:
+                f.write("{{ Title }}{{ Content }}")
+            first = load_template(path)
+            self.assertIs(load_template(path), first)
+
+            with open(path, "w") as f:
+                f.write("<b>{{ Title }}</b>{{ Content }}")
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+            second = load_template(path)
+            self.assertIsNot(second, first)
+            self.assertEqual(second.segments[0], "<b>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 
-from textnode import TextNode
+import inline_markdown
+import textnode
+from textnode import TextNode, text_node_to_html_node, text_type_image, text_type_link
 
 
 class TestTextNode(unittest.TestCase):
@@ -59,6 +61,31 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode(None, None, None)
         self.assertFalse(node1 == node2)
 
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(TextNode("text", "bold"), "__dict__"))
+
+
+class TestTextNodeToHTMLNode(unittest.TestCase):
+    def test_type_tags_defined_once(self):
+        for name in ("text", "bold", "italic", "code", "link", "image"):
+            self.assertIs(
+                getattr(inline_markdown, f"text_type_{name}"),
+                getattr(textnode, f"text_type_{name}"),
+            )
+
+    def test_link(self):
+        node = text_node_to_html_node(TextNode("home", text_type_link, "/"))
+        self.assertEqual(node.to_html(), "<a href=\"/\">home</a>")
+        self.assertEqual(node.props, {"href": "/"})
+
+    def test_image(self):
+        node = text_node_to_html_node(TextNode("alt", text_type_image, "/a.png"))
+        self.assertEqual(node.to_html(), "<img src=\"/a.png\" alt=\"alt\"></img>")
+
+    def test_invalid_type(self):
+        with self.assertRaises(ValueError):
+            text_node_to_html_node(TextNode("x", "underline"))
+
 
 if __name__ == "__main__":
     unittest.main()
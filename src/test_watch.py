@@ -0,0 +1,213 @@
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import asset_fingerprint
+import inotify
+from asset_fingerprint import fingerprint_assets
+from build_manifest import BuildManifest
+from copy_static import sync_files_recursive
+from page_generation import generate_pages_recursive
+from watch import SiteWatcher, diff_snapshots, snapshot_tree
+
+
+class TestDiffSnapshots(unittest.TestCase):
+    def test_diff(self):
+        old = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        new = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        changed, removed = diff_snapshots(old, new)
+        self.assertEqual(sorted(changed), ["b", "d"])
+        self.assertEqual(removed, ["c"])
+
+
+class TestSiteWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        os.makedirs(os.path.join(self.content, "blog"))
+        os.makedirs(self.static)
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nBody")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+        self.rebuilt = []
+        with redirect_stdout(StringIO()):
+            sync_files_recursive(self.static, self.public, self.manifest)
+            generate_pages_recursive(self.content, self.template, self.public, self.manifest)
+        self.watcher = SiteWatcher(
+            self.content, self.static, self.template, self.public, self.manifest,
+            on_rebuild=self.rebuilt.append,
+        )
+
+    def tearDown(self):
+        self.watcher.close()
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+        # Make sure the change is visible even on coarse mtime filesystems.
+        if os.path.exists(path):
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def poll(self):
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            return self.watcher.poll()
+
+    def read(self, *parts):
+        with open(os.path.join(self.public, *parts)) as f:
+            return f.read()
+
+    def test_no_changes(self):
+        self.assertEqual(self.poll(), [])
+        self.assertEqual(self.rebuilt, [])
+
+    def test_edit_rebuilds_only_that_page(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nEdited")
+        self.assertEqual(self.poll(), [os.path.join(self.public, "blog", "post.html")])
+        self.assertIn("Edited", self.read("blog", "post.html"))
+        self.assertEqual(len(self.rebuilt), 1)
+
+    def test_touch_without_change_is_ignored(self):
+        post = os.path.join(self.content, "blog", "post.md")
+        os.utime(post, ns=(0, os.stat(post).st_mtime_ns + 10**9))
+        self.assertEqual(self.poll(), [])
+
+    def test_new_and_removed_pages(self):
+        self.write(os.path.join(self.content, "about.md"), "# About\n\nUs")
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        outputs = self.poll()
+        self.assertIn(os.path.join(self.public, "about.html"), outputs)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "post.html")))
+
+    def test_template_change_rebuilds_all_pages(self):
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(len(self.poll()), 2)
+        self.assertTrue(self.read("index.html").startswith("<h1>Home</h1>"))
+
+    def test_section_template_rebuilds_only_its_section(self):
+        self.write(os.path.join(self.content, "blog", "_template.html"),
+                   "<b>{{ Title }}</b>{{ Content }}")
+        self.assertEqual(self.poll(), [os.path.join(self.public, "blog", "post.html")])
+        self.assertTrue(self.read("blog", "post.html").startswith("<b>Post</b>"))
+
+    def test_partial_outside_content_is_watched(self):
+        partial = os.path.join(self.tmp.name, "footer.html")
+        self.write(partial, "<footer>one</footer>")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}{{> footer.html }}")
+        self.assertEqual(len(self.poll()), 2)
+        self.write(partial, "<footer>two</footer>")
+        self.assertEqual(len(self.poll()), 2)
+        self.assertTrue(self.read("index.html").endswith("<footer>two</footer>"))
+
+    def test_static_changes(self):
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.write(os.path.join(self.static, "app.js"), "1")
+        self.poll()
+        self.assertEqual(self.read("index.css"), "body { margin: 0 }")
+        os.remove(os.path.join(self.static, "app.js"))
+        self.poll()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "app.js")))
+
+    def test_fingerprinted_asset_change_rebuilds_pages(self):
+        self.write(self.template, '<link href="/index.css">{{ Title }}{{ Content }}')
+        with redirect_stdout(StringIO()):
+            asset_map, _ = fingerprint_assets(self.public, self.manifest.assets)
+            asset_fingerprint.configure(asset_map)
+            generate_pages_recursive(self.content, self.template, self.public, self.manifest)
+        self.watcher.snapshot = self.watcher.take_snapshot()
+        try:
+            self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+            outputs = self.poll()
+            new_url = asset_fingerprint.active.url("/index.css")
+        finally:
+            asset_fingerprint.configure(None)
+        self.assertNotEqual(new_url, asset_map.url("/index.css"))
+        self.assertIn(os.path.join(self.public, "index.html"), outputs)
+        self.assertIn(f'href="{new_url}"', self.read("index.html"))
+        self.assertEqual(self.read(new_url.lstrip("/")), "body { margin: 0 }")
+
+    def test_new_and_removed_directories(self):
+        section = os.path.join(self.content, "docs")
+        os.makedirs(os.path.join(section, "deep"))
+        self.write(os.path.join(section, "deep", "page.md"), "# Deep\n\nPage")
+        self.assertEqual(self.poll(), [os.path.join(self.public, "docs", "deep", "page.html")])
+        shutil.rmtree(section)
+        self.assertEqual(self.poll(), [os.path.join(self.public, "docs", "deep", "page.html")])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "docs", "deep", "page.html")))
+
+    def test_manifest_saved_when_idle(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nEdited")
+        self.poll()
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\nEdited")
+        self.poll()
+        self.assertFalse(os.path.exists(self.manifest.path))
+        self.poll()
+        loaded = BuildManifest.load(self.manifest.path)
+        self.assertEqual(loaded.pages, self.manifest.pages)
+
+    def test_broken_markdown_does_not_stop_watcher(self):
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n**unclosed")
+        self.assertEqual(self.poll(), [])
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n**fixed**")
+        self.assertEqual(self.poll(), [os.path.join(self.public, "index.html")])
+
+
+class TestScanningSiteWatcher(TestSiteWatcher):
+    # The same checks where inotify is not available.
+    def setUp(self):
+        with patch("watch.watch_trees", return_value=None):
+            super().setUp()
+        self.assertIsNone(self.watcher.tree)
+
+
+@unittest.skipIf(inotify.libc is None, "no inotify")
+class TestInotifyTree(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, "a", "b"))
+        self.write(os.path.join("a", "b", "page.md"))
+        self.tree = inotify.InotifyTree([self.root])
+
+    def tearDown(self):
+        self.tree.close()
+        self.tmp.cleanup()
+
+    def write(self, name, text="x"):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(text)
+
+    def paths(self):
+        return sorted(os.path.relpath(path, self.root) for path in self.tree.snapshot())
+
+    def test_matches_scan(self):
+        self.write("top.md")
+        self.write(os.path.join("a", "b", "page.md"), "longer")
+        self.assertEqual(self.tree.snapshot(), snapshot_tree(self.root))
+
+    def test_moved_directory(self):
+        os.rename(os.path.join(self.root, "a", "b"), os.path.join(self.root, "c"))
+        self.assertEqual(self.paths(), [os.path.join("c", "page.md")])
+        self.write(os.path.join("c", "new.md"))
+        self.assertEqual(self.paths(), [os.path.join("c", "new.md"), os.path.join("c", "page.md")])
+
+    def test_overflow_rescans(self):
+        self.write("top.md")
+        with patch.object(self.tree, "read_events", return_value=None):
+            self.assertEqual(self.tree.snapshot(), snapshot_tree(self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
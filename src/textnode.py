@@ -1,15 +1,28 @@
+import sys
+
+from asset_fingerprint import asset_url
 from htmlnode import LeafNode
 
 
-text_type_text = "text"
-text_type_bold = "bold"
-text_type_italic = "italic"
-text_type_code = "code"
-text_type_link = "link"
-text_type_image = "image"
+# Type tags are interned so every node shares one string object per type
+# and comparisons against these constants are usually identity checks.
+text_type_text = sys.intern("text")
+text_type_bold = sys.intern("bold")
+text_type_italic = sys.intern("italic")
+text_type_code = sys.intern("code")
+text_type_link = sys.intern("link")
+text_type_image = sys.intern("image")
+
+text_type_tags = {
+    text_type_bold: "b",
+    text_type_italic: "i",
+    text_type_code: "code",
+}
 
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -33,14 +46,11 @@ class TextNode:
 def text_node_to_html_node(text_node):
     if text_node.text_type == text_type_text:
         return LeafNode(None, text_node.text)
-    if text_node.text_type == text_type_bold:
-        return LeafNode("b", text_node.text)
-    if text_node.text_type == text_type_italic:
-        return LeafNode("i", text_node.text)
-    if text_node.text_type == text_type_code:
-        return LeafNode("code", text_node.text)
+    tag = text_type_tags.get(text_node.text_type)
+    if tag is not None:
+        return LeafNode(tag, text_node.text)
     if text_node.text_type == text_type_link:
-        return LeafNode("a", text_node.text, {"href": text_node.url})
+        return LeafNode("a", text_node.text, (("href", asset_url(text_node.url)),))
     if text_node.text_type == text_type_image:
-        return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+        return LeafNode("img", "", (("src", asset_url(text_node.url)), ("alt", text_node.text)))
     raise ValueError(f"Invalid text type: {text_node.text_type}")
@@ -0,0 +1,261 @@
+import os
+import shutil
+import time
+import traceback
+
+import asset_fingerprint
+import block_cache
+import link_graph
+import png_optimize
+import search_index
+from asset_fingerprint import fingerprint_assets
+from build_manifest import hash_file
+from inotify import watch_trees
+from link_graph import dead_link_message
+from page_generation import (
+    generate_page,
+    generate_pages_recursive,
+    page_dependencies,
+    page_dest_path,
+    page_links,
+    page_search_text,
+    resolve_template,
+    section_template_name,
+)
+
+
+def snapshot_tree(root, snapshot=None):
+    if snapshot is None:
+        snapshot = {}
+    if not os.path.isdir(root):
+        return snapshot
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                snapshot_tree(entry.path, snapshot)
+            elif entry.is_file():
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    changed = [path for path, state in new.items() if old.get(path) != state]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+def is_within(path, dir_path):
+    return os.path.commonpath([os.path.abspath(path), os.path.abspath(dir_path)]) == \
+        os.path.abspath(dir_path)
+
+
+class SiteWatcher:
+    def __init__(
+        self, content_dir, static_dir, template_path, public_dir, manifest,
+        on_rebuild=None, interval=0.05, streaming=False,
+    ):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.public_dir = public_dir
+        self.manifest = manifest
+        self.on_rebuild = on_rebuild
+        self.interval = interval
+        self.streaming = streaming
+        # Told about changes under the content and static directories by
+        # inotify where it can be; otherwise every poll scans them.
+        self.tree = watch_trees([content_dir, static_dir])
+        self.snapshot = self.take_snapshot()
+        # Rebuilds mark the manifest unsaved; it is written on the first
+        # idle poll, so a burst of edits saves it once.
+        self.unsaved = False
+        # Dead links already reported, so each rebuild only mentions the
+        # ones it introduced or fixed.
+        self.dead_links = set()
+        if link_graph.active is not None:
+            self.dead_links = set(link_graph.active.check(manifest))
+
+    def close(self):
+        self.save_manifest()
+        if self.tree is not None:
+            self.tree.close()
+            self.tree = None
+
+    def take_snapshot(self):
+        snapshot = None
+        if self.tree is not None:
+            try:
+                snapshot = self.tree.snapshot()
+            except OSError:
+                # Most likely out of inotify watches; scan from now on.
+                self.tree.close()
+                self.tree = None
+        if snapshot is None:
+            snapshot = snapshot_tree(self.content_dir)
+            snapshot_tree(self.static_dir, snapshot)
+        # Partials can live outside the content directory; watch every file
+        # a page was last built from.
+        # The asset manifest is a dependency too, but the watcher writes it.
+        for path in [self.template_path] + sorted(self.manifest.dependency_paths()):
+            if os.path.isfile(path) and not is_within(path, self.public_dir):
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def is_template_file(self, path, dependency_paths):
+        return (
+            os.path.basename(path) == section_template_name
+            or os.path.normpath(path) in dependency_paths
+        )
+
+    def poll(self):
+        snapshot = self.take_snapshot()
+        changed, removed = diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        if not changed and not removed:
+            self.save_manifest()
+            return []
+        return self.rebuild(changed, removed)
+
+    def save_manifest(self):
+        if self.unsaved:
+            self.manifest.save()
+            self.unsaved = False
+
+    def rebuild(self, changed, removed):
+        start = time.perf_counter()
+        outputs = []
+        try:
+            dependency_paths = set(
+                os.path.normpath(path)
+                for path in [self.template_path] + list(self.manifest.dependency_paths())
+            )
+            if any(self.is_template_file(path, dependency_paths) for path in changed + removed):
+                # The manifest records which files each page was built from,
+                # so only pages using the edited template or partial rebuild.
+                before = dict(self.manifest.pages)
+                generate_pages_recursive(
+                    self.content_dir, self.template_path, self.public_dir, self.manifest,
+                    streaming=self.streaming,
+                )
+                outputs.extend(
+                    entry["dest"] for path, entry in self.manifest.pages.items()
+                    if before.get(path) != entry
+                )
+            else:
+                for path in changed:
+                    if path.endswith(".md") and is_within(path, self.content_dir):
+                        outputs.extend(self.rebuild_page(path))
+                for path in removed:
+                    if path.endswith(".md") and is_within(path, self.content_dir):
+                        outputs.extend(self.remove_page(path))
+            for path in changed:
+                if is_within(path, self.static_dir):
+                    outputs.append(self.copy_asset(path))
+            for path in removed:
+                if is_within(path, self.static_dir):
+                    outputs.extend(self.remove_asset(path))
+            if asset_fingerprint.active is not None and any(
+                is_within(path, self.static_dir) for path in changed + removed
+            ):
+                outputs.extend(self.refingerprint())
+            if link_graph.active is not None and outputs:
+                link_graph.active.update(self.manifest, page_links)
+                self.report_dead_links()
+            self.unsaved = True
+            if search_index.active is not None and outputs:
+                search_index.active.write(self.manifest, page_search_text)
+        except Exception:
+            # A half-typed edit must not kill the watcher; report and wait
+            # for the next change.
+            traceback.print_exc()
+            return []
+
+        if outputs:
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Rebuilt {len(outputs)} file(s) in {elapsed:.1f} ms")
+            if self.on_rebuild is not None:
+                self.on_rebuild(outputs)
+        return outputs
+
+    def report_dead_links(self):
+        # Only pages rebuilt since the last check, and pages linking to a
+        # page or asset that was added or removed, are checked again.
+        dead = set(link_graph.active.check(self.manifest))
+        for from_path, url in sorted(dead - self.dead_links):
+            print(f"Warning: {dead_link_message(from_path, url)}")
+        fixed = len(self.dead_links - dead)
+        if fixed:
+            print(f"Fixed {fixed} dead link(s)")
+        self.dead_links = dead
+
+    def rebuild_page(self, from_path):
+        dest_path = page_dest_path(from_path, self.content_dir, self.public_dir)
+        source_hash = hash_file(from_path)
+        template_path = resolve_template(from_path, self.content_dir, self.template_path)
+        dependencies = page_dependencies(template_path)
+        if self.manifest.rebuild_reason(
+            from_path, dest_path, source_hash, dependencies
+        ) is None:
+            return []
+        generate_page(from_path, template_path, dest_path, self.streaming, self.public_dir)
+        self.manifest.record(from_path, dest_path, source_hash, dependencies)
+        return [dest_path]
+
+    def refingerprint(self):
+        # New asset contents mean new names; pages built with the old asset
+        # map have it among their dependencies and so get rebuilt.
+        asset_map, _ = fingerprint_assets(self.public_dir, self.manifest.assets)
+        if not asset_fingerprint.configure(asset_map):
+            return []
+        if block_cache.active is not None:
+            block_cache.active.clear()
+        before = dict(self.manifest.pages)
+        generate_pages_recursive(
+            self.content_dir, self.template_path, self.public_dir, self.manifest,
+            streaming=self.streaming,
+        )
+        return [
+            entry["dest"] for path, entry in self.manifest.pages.items()
+            if before.get(path) != entry
+        ]
+
+    def remove_page(self, from_path):
+        entry = self.manifest.pages.pop(from_path, None)
+        if entry is None:
+            return []
+        if os.path.exists(entry["dest"]):
+            os.remove(entry["dest"])
+        return [entry["dest"]]
+
+    def copy_asset(self, from_path):
+        dest_path = os.path.join(self.public_dir, os.path.relpath(from_path, self.static_dir))
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        shutil.copy2(from_path, dest_path)
+        self.manifest.record_asset(dest_path, from_path)
+        self.manifest.optimized_assets.pop(dest_path, None)
+        self.manifest.asset_hashes.pop(dest_path, None)
+        if png_optimize.active is not None:
+            png_optimize.active.optimize_assets(self.manifest, [dest_path])
+        return dest_path
+
+    def remove_asset(self, from_path):
+        dest_path = os.path.join(self.public_dir, os.path.relpath(from_path, self.static_dir))
+        if self.manifest.assets.pop(dest_path, None) is None:
+            return []
+        self.manifest.optimized_assets.pop(dest_path, None)
+        self.manifest.asset_hashes.pop(dest_path, None)
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        return [dest_path]
+
+    def run(self, stop_event=None):
+        try:
+            while stop_event is None or not stop_event.is_set():
+                self.poll()
+                time.sleep(self.interval)
+        finally:
+            self.close()